@@ -22,6 +22,8 @@ from interface.objects import AggregateStatusType
 # Alarms.
 from ion.agents.alerts.alerts import *
 
+import numpy as np
+
 class AgentAlertManager(object):
     """
     """
@@ -34,6 +36,10 @@ class AgentAlertManager(object):
         for aggregate_type in AggregateStatusType._str_map.keys():
             agent.aparam_aggstatus[aggregate_type] = DeviceStatusType.STATUS_UNKNOWN
         agent.aparam_set_aggstatus = self.aparam_set_aggstatus
+
+        # IntervalAlerts by (stream_name, value_id), see _get_alert_index.
+        self._alert_index = None
+        self._alert_index_key = None
     
     def process_alerts(self, **kwargs):
 
@@ -44,7 +50,71 @@ class AgentAlertManager(object):
 
         # update the aggreate status for this device
         self._process_aggregate_alerts()
-        
+
+    def process_value_alerts(self, stream_name, values):
+        """
+        Evaluate a batch of stream values against the alerts and update the
+        aggregate status once for the whole batch. IntervalAlerts are
+        evaluated over each value sequence with numpy and only publish
+        status transitions; other alerts get the per value eval_alert calls
+        of process_alerts.
+
+        @param stream_name    name of the stream the values were published on
+        @param values         dict of value_id to the sequence of values
+                              received for it, in time order
+        """
+        value_alerts, other_alerts = self._get_alert_index()
+
+        for value_id, vals in values.iteritems():
+            alerts = value_alerts.get((stream_name, value_id))
+            if alerts:
+                alert_vals = self._get_alert_values(vals)
+                for a in alerts:
+                    if alert_vals is None:
+                        for value in vals:
+                            a.eval_alert(stream_name=stream_name, value=value, value_id=value_id)
+                    else:
+                        a.eval_alert_values(alert_vals)
+
+            for value in vals:
+                for a in other_alerts:
+                    a.eval_alert(stream_name=stream_name, value=value, value_id=value_id)
+
+        # update the aggreate status for this device
+        self._process_aggregate_alerts()
+
+    def _get_alert_index(self):
+        """
+        Returns the IntervalAlerts indexed by (stream_name, value_id) and
+        the list of all other alerts, rebuilt when the alerts list changes.
+        """
+        alerts = self._agent.aparam_alerts
+        key = (id(alerts), len(alerts))
+        if self._alert_index is None or self._alert_index_key != key:
+            value_alerts = {}
+            other_alerts = []
+            for a in alerts:
+                if isinstance(a, IntervalAlert):
+                    value_alerts.setdefault((a._stream_name, a._value_id), []).append(a)
+                else:
+                    other_alerts.append(a)
+            self._alert_index = (value_alerts, other_alerts)
+            self._alert_index_key = key
+        return self._alert_index
+
+    @staticmethod
+    def _get_alert_values(vals):
+        """
+        Returns the values IntervalAlert.eval_alert would evaluate as a float
+        array, dropping None and zero values, or None if the values are not
+        numeric.
+        """
+        vals = np.array([v for v in vals if v is not None])
+        if vals.dtype.kind not in 'biuf':
+            return None
+        vals = vals.astype(np.float64)
+        return vals[vals != 0]
+
     def _update_aggstatus(self, aggregate_type, new_status):
         """
         Called by this manager to set a new status value for an aggstatus type.
@@ -163,6 +233,8 @@ class AgentAlertManager(object):
             [x.stop() for x in old_alerts]
             self._agent.aparam_alerts = new_alerts
 
+        self._alert_index = None
+
         for a in self._agent.aparam_alerts:
             log.info('Agent alert: %s', str(a))
                        
@@ -16,6 +16,7 @@ from pyon.public import log
 
 # Standard imports.
 import uuid
+from collections import deque
 
 # 3rd party.
 import gevent
@@ -31,7 +32,7 @@ from interface.objects import StreamRoute
 from pyon.core.bootstrap import get_obj_registry
 from pyon.core.object import IonObjectDeserializer
 
-from ion.agents.populate_rdt import populate_rdt
+from ion.agents.populate_rdt import ParticleConverter
 
 class AgentStreamPublisher(object):
     """
@@ -42,6 +43,8 @@ class AgentStreamPublisher(object):
         self._publishers = {}
         self._stream_greenlets = {}
         self._stream_buffers = {}
+        self._rdt_templates = {}
+        self._particle_converters = {}
         self._connection_ID = None
         self._connection_index = {}
         
@@ -72,6 +75,9 @@ class AgentStreamPublisher(object):
                     stream_def = config['stream_definition_ref']
                     self._stream_defs[stream_name] = stream_def
                     rdt = RecordDictionaryTool(stream_definition_id=stream_def)    
+                # Kept to build and populate the record dictionaries of outgoing granules.
+                self._rdt_templates[stream_name] = rdt
+                self._particle_converters[stream_name] = ParticleConverter(rdt)
                 self._agent.aparam_streams[stream_name] = rdt.fields
                 self._agent.aparam_pubrate[stream_name] = 0
             except Exception as e:
@@ -94,7 +100,7 @@ class AgentStreamPublisher(object):
                                     stream_id=stream_id, stream_route=route)
                 self._publishers[stream_name] = publisher
                 self._stream_greenlets[stream_name] = None
-                self._stream_buffers[stream_name] = []
+                self._stream_buffers[stream_name] = deque()
         
             except Exception as e:
                 errmsg = 'Instrument agent %s' % self._agent._proc_name
@@ -111,7 +117,7 @@ class AgentStreamPublisher(object):
         
         try:
             stream_name = sample['stream_name']
-            self._stream_buffers[stream_name].insert(0,sample)
+            self._stream_buffers[stream_name].append(sample)
             if not self._stream_greenlets[stream_name]:
                 self._publish_stream_buffer(stream_name)
 
@@ -168,34 +174,25 @@ class AgentStreamPublisher(object):
         """
 
         try:
-            buf_len = len(self._stream_buffers[stream_name])
-            if buf_len == 0:
+            vals = self._stream_buffers[stream_name]
+            if len(vals) == 0:
                 return
 
-            stream_def = self._stream_defs[stream_name]
-            if isinstance(stream_def, str):
-                rdt = RecordDictionaryTool(stream_definition_id=stream_def)
-            else:
-                rdt = RecordDictionaryTool(stream_definition=stream_def)
-                
+            # Take the whole buffer, new samples go to a fresh one.
+            self._stream_buffers[stream_name] = deque()
+
+            rdt = RecordDictionaryTool.empty_like(self._rdt_templates[stream_name])
             publisher = self._publishers[stream_name]
-                
-            vals = []
-            for x in xrange(buf_len):
-                vals.append(self._stream_buffers[stream_name].pop())
-    
-            rdt = populate_rdt(rdt, vals)
-            
-            log.info('Outgoing granule: %s',
-                     ['%s: %s'%(k,v) for k,v in rdt.iteritems()])
+
+            rdt = self._particle_converters[stream_name].populate(rdt, vals)
+
             g = rdt.to_granule(data_producer_id=self._agent.resource_id, connection_id=self._connection_ID.hex,
                     connection_index=str(self._connection_index[stream_name]))
-            
+
             publisher.publish(g)
-            log.info('Instrument agent %s published data granule on stream %s.',
-                self._agent._proc_name, stream_name)
-            log.info('Connection id: %s, connection index: %i.',
-                     self._connection_ID.hex, self._connection_index[stream_name])
+            log.info('Instrument agent %s published data granule on stream %s: %i records, connection id: %s, connection index: %i.',
+                self._agent._proc_name, stream_name, len(rdt),
+                self._connection_ID.hex, self._connection_index[stream_name])
             self._connection_index[stream_name] += 1
         except:
             log.exception('Instrument agent %s could not publish data on stream %s.',
@@ -16,6 +16,7 @@ from pyon.public import IonObject, log
 # Standard imports.
 import time
 import copy
+import numpy as np
 
 # gevent.
 import gevent
@@ -377,6 +378,58 @@ class IntervalAlert(StreamValueAlert):
         if self._prev_status != self._status:
             self.publish_alert()
 
+    def _interval_status(self, values):
+        """
+        Vectorized form of the interval test in eval_alert. Returns None
+        if the alert has no usable bound, like eval_alert.
+        """
+        status = None
+        if self._lower_bound:
+            if self._lower_rel_op == '<=':
+                status = (self._lower_bound <= values)
+            else:
+                status = (self._lower_bound < values)
+
+        if self._upper_bound:
+            if self._upper_rel_op == '<=':
+                upper = (values <= self._upper_bound)
+            else:
+                upper = (values < self._upper_bound)
+            status = upper if status is None else (status & upper)
+
+        return status
+
+    def eval_alert_values(self, values):
+        """
+        Evaluate a float array of values for this stream and value_id in
+        one call, equivalent to eval_alert on each value in turn. Values
+        eval_alert would skip must already be removed. Only status
+        transitions are published.
+        """
+        if len(values) == 0:
+            return
+
+        status = self._interval_status(values)
+        if status is None:
+            self._prev_status = self._status
+            self._current_value = values[-1].item()
+            return
+
+        prev_status = self._status
+        transitions = np.flatnonzero(status[1:] != status[:-1]) + 1
+        if prev_status != bool(status[0]):
+            transitions = np.concatenate(([0], transitions))
+
+        for i in transitions:
+            self._prev_status = self._status
+            self._status = bool(status[i])
+            self._current_value = values[i].item()
+            self.publish_alert()
+
+        self._prev_status = bool(status[-2]) if len(status) > 1 else prev_status
+        self._status = bool(status[-1])
+        self._current_value = values[-1].item()
+
 
 class RSNEventAlert(BaseAlert):
     """
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+"""
+@package ion.agents.alerts.test.test_alert_manager
+@file ion/agents/alerts/test/test_alert_manager.py
+@brief Unit tests and benchmarks for the AgentAlertManager batch evaluation.
+"""
+
+__license__ = 'Apache 2.0'
+
+# Standard library.
+import random
+import time
+
+# Pyon unittest support.
+from pyon.util.unit_test import PyonTestCase
+from nose.plugins.attrib import attr
+from mock import Mock, patch
+
+# Alarm types and events.
+from interface.objects import StreamAlertType, AggregateStatusType, DeviceStatusType
+
+from ion.agents.agent_alert_manager import AgentAlertManager
+
+"""
+bin/nosetests -s -v --nologcapture ion/agents/alerts/test/test_alert_manager.py:TestAgentAlertManager
+bin/nosetests -s -v --nologcapture -a BENCHMARK ion/agents/alerts/test/test_alert_manager.py
+"""
+
+
+class FakeAgent(object):
+    ORIGIN_TYPE = 'PlatformDevice'
+
+    def __init__(self):
+        self.resource_id = 'platform_1'
+        self._proc_name = 'fake_platform_agent'
+        self.aparam_alerts = []
+        self.aparam_aggstatus = {}
+        self._event_publisher = Mock()
+
+
+class AlertManagerMixin(object):
+    def make_manager(self):
+        patcher = patch('ion.agents.alerts.alerts.EventPublisher')
+        self.publisher = patcher.start()
+        self.addCleanup(patcher.stop)
+        return AgentAlertManager(FakeAgent())
+
+    def published_alerts(self):
+        return [(kwargs['name'], kwargs['sub_type'], kwargs['values'])
+                for args, kwargs in self.publisher.return_value.publish_event.call_args_list]
+
+    def interval_alert(self, name, value_id, alert_type=StreamAlertType.WARNING, **bounds):
+        alert_def = {
+            'name' : name,
+            'stream_name' : 'parsed',
+            'description' : 'Value %s out of range.' % value_id,
+            'alert_type' : alert_type,
+            'aggregate_type' : AggregateStatusType.AGGREGATE_DATA,
+            'value_id' : value_id,
+            'lower_bound' : None,
+            'lower_rel_op' : None,
+            'upper_bound' : None,
+            'upper_rel_op' : None,
+            'alert_class' : 'IntervalAlert'
+        }
+        alert_def.update(bounds)
+        return alert_def
+
+
+@attr('UNIT', group='sa')
+class TestAgentAlertManager(PyonTestCase, AlertManagerMixin):
+
+    def alert_defs(self):
+        return [
+            self.interval_alert('temp_warning', 'temp', lower_bound=10.5, lower_rel_op='<'),
+            self.interval_alert('temp_alarm', 'temp', StreamAlertType.ALARM, lower_bound=5.0, lower_rel_op='<=',
+                                upper_bound=30.0, upper_rel_op='<'),
+            self.interval_alert('pressure_warning', 'pressure', upper_bound=4.0, upper_rel_op='<=')
+        ]
+
+    def test_batch_matches_per_value(self):
+        values = {
+            'temp' : [30, 30.4, 5.5, None, 5.6, 0, 15.1, 15.2, 15.3, 3.3, 3.4, 15.0, 15.5],
+            'pressure' : [1.0, 4.0, 2.0, 4.5],
+            'salinity' : [35.0]
+        }
+
+        aam = self.make_manager()
+        aam.aparam_set_alerts(self.alert_defs())
+        for value_id, vals in values.iteritems():
+            for value in vals:
+                aam.process_alerts(stream_name='parsed', value=value, value_id=value_id)
+        expected_alerts = sorted(self.published_alerts())
+        expected_status = aam.aparam_get_alerts()
+        expected_aggstatus = dict(aam._agent.aparam_aggstatus)
+
+        aam = self.make_manager()
+        aam.aparam_set_alerts(self.alert_defs())
+        aam.process_value_alerts('parsed', values)
+        self.assertEquals(sorted(self.published_alerts()), expected_alerts)
+        self.assertEquals(aam.aparam_get_alerts(), expected_status)
+        self.assertEquals(aam._agent.aparam_aggstatus, expected_aggstatus)
+        self.assertEquals(aam._agent.aparam_aggstatus[AggregateStatusType.AGGREGATE_DATA],
+                          DeviceStatusType.STATUS_WARNING)
+
+        # the aggregate status is only updated once for the batch, each
+        # aggregate type goes from unknown to its new status
+        self.assertEquals(aam._agent._event_publisher.publish_event.call_count,
+                          len(AggregateStatusType._str_map))
+
+        # a second batch continues from the current status
+        self.publisher.reset_mock()
+        aam.process_value_alerts('parsed', {'temp' : [15.5, 16.0, 2.0], 'pressure' : [3.0]})
+        self.assertEquals(sorted(self.published_alerts()),
+                          sorted([('temp_warning', 'WARNING', [2.0]), ('temp_alarm', 'ALARM', [2.0]),
+                                  ('pressure_warning', 'ALL_CLEAR', [3.0])]))
+
+    def test_alert_index(self):
+        aam = self.make_manager()
+        aam.aparam_set_alerts(self.alert_defs())
+        value_alerts, other_alerts = aam._get_alert_index()
+        self.assertEquals(sorted(value_alerts.keys()), [('parsed', 'pressure'), ('parsed', 'temp')])
+        self.assertEquals([a._name for a in value_alerts[('parsed', 'temp')]], ['temp_warning', 'temp_alarm'])
+        self.assertEquals(other_alerts, [])
+
+        aam.aparam_set_alerts(['add', self.interval_alert('salinity_warning', 'salinity', lower_bound=30.0, lower_rel_op='<')])
+        value_alerts, other_alerts = aam._get_alert_index()
+        self.assertEquals([a._name for a in value_alerts[('parsed', 'salinity')]], ['salinity_warning'])
+
+        aam._agent.aparam_alerts = []
+        self.assertEquals(aam._get_alert_index(), ({}, []))
+
+    def test_alert_values(self):
+        self.assertEquals(list(AgentAlertManager._get_alert_values([1, None, 0, 2.5, 0.0])), [1.0, 2.5])
+        self.assertEquals(len(AgentAlertManager._get_alert_values([None])), 0)
+        self.assertIsNone(AgentAlertManager._get_alert_values(['1.5', 2.0]))
+
+
+@attr('BENCHMARK', group='sa')
+class AgentAlertManagerBenchmark(PyonTestCase, AlertManagerMixin):
+    attributes = 500
+    alerts_per_attribute = 20
+    ticks = 5
+
+    def make_alert_defs(self):
+        alert_defs = []
+        for i in xrange(self.attributes):
+            for j in xrange(self.alerts_per_attribute):
+                alert_defs.append(self.interval_alert('attr_%d_alert_%d' % (i, j), 'attr_%d' % i,
+                                                      lower_bound=float(j), lower_rel_op='<',
+                                                      upper_bound=float(100 - j), upper_rel_op='<='))
+        return alert_defs
+
+    def make_ticks(self, rand, samples):
+        # one attribute value event per tick, with samples values per attribute
+        return [dict(('attr_%d' % i, [rand.uniform(-5, 105) for k in xrange(samples)])
+                     for i in xrange(self.attributes))
+                for tick in xrange(self.ticks)]
+
+    def run_ticks(self, ticks, process):
+        aam = self.make_manager()
+        aam.aparam_set_alerts(self.make_alert_defs())
+        start = time.time()
+        for values in ticks:
+            process(aam, values)
+        return (time.time() - start) / len(ticks), self.publisher.return_value.publish_event.call_count
+
+    def process_per_value(self, aam, values):
+        for value_id, vals in values.iteritems():
+            for value in vals:
+                aam.process_alerts(stream_name='parsed', value=value, value_id=value_id)
+
+    def process_batch(self, aam, values):
+        aam.process_value_alerts('parsed', values)
+
+    def test_alert_evaluation(self):
+        rand = random.Random(0)
+
+        # 1 Hz updates, and a minute of buffered values per event
+        for samples in (1, 60):
+            ticks = self.make_ticks(rand, samples)
+            elapsed, alerts = self.run_ticks(ticks, self.process_batch)
+            print '%d attributes x %d alerts, %2d values per event: process_value_alerts %9.3f s/event  %d alerts published' % (
+                self.attributes, self.alerts_per_attribute, samples, elapsed, alerts)
+
+            # the per value evaluation is only practical at 1 Hz
+            if samples == 1:
+                legacy_elapsed, legacy_alerts = self.run_ticks(ticks, self.process_per_value)
+                print '%d attributes x %d alerts, %2d values per event: process_alerts       %9.3f s/event  %d alerts published' % (
+                    self.attributes, self.alerts_per_attribute, samples, legacy_elapsed, legacy_alerts)
+                self.assertEquals(alerts, legacy_alerts)
@@ -613,6 +613,7 @@ class BaseDataHandler(object):
     def _publish_data(cls, publisher, data_generator, config=None, update_new_data_check_attachment=None):
         """
         Iterates over the data_generator and publishes granules to the stream indicated in stream_id
+        If config contains 'publish_batch_records' or 'publish_batch_interval', see BaseDataHandler._publish_data_batches
         @param publisher to publish the data with
         @param data_generator enumerator to cycle through the data
         @throws InstrumentDataException if data_generator isn't an enumerator
@@ -620,6 +621,12 @@ class BaseDataHandler(object):
         if data_generator is None or not hasattr(data_generator, '__iter__'):
             raise InstrumentDataException('Invalid object returned from _get_data: returned object cannot be None and must have \'__iter__\' attribute')
 
+        batch_records = get_safe(config, 'publish_batch_records', 0) if config else 0
+        batch_interval = get_safe(config, 'publish_batch_interval', 0) if config else 0
+        if batch_records or batch_interval:
+            cls._publish_data_batches(publisher, data_generator, config, update_new_data_check_attachment, batch_records, batch_interval)
+            return
+
         for count, gran in enumerate(data_generator):
             if isinstance(gran, Granule):
                 #log.warn('_publish_data: {0}\n{1}'.format(count, gran))
@@ -634,6 +641,67 @@ class BaseDataHandler(object):
 
         #TODO: When finished publishing, update (either directly, or via an event callback to the agent) the UpdateDescription
 
+    @classmethod
+    def _publish_data_batches(cls, publisher, data_generator, config, update_new_data_check_attachment, batch_records=0, batch_interval=0):
+        """
+        Iterates over the data_generator and publishes the granules gathered into larger granules of up to
+        batch_records records, or of the records gathered within batch_interval seconds of the first one.
+        A single granule larger than batch_records is published as is.  The NewDataCheck attachment is
+        written once, after the last granule of the acquisition cycle has been published, and not at all if a
+        publish fails.
+        @param publisher to publish the data with
+        @param data_generator enumerator to cycle through the data
+        @param config dict containing configuration parameters
+        @param update_new_data_check_attachment classmethod to update the external dataset resources file list attachment
+        @param batch_records maximum number of records per published granule, 0 for no limit
+        @param batch_interval maximum number of seconds to gather records for, 0 for no limit
+        """
+        pending = []
+        pending_records = 0
+        pending_since = None
+        published = 0
+        publish_failed = []
+
+        def flush():
+            rdt = RecordDictionaryTool.concatenate(pending)
+            if rdt is not None:
+                try:
+                    publisher.publish(rdt.to_granule())
+                except Exception:
+                    publish_failed.append(True)
+                    raise
+            # only forget the pending records once they have reached the stream
+            del pending[:]
+            return 0 if rdt is None else 1
+
+        try:
+            for gran in data_generator:
+                if not isinstance(gran, Granule):
+                    log.warn('Could not publish object of {0} returned by _get_data: {1}'.format(type(gran), gran))
+                    continue
+
+                rdt = RecordDictionaryTool.load_from_granule(gran)
+                if pending and batch_records and pending_records + len(rdt) > batch_records:
+                    published += flush()
+                if not pending:
+                    pending_records = 0
+                    pending_since = time.time()
+                pending.append(rdt)
+                pending_records += len(rdt)
+
+                if (batch_records and pending_records >= batch_records) or (batch_interval and time.time() - pending_since >= batch_interval):
+                    published += flush()
+        finally:
+            # publish what was gathered and record the progress even if the data source failed, but never
+            # record progress past a batch that did not reach the stream so its files are read again
+            if not publish_failed:
+                if pending:
+                    published += flush()
+                if published and config and 'set_new_data_check' in config:
+                    update_new_data_check_attachment(config['external_dataset_res_id'], config['set_new_data_check'])
+
+        publisher.close()
+
 
 class DataHandlerError(Exception):
     """
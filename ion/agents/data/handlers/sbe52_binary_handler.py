@@ -35,6 +35,8 @@ from ion.services.dm.utility.granule.record_dictionary import RecordDictionaryTo
 from ion.agents.data.handlers.base_data_handler import BaseDataHandler
 from ion.agents.data.handlers.handler_utils import list_file_info, calculate_iteration_count, get_time_from_filename
 
+import mmap
+import numpy as np
 import struct
 import time
 from ooi.logging import log
@@ -46,6 +48,12 @@ MAX_RECORDS_PER_GRANULE=2*24*60*60
 MAX_INMEMORY_SIZE=50000000
 CTD_END_PROFILE_DATA='\xff'*11
 
+# records examined at a time when SBE52BinaryCTDMemmapParser looks for the profile terminators
+SCAN_CHUNK_RECORDS=100000
+
+# one 11 byte SBE52 record: three 3-byte big-endian fields and the 2-byte oxygen frequency
+SBE52_RECORD_DTYPE=np.dtype([('conductivity', 'u1', (3,)), ('temp', 'u1', (3,)), ('pressure', 'u1', (3,)), ('oxygen', '>u2')])
+
 
 
 
@@ -166,14 +174,24 @@ class SBE52BinaryDataHandler(BaseDataHandler):
 
                 max_rec = get_safe(config, 'max_records', 1)
                 stream_def = get_safe(config, 'stream_def')
+                columnar = hasattr(parser, 'get_record_arrays')
                 while True:
-                    records = parser.get_records(max_count=max_rec)
-                    if not records:
-                        break
-
                     rdt = RecordDictionaryTool(stream_definition_id=stream_def)
-                    for key in records[0]:
-                        rdt[key] = [ record[key] for record in records ]
+                    if columnar:
+                        # parsers that decode whole chunks hand back one array per field
+                        arrays = parser.get_record_arrays(max_count=max_rec)
+                        if arrays is None:
+                            break
+                        if not len(arrays['time']):
+                            continue
+                        for key, values in arrays.iteritems():
+                            rdt[key] = values
+                    else:
+                        records = parser.get_records(max_count=max_rec)
+                        if not records:
+                            break
+                        for key in records[0]:
+                            rdt[key] = [ record[key] for record in records ]
 
                     g = rdt.to_granule()
 
@@ -307,3 +325,131 @@ class SBE52BinaryCTDParser(object):
             out*=256
         out+=struct.unpack('>B',data[-1])[0]
         return out
+
+
+class SBE52BinaryCTDMemmapParser(object):
+    """
+    memory-mapped variant of SBE52BinaryCTDParser for files of any size:
+    the file is scanned once for the profile terminators, then each call decodes the next chunk
+    of records with numpy, so only one chunk of records is held in memory at a time.
+    get_records returns the same records as SBE52BinaryCTDParser, get_record_arrays the same
+    values as one array per field.
+    """
+    _upload_time = time.time()
+
+    def __init__(self, url=None, open_file=None, parse_after=0, *a, **b):
+        """ raise exception if file does not meet spec """
+        self._profiles = []
+        self._parse_after = parse_after
+        self._profile_index = 0
+        self._record_index = 0
+        self._mmap = None
+        with open_file or open(url, 'rb') as f:
+            f.seek(0,2)
+            size = f.tell()
+            if size:
+                # the map keeps its own file descriptor, the file can be closed
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = 0
+        while offset<size:
+            profile = self._read_profile(offset, size)
+            if profile['end']>self._parse_after:
+                self._profiles.append(profile)
+            offset = profile['next']
+        if not self._profiles:
+            self.close()
+        log.debug('parsed %s, found %d usable profiles', url, len(self._profiles))
+
+    def _read_profile(self, offset, size):
+        """ find the terminator of the profile starting at offset, looking at SCAN_CHUNK_RECORDS records at a time """
+        count = 0
+        while True:
+            available = (size-offset)//11 - count
+            if available<=0:
+                # EOF here is bad -- incomplete profile
+                raise Exception('bad file format -- EOF before reached end of profile')
+            chunk = min(available, SCAN_CHUNK_RECORDS)
+            rows = np.frombuffer(self._mmap, dtype=np.uint8, count=chunk*11, offset=offset+count*11).reshape(chunk, 11)
+            terminators = np.flatnonzero((rows==0xFF).all(axis=1))
+            del rows
+            if len(terminators):
+                count += terminators[0]
+                break
+            count += chunk
+        # after 'ff'*11 marker, next 8 bytes are start/end times
+        times_offset = offset + (count+1)*11
+        if times_offset+8>size:
+            raise Exception('bad file format -- EOF before profile start/end times')
+        start, end = struct.unpack('>II', self._mmap[times_offset:times_offset+8])
+        log.trace('read profile [%d-%d] %d records', start, end, count)
+        return { 'offset': offset, 'count': int(count), 'start': start, 'end': end, 'next': times_offset+8 }
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def get_record_arrays(self, max_count=MAX_RECORDS_PER_GRANULE):
+        """
+        return a dict of arrays, one per field, with up to max_count records of the current profile
+        or None if the last profile has been read completely
+        """
+        if self._profile_index>=len(self._profiles):
+            return None
+        profile = self._profiles[self._profile_index]
+        count = profile['count']
+        first = self._record_index
+        last = min(max_count+first, count)
+
+        index = np.arange(first, last)
+        times = self._interpolate_time(index, profile['start'], profile['end'], count)
+        keep = times>self._parse_after
+        if keep.all():
+            keep = slice(None)
+
+        if last>first:
+            raw = np.frombuffer(self._mmap, dtype=SBE52_RECORD_DTYPE, count=last-first, offset=profile['offset']+first*11)
+        else:
+            raw = np.zeros(0, dtype=SBE52_RECORD_DTYPE)
+        out = {
+            'upload_time': np.repeat(self._upload_time, len(index))[keep],
+            'time': times[keep],
+            'conductivity': self._get_values(raw['conductivity'][keep], 10000, 0.5),
+            'temp': self._get_values(raw['temp'][keep], 10000, 5),
+            'pressure': self._get_values(raw['pressure'][keep], 100, 10),
+            'oxygen': raw['oxygen'][keep].astype(np.float64)
+        }
+        del raw
+
+        self._record_index = last
+        if self._record_index==count:
+            self._record_index=0
+            self._profile_index+=1
+            if self._profile_index==len(self._profiles):
+                self.close()
+        return out
+
+    def get_records(self, max_count=MAX_RECORDS_PER_GRANULE):
+        """
+        return a list of dicts, each dict describes one record in the current profile
+        or None if the last profile has been read completely
+        """
+        arrays = self.get_record_arrays(max_count)
+        if arrays is None:
+            return None
+        keys = arrays.keys()
+        return [ dict(zip(keys, values)) for values in zip(*[arrays[key].tolist() for key in keys]) ]
+
+    def _interpolate_time(self, index, start, end, count):
+        """ same integer interval as SBE52BinaryCTDParser._interpolate_time, for an array of record indexes """
+        if not len(index):
+            return index
+        delta = (end-start)//count
+        return start + index*delta
+
+    def _get_values(self, data, divisor, offset):
+        """ decode an (n, 3) array of 3-byte big-endian fields """
+        raw = (data[:,0].astype(np.uint32)<<16) | (data[:,1].astype(np.uint32)<<8) | data[:,2]
+        values = raw/float(divisor) - offset
+        values[(raw==0) | (raw==0xFFFFF)] = np.nan
+        return values
@@ -12,6 +12,7 @@ from pyon.util.containers import get_safe
 from ion.services.dm.utility.granule.record_dictionary import RecordDictionaryTool
 from ion.agents.data.handlers.base_data_handler import BaseDataHandler
 from ion.agents.data.handlers.handler_utils import list_file_info, get_sbuffer, calculate_iteration_count, get_time_from_filename
+from StringIO import StringIO
 import numpy as np
 
 DH_CONFIG_DETAILS = {
@@ -135,14 +136,14 @@ class SlocumParser(object):
     # John K's documentation says there are 16 header lines, but I believe there are actually 17
     # The 17th indicating the 'dtype' of the data for that column
     DEFAULT_HEADER_SIZE = 17
-    header_map = {}
-    sensor_map = {}
-    data_map = {}
 
     def __init__(self, url=None, header_size=17):
         """
         Constructor for the parser. Initializes headers and data
 
+        The data section is tokenized once into a 2-D float array (self.data), the entries of data_map
+        are its columns: views for the float and double sensors, converted copies for the integer ones.
+
         @param url the url/filepath of the file
         @param header_size number of header lines. This is information is in the header already, so it will be removed
         """
@@ -150,6 +151,9 @@ class SlocumParser(object):
             raise SlocumParseException('Must provide a filename')
 
         self.header_size = int(header_size)
+        self.header_map = {}
+        self.sensor_map = {}
+        self.data_map = {}
 
         sb = None
         try:
@@ -178,16 +182,40 @@ class SlocumParser(object):
 
             assert len(sensor_names) == len(units) == len(dtypes)
 
+            self.data = self._read_data(sb.read(), len(sensor_names))
+
             for i in xrange(len(sensor_names)):
-                sb.seek(0)
                 self.sensor_map[sensor_names[i]] = (units[i], dtypes[i])
-                dat = np.genfromtxt(fname=sb, skip_header=self.header_size, usecols=i, dtype=dtypes[i], missing_values='NaN')  # ,usemask=True)
-                self.data_map[sensor_names[i]] = dat
+                self.data_map[sensor_names[i]] = self._get_column(self.data[:, i], dtypes[i])
 
         finally:
             if not sb is None:
                 sb.close()
 
+    def _read_data(self, body, columns):
+        """
+        Tokenizes the data section in one pass into a (records, columns) float array
+        """
+        rows = len([line for line in body.splitlines() if line.strip()])
+        try:
+            data = np.fromstring(body, dtype='double', sep=' ')
+        except ValueError:
+            data = None
+        if data is None or data.size != rows * columns:
+            # not plain whitespace separated numbers, let genfromtxt work out the missing values
+            data = np.genfromtxt(StringIO(body), dtype='double', missing_values='NaN')
+        return data.reshape(rows, columns)
+
+    def _get_column(self, column, dtype):
+        """
+        Returns a column of the data as the sensor's dtype, with missing integer values filled with -1 as genfromtxt does
+        """
+        if np.dtype(dtype) == column.dtype:
+            return column
+        if np.dtype(dtype).kind == 'f':
+            return column.astype(dtype)
+        return np.where(np.isnan(column), -1, column).astype(dtype)
+
 
 class SlocumParseException(Exception):
     pass
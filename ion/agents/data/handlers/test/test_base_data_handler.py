@@ -25,7 +25,18 @@ from ion.agents.data.handlers.base_data_handler import BaseDataHandler,\
 from ion.services.dm.utility.granule.record_dictionary import\
     RecordDictionaryTool
 from pyon.agent.agent import ResourceAgentState
+from pyon.util.int_test import IonIntegrationTestCase
+from interface.services.dm.ipubsub_management_service import PubsubManagementServiceClient
+from interface.services.dm.idataset_management_service import DatasetManagementServiceClient
+from ion.agents.data.handlers.sbe52_binary_handler import SBE52BinaryDataHandler
+from ion.agents.data.handlers.test.test_sbe52_binary_parser import write_profiles
+from coverage_model import ParameterContext, AxisTypeEnum, QuantityType
 # Standard imports.
+import numpy as np
+import os
+import shutil
+import tempfile
+import time
 
 # 3rd party imports.
 from gevent import spawn
@@ -106,6 +117,76 @@ class TestBaseDataHandlerUnit(PyonTestCase):
         self.assertEqual(publisher.publish.call_count, 0)
         self.assertEqual(log_mock.warn.call_count, 3)
 
+    def _batch_granule(self, records):
+        granule = Mock(spec=Granule)
+        granule.records = records
+        return granule
+
+    @patch('ion.agents.data.handlers.base_data_handler.RecordDictionaryTool')
+    def test__publish_data_batches(self, RecordDictionaryTool_mock):
+        # the record dictionaries are lists of records, and concatenate into a granule that is their sum
+        RecordDictionaryTool_mock.load_from_granule.side_effect = lambda granule: list(granule.records)
+        RecordDictionaryTool_mock.concatenate.side_effect = lambda rdts: Mock(to_granule=Mock(return_value=sum(rdts, [])))
+        publisher = Mock()
+        update_new_data_check_attachment = Mock()
+        config = {'publish_batch_records': 6, 'external_dataset_res_id': sentinel.ext_ds_id,
+                  'set_new_data_check': sentinel.new_data_check}
+
+        data_generator = [self._batch_granule(range(3)), self._batch_granule(range(3, 6)), Mock(),
+                          self._batch_granule(range(6, 9)), self._batch_granule(range(9, 14)),
+                          self._batch_granule(range(14, 15))]
+        BaseDataHandler._publish_data(publisher=publisher, data_generator=data_generator, config=config,
+            update_new_data_check_attachment=update_new_data_check_attachment)
+
+        expected = [call(range(6)), call(range(6, 9)), call(range(9, 15))]
+        self.assertEqual(publisher.publish.call_args_list, expected)
+        update_new_data_check_attachment.assert_called_once_with(sentinel.ext_ds_id, sentinel.new_data_check)
+        publisher.close.assert_called_once_with()
+
+    @patch('ion.agents.data.handlers.base_data_handler.time')
+    @patch('ion.agents.data.handlers.base_data_handler.RecordDictionaryTool')
+    def test__publish_data_batch_interval(self, RecordDictionaryTool_mock, time_mock):
+        RecordDictionaryTool_mock.load_from_granule.side_effect = lambda granule: list(granule.records)
+        RecordDictionaryTool_mock.concatenate.side_effect = lambda rdts: Mock(to_granule=Mock(return_value=sum(rdts, [])))
+        time_mock.time.side_effect = [0, 0, 1, 2, 2, 3]
+        publisher = Mock()
+        update_new_data_check_attachment = Mock()
+        config = {'publish_batch_interval': 2}
+
+        def data_generator():
+            for i in xrange(4):
+                yield self._batch_granule([i])
+            raise IOError('lost the data source')
+
+        with self.assertRaises(IOError):
+            BaseDataHandler._publish_data(publisher=publisher, data_generator=data_generator(), config=config,
+                update_new_data_check_attachment=update_new_data_check_attachment)
+
+        # the granules gathered before the data source failed are still published
+        expected = [call([0, 1, 2]), call([3])]
+        self.assertEqual(publisher.publish.call_args_list, expected)
+        self.assertEqual(update_new_data_check_attachment.call_count, 0)
+
+    @patch('ion.agents.data.handlers.base_data_handler.RecordDictionaryTool')
+    def test__publish_data_batch_publish_fails(self, RecordDictionaryTool_mock):
+        RecordDictionaryTool_mock.load_from_granule.side_effect = lambda granule: list(granule.records)
+        RecordDictionaryTool_mock.concatenate.side_effect = lambda rdts: Mock(to_granule=Mock(return_value=sum(rdts, [])))
+        publisher = Mock()
+        publisher.publish.side_effect = [None, IOError('lost the exchange')]
+        update_new_data_check_attachment = Mock()
+        config = {'publish_batch_records': 2, 'external_dataset_res_id': sentinel.ext_ds_id,
+                  'set_new_data_check': sentinel.new_data_check}
+
+        data_generator = [self._batch_granule([i]) for i in xrange(5)]
+        with self.assertRaises(IOError):
+            BaseDataHandler._publish_data(publisher=publisher, data_generator=data_generator, config=config,
+                update_new_data_check_attachment=update_new_data_check_attachment)
+
+        # the failed batch is not retried, and no progress is recorded past it
+        expected = [call([0, 1]), call([2, 3])]
+        self.assertEqual(publisher.publish.call_args_list, expected)
+        self.assertEqual(update_new_data_check_attachment.call_count, 0)
+
     def test__publish_data_no_generator(self):
         publisher = Mock()
         data_generator = Mock()
@@ -782,3 +863,92 @@ class TestFibonacciDataHandlerUnit(PyonTestCase):
         for x in FibonacciDataHandler._get_data(config):
             self.assertTrue(isinstance(x, Granule))
             retval.to_granule.assert_any_call()
+
+
+class FakeResourceRegistry(object):
+    """
+    Resource registry client keeping the attachments in memory, every call takes latency seconds
+    """
+    latency = 0.005
+
+    def __init__(self):
+        self.attachments = {}
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        time.sleep(self.latency)
+
+    def find_attachments(self, resource_id, include_content=False, id_only=False):
+        self._call()
+        return [attachment for attachment_id, (res_id, attachment) in self.attachments.iteritems() if res_id == resource_id]
+
+    def delete_attachment(self, attachment_id):
+        self._call()
+        del self.attachments[attachment_id]
+
+    def create_attachment(self, resource_id, attachment):
+        self._call()
+        attachment_id = 'attachment_%d' % self.calls
+        attachment._id = attachment_id
+        self.attachments[attachment_id] = (resource_id, attachment)
+        return attachment_id
+
+
+@attr('BENCHMARK', group='eoi')
+class BaseDataHandlerPublishBenchmark(IonIntegrationTestCase):
+    # ~100 MB SBE52 profiler file, parsed 1000 records per granule
+    records = 9500000
+    profiles = 10
+    max_records = 1000
+
+    def setUp(self):
+        self._start_container()
+        self.container.start_rel_from_url('res/deploy/r2deploy.yml')
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'C0000001.DAT')
+        write_profiles(self.path, [self.records / self.profiles] * self.profiles)
+
+        pubsub = PubsubManagementServiceClient()
+        dataset_management = DatasetManagementServiceClient()
+        context_ids = []
+        for name in ('upload_time', 'time', 'conductivity', 'temp', 'pressure', 'oxygen'):
+            ctxt = ParameterContext(name, param_type=QuantityType(value_encoding=np.dtype('float64')))
+            if name == 'time':
+                ctxt.axis = AxisTypeEnum.TIME
+                ctxt.uom = 'seconds since 01-01-1970'
+            context_ids.append(dataset_management.create_parameter_context(name, ctxt.dump()))
+        pdict_id = dataset_management.create_parameter_dictionary('sbe52_benchmark', context_ids)
+        self.stream_def_id = pubsub.create_stream_definition(name='sbe52_benchmark', parameter_dictionary_id=pdict_id)
+
+    def acquire(self, **batching):
+        file_info = (self.path, os.path.getmtime(self.path), os.path.getsize(self.path), 0)
+        config = {
+            'constraints': {'new_files': [file_info]},
+            'set_new_data_check': [file_info],
+            'external_dataset_res_id': 'external_dataset',
+            'parser_mod': 'ion.agents.data.handlers.sbe52_binary_handler',
+            'parser_cls': 'SBE52BinaryCTDMemmapParser',
+            'max_records': self.max_records,
+            'stream_def': self.stream_def_id,
+        }
+        config.update(batching)
+
+        registry = FakeResourceRegistry()
+        publisher = Mock()
+        with patch('ion.agents.data.handlers.base_data_handler.ResourceRegistryServiceClient', return_value=registry):
+            start = time.time()
+            SBE52BinaryDataHandler._publish_data(publisher, SBE52BinaryDataHandler._get_data(config), config,
+                                                 SBE52BinaryDataHandler._update_new_data_check_attachment)
+            elapsed = time.time() - start
+
+        print '%-40s %10.1f records/sec %8d granules %8d registry calls' % (batching or 'granule per parser chunk',
+            self.records / elapsed, publisher.publish.call_count, registry.calls)
+        self.assertEqual(len(registry.attachments), 1)
+
+    def test_publish(self):
+        self.acquire()
+        self.acquire(publish_batch_records=50000)
+        self.acquire(publish_batch_interval=1.0)
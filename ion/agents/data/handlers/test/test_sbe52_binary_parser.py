@@ -8,12 +8,33 @@
 """
 
 from ooi.logging import log
-from ion.agents.data.handlers.sbe52_binary_handler import SBE52BinaryCTDParser
+from ion.agents.data.handlers.sbe52_binary_handler import SBE52BinaryCTDParser, SBE52BinaryCTDMemmapParser, MAX_RECORDS_PER_GRANULE
 from nose.plugins.attrib import attr
+from mock import patch
 from pyon.util.unit_test import PyonTestCase
 
+import numpy as np
+import os
+import resource
+import shutil
+import struct
+import tempfile
+import time
+
 CTD_FILE='test_data/C0000042.DAT'
 
+
+def write_profiles(path, profile_sizes, seed=0):
+    """ write a binary SBE52 file with random records, one profile per entry of profile_sizes """
+    rand = np.random.RandomState(seed)
+    with open(path, 'wb') as f:
+        for i, count in enumerate(profile_sizes):
+            records = rand.randint(0, 0xFF, (count, 11)).astype(np.uint8)
+            f.write(records.tostring())
+            f.write('\xff'*11)
+            f.write(struct.pack('>II', 1318219097+i*10000, 1318219097+i*10000+count))
+
+
 @attr('UNIT', group='eoi')
 class TestSBE52BinaryParser(PyonTestCase):
     def test_read_CTD(self):
@@ -56,3 +77,109 @@ class TestSBE52BinaryParser(PyonTestCase):
         self.assertAlmostEqual(37.9848, record['conductivity'], delta=0.01)
         self.assertAlmostEqual(9.5163, record['temp'], delta=0.01)
         self.assertAlmostEqual(1318219097, record['time'], delta=0.01)
+
+
+@attr('UNIT', group='eoi')
+class TestSBE52BinaryMemmapParser(PyonTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def assert_same_records(self, path, max_count, parse_after=0):
+        parser = SBE52BinaryCTDParser(path, parse_after=parse_after)
+        memmap_parser = SBE52BinaryCTDMemmapParser(path, parse_after=parse_after)
+        self.assertEqual(len(parser._profiles), len(memmap_parser._profiles))
+        while True:
+            records = parser.get_records(max_count)
+            memmap_records = memmap_parser.get_records(max_count)
+            if records is None:
+                self.assertIsNone(memmap_records)
+                break
+            self.assertEqual(len(records), len(memmap_records))
+            for record, memmap_record in zip(records, memmap_records):
+                self.assertEqual(sorted(record.keys()), sorted(memmap_record.keys()))
+                for key, value in record.iteritems():
+                    if key == 'upload_time':
+                        continue
+                    if np.isnan(value):
+                        self.assertTrue(np.isnan(memmap_record[key]))
+                    else:
+                        self.assertAlmostEqual(value, memmap_record[key])
+
+    def test_read_CTD(self):
+        parser = SBE52BinaryCTDMemmapParser(CTD_FILE)
+        record = parser.get_records(1)[0]
+
+        self.assertAlmostEqual(0, record['oxygen'], delta=0.01)
+        self.assertAlmostEqual(309.77, record['pressure'], delta=0.01)
+        self.assertAlmostEqual(37.9848, record['conductivity'], delta=0.01)
+        self.assertAlmostEqual(9.5163, record['temp'], delta=0.01)
+        self.assertAlmostEqual(1318219097, record['time'], delta=0.01)
+
+    def test_matches_parser(self):
+        for max_count in (1, 7, 1000):
+            self.assert_same_records(CTD_FILE, max_count)
+
+        path = os.path.join(self.tmp_dir, 'C0000001.DAT')
+        write_profiles(path, [10, 0, 25, 3])
+        # a small scan chunk so the terminators are found across chunks
+        with patch('ion.agents.data.handlers.sbe52_binary_handler.SCAN_CHUNK_RECORDS', 4):
+            for parse_after in (0, 1318219097+10005, 1318219097+20010):
+                self.assert_same_records(path, 7, parse_after)
+
+    def test_record_arrays(self):
+        parser = SBE52BinaryCTDMemmapParser(CTD_FILE)
+        arrays = parser.get_record_arrays(500)
+        self.assertEqual(sorted(arrays.keys()), ['conductivity', 'oxygen', 'pressure', 'temp', 'time', 'upload_time'])
+        self.assertEqual(500, len(arrays['time']))
+        self.assertTrue((np.diff(arrays['time']) >= 0).all())
+        self.assertEqual(13, len(parser.get_record_arrays(500)['time']))
+        self.assertIsNone(parser.get_record_arrays(500))
+
+    def test_bad_file(self):
+        path = os.path.join(self.tmp_dir, 'C0000002.DAT')
+        with open(path, 'wb') as f:
+            f.write('\x01'*30)
+        with self.assertRaises(Exception):
+            SBE52BinaryCTDMemmapParser(path)
+
+        path = os.path.join(self.tmp_dir, 'C0000003.DAT')
+        open(path, 'wb').close()
+        self.assertIsNone(SBE52BinaryCTDMemmapParser(path).get_records())
+
+
+@attr('BENCHMARK', group='eoi')
+class SBE52BinaryParserBenchmark(PyonTestCase):
+    # ~100 MB of records in 10 profiles
+    records = 9500000
+    profiles = 10
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def parse(self, parser_cls, path, max_count=MAX_RECORDS_PER_GRANULE):
+        start = time.time()
+        parser = parser_cls(path)
+        count = 0
+        while True:
+            records = parser.get_record_arrays(max_count) if hasattr(parser, 'get_record_arrays') else parser.get_records(max_count)
+            if records is None:
+                break
+            count += len(records['time']) if isinstance(records, dict) else len(records)
+        elapsed = time.time() - start
+        print '%-28s %8.1f MB %10d records %12.1f records/sec  maxrss=%d KB' % (parser_cls.__name__,
+            os.path.getsize(path) / 2.0**20, count, count / elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        return count
+
+    def test_parse(self):
+        # the in-memory parser refuses files over MAX_INMEMORY_SIZE, compare on a tenth of the records
+        small = os.path.join(self.tmp_dir, 'C0000010.DAT')
+        write_profiles(small, [self.records / self.profiles / 10] * self.profiles)
+        large = os.path.join(self.tmp_dir, 'C0000100.DAT')
+        write_profiles(large, [self.records / self.profiles] * self.profiles)
+
+        # the memory-mapped parser runs first so its maxrss is not inflated by the in-memory parser
+        self.assertEqual(self.parse(SBE52BinaryCTDMemmapParser, large), self.records)
+        count = self.parse(SBE52BinaryCTDMemmapParser, small)
+        self.assertEqual(self.parse(SBE52BinaryCTDParser, small), count)
@@ -12,9 +12,48 @@ from pyon.util.unit_test import PyonTestCase
 from nose.plugins.attrib import attr
 from mock import patch, Mock, MagicMock, sentinel
 from ion.agents.data.handlers.handler_utils import list_file_info
-from ion.agents.data.handlers.slocum_data_handler import SlocumDataHandler
+from ion.agents.data.handlers.slocum_data_handler import SlocumDataHandler, SlocumParser
 from ion.services.dm.utility.granule.record_dictionary import RecordDictionaryTool
 from interface.objects import ContactInformation, UpdateDescription, DatasetDescription, ExternalDataset, Granule
+from StringIO import StringIO
+
+import numpy as np
+import os
+import shutil
+import tempfile
+import time
+
+SLOCUM_FILE = 'test_data/slocum/ru05-2012-021-0-0-sbd.dat'
+
+
+def write_slocum_file(path, columns, records, seed=0):
+    """
+    Writes a synthetic glider ascii file with 14 header tags, columns sensors and a third of the values missing
+    """
+    rand = np.random.RandomState(seed)
+    data = rand.uniform(-1000, 1000, (records, columns))
+    data[rand.uniform(size=data.shape) < 0.33] = np.nan
+    with open(path, 'w') as f:
+        for i in xrange(14):
+            f.write('tag_%d: %d\n' % (i, i))
+        f.write(' '.join('sensor_%d' % i for i in xrange(columns)) + ' \n')
+        f.write(' '.join('m' for i in xrange(columns)) + ' \n')
+        f.write(' '.join('48'[i % 2] for i in xrange(columns)) + ' \n')
+        for row in data:
+            f.write(' '.join('NaN' if np.isnan(v) else '%.6g' % v for v in row) + ' \n')
+
+
+def parse_columns(path, header_size=17):
+    """
+    The data of a glider file read as SlocumParser did before it tokenized the file once, with one genfromtxt per column
+    """
+    body = open(path).read()
+    lines = body.splitlines()
+    sizes = {'1' : 'byte', '2' : 'short', '4' : 'float', '8' : 'double'}
+    data_map = {}
+    for i, (name, size) in enumerate(zip(lines[header_size - 3].split(), lines[header_size - 1].split())):
+        data_map[name] = np.genfromtxt(fname=StringIO(body), skip_header=header_size, usecols=i, dtype=sizes[size], missing_values='NaN')
+    return data_map
 
 
 @attr('UNIT', group='eoi')
@@ -118,3 +157,58 @@ class TestSlocumDataHandlerUnit(PyonTestCase):
         ret = SlocumDataHandler._constraints_for_historical_request(config)
         log.debug('test_constraints_for_historical_request: {0}'.format(config))
         self.assertEqual(ret['new_files'], list_file_info(config['ds_params']['base_url'], config['ds_params']['list_pattern']))
+
+
+@attr('UNIT', group='eoi')
+class TestSlocumParser(PyonTestCase):
+
+    def test_columns(self):
+        parser = SlocumParser(SLOCUM_FILE)
+        self.assertEqual(parser.header_map['filename'], 'ru05-2012-021-0-0')
+        self.assertEqual(parser.data.shape, (1882, 54))
+
+        expected = parse_columns(SLOCUM_FILE)
+        self.assertEqual(sorted(parser.data_map.keys()), sorted(expected.keys()))
+        for name, values in expected.iteritems():
+            self.assertEqual(parser.data_map[name].dtype, values.dtype)
+            np.testing.assert_array_equal(parser.data_map[name], values)
+
+        # the double sensors are views of the data
+        units, dtype = parser.sensor_map['m_gps_lat']
+        self.assertEqual(dtype, 'double')
+        self.assertTrue(np.may_share_memory(parser.data_map['m_gps_lat'], parser.data))
+
+    def test_instance_maps(self):
+        parser = SlocumParser(SLOCUM_FILE)
+        other = SlocumParser('test_data/slocum/ru03-001/ru03_2003_300_10_4_sbd.dat')
+        self.assertEqual(len(parser.data_map), 54)
+        self.assertEqual(len(other.data_map), 3)
+        self.assertNotEqual(parser.header_map['filename'], other.header_map['filename'])
+
+
+@attr('BENCHMARK', group='eoi')
+class SlocumParserBenchmark(PyonTestCase):
+    records = 5000
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_parse(self):
+        for columns in (100, 500):
+            path = os.path.join(self.tmp_dir, 'glider_%d.dat' % columns)
+            write_slocum_file(path, columns, self.records)
+
+            start = time.time()
+            expected = parse_columns(path)
+            per_column = time.time() - start
+
+            start = time.time()
+            parser = SlocumParser(path)
+            single_pass = time.time() - start
+
+            for name, values in expected.iteritems():
+                np.testing.assert_array_equal(parser.data_map[name], values)
+
+            print '%3d columns x %d records  genfromtxt per column %8.3f s  single pass %8.3f s  %6.1fx' % (
+                columns, self.records, per_column, single_pass, per_column / single_pass)
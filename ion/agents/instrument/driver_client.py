@@ -11,16 +11,21 @@ __license__ = 'Apache 2.0'
 
 import time
 import thread
+import threading
 
 # We import "regular" zmq, not the patched version because
 # we handle the nonblocking sockets directly as they need to work
 # with unpatched threads as well.
 import zmq
+import gevent
+import gevent.socket
 
 from ooi.logging import log
-from pyon.core.exception import ExceptionFactory
+from pyon.core.exception import ExceptionFactory, Timeout
 
 EXCEPTION_FACTORY = ExceptionFactory()
+
+
 class DriverClient(object):
     """
     Base class for driver clients, subclassed for specific messaging
@@ -215,3 +220,204 @@ class ZmqDriverClient(DriverClient):
             raise EXCEPTION_FACTORY.create_exception(*reply)
         else:
             return reply
+
+class ZmqPollerDriverClient(DriverClient):
+    """
+    A class for communicating with a ZMQ-based driver process without
+    sleep polling. Sockets are waited on with gevent (on the socket file
+    descriptor) or with a zmq.Poller when running in an unpatched thread,
+    so replies and events are delivered as soon as they arrive.
+    """
+    # Seconds stop_messaging waits for the event greenlet or thread.
+    stop_timeout = 5
+
+    def __init__(self, host, cmd_port, event_port, use_gevent=True, cmd_timeout=None):
+        """
+        Initialize members.
+        @param host Host string address of the driver process.
+        @param cmd_port Port number for the driver process command port.
+        @param event_port Port number for the driver process event port.
+        @param use_gevent Wait cooperatively with gevent rather than blocking the thread.
+        @param cmd_timeout Seconds to wait for a command reply, None waits forever.
+        """
+        DriverClient.__init__(self)
+        self.host = host
+        self.cmd_port = cmd_port
+        self.event_port = event_port
+        self.use_gevent = use_gevent
+        self.cmd_timeout = cmd_timeout
+        self.cmd_host_string = 'tcp://%s:%i' % (self.host, self.cmd_port)
+        self.event_host_string = 'tcp://%s:%i' % (self.host, self.event_port)
+        self.zmq_context = None
+        self.zmq_cmd_socket = None
+        self.zmq_evt_socket = None
+        self.event_thread = None
+        self.stop_event_thread = True
+
+    def _wait(self, sock, flags, timeout=None):
+        """
+        Wait until the socket is ready for flags (zmq.POLLIN or zmq.POLLOUT).
+        @param sock The zmq socket.
+        @param flags zmq.POLLIN or zmq.POLLOUT.
+        @param timeout Seconds to wait, None waits forever.
+        @retval True if the socket is ready, False on timeout.
+        """
+        if not self.use_gevent:
+            poller = zmq.Poller()
+            poller.register(sock, flags)
+            return bool(poller.poll(None if timeout is None else timeout * 1000))
+
+        # The zmq file descriptor is edge triggered, zmq.EVENTS is the
+        # authoritative readiness state.
+        deadline = None if timeout is None else time.time() + timeout
+        while not sock.getsockopt(zmq.EVENTS) & flags:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                gevent.socket.wait_read(sock.getsockopt(zmq.FD), timeout=remaining)
+            except gevent.socket.timeout:
+                pass
+        return True
+
+    def _connect_cmd_socket(self):
+        """
+        Open and connect a new command socket. Lingering requests are
+        dropped when it is closed.
+        """
+        self.zmq_cmd_socket = self.zmq_context.socket(zmq.REQ)
+        self.zmq_cmd_socket.setsockopt(zmq.LINGER, 0)
+        self.zmq_cmd_socket.connect(self.cmd_host_string)
+
+    def _reset_cmd_socket(self):
+        """
+        Replace the command socket after a reply did not arrive. A REQ socket
+        cannot send another request until it has received the reply.
+        """
+        self.zmq_cmd_socket.close()
+        self._connect_cmd_socket()
+        log.info('Driver client cmd socket reconnected to %s.' %
+                       self.cmd_host_string)
+
+    def start_messaging(self, evt_callback=None):
+        """
+        Initialize and start messaging resources for the driver process client.
+        Initializes command socket for sending requests, and starts an event
+        greenlet (or thread if not using gevent) that blocks on the event
+        socket independently of command request-reply.
+        """
+        self.zmq_context = zmq.Context()
+        self._connect_cmd_socket()
+        log.info('Driver client cmd socket connected to %s.' %
+                       self.cmd_host_string)
+        self.zmq_evt_socket = self.zmq_context.socket(zmq.SUB)
+        self.zmq_evt_socket.setsockopt(zmq.LINGER, 0)
+        self.zmq_evt_socket.connect(self.event_host_string)
+        self.zmq_evt_socket.setsockopt(zmq.SUBSCRIBE, '')
+        log.info('Driver client event socket connected to %s.' %
+                       self.event_host_string)
+        self.evt_callback = evt_callback
+        self.stop_event_thread = False
+
+        if self.use_gevent:
+            self.event_thread = gevent.spawn(self._recv_evt_messages)
+        else:
+            self.event_thread = threading.Thread(target=self._recv_evt_messages)
+            self.event_thread.daemon = True
+            self.event_thread.start()
+        log.info('Driver client messaging started.')
+
+    def _recv_evt_messages(self):
+        """
+        Deliver driver events to the event callback as they arrive.
+        """
+        sock = self.zmq_evt_socket
+        while not self.stop_event_thread:
+            # Wake up periodically to notice stop_messaging.
+            if not self._wait(sock, zmq.POLLIN, timeout=.5):
+                continue
+            while not self.stop_event_thread:
+                try:
+                    evt = sock.recv_pyobj(flags=zmq.NOBLOCK)
+                except zmq.ZMQError:
+                    break
+                log.trace('got event: %s', evt)
+                if self.evt_callback:
+                    try:
+                        self.evt_callback(evt)
+                    except Exception:
+                        log.exception('Driver client event callback failed')
+        sock.close()
+        log.info('Client event socket closed.')
+
+    def stop_messaging(self):
+        """
+        Close messaging resources for the driver process client. Stop the
+        event greenlet or thread, close the sockets and terminate the context.
+        """
+        self.stop_event_thread = True
+        # The event greenlet or thread closes its socket on its way out.
+        if self.event_thread:
+            self.event_thread.join(timeout=self.stop_timeout)
+            if self.use_gevent:
+                stopped = self.event_thread.ready()
+            else:
+                stopped = not self.event_thread.is_alive()
+            if not stopped:
+                # Most likely stuck in the event callback. Its socket would
+                # keep the context from terminating, so close it here.
+                log.warning('Driver client event loop did not stop, closing its socket.')
+                if self.use_gevent:
+                    self.event_thread.kill(timeout=1)
+                self.zmq_evt_socket.close()
+        self.event_thread = None
+        self.zmq_evt_socket = None
+        self.zmq_cmd_socket.close()
+        self.zmq_cmd_socket = None
+        self.zmq_context.term()
+        self.zmq_context = None
+        self.evt_callback = None
+        log.info('Driver client messaging closed.')
+
+    def cmd_dvr(self, cmd, *args, **kwargs):
+        """
+        Command a driver by request-reply messaging. Package command
+        message and send on the command socket, then wait for the reply.
+        Return the driver reply.
+        @param cmd The driver command identifier.
+        @param args Positional arguments of the command.
+        @param kwargs Keyword arguments of the command.
+        @retval Command result.
+        @raises Timeout if cmd_timeout is set and no reply arrives in time,
+        the command socket is then reconnected for the next command.
+        """
+        # Package command dictionary.
+        msg = {'cmd':cmd,'args':args,'kwargs':kwargs}
+
+        log.debug('Sending command %s.' % str(msg))
+        self._wait(self.zmq_cmd_socket, zmq.POLLOUT)
+        self.zmq_cmd_socket.send_pyobj(msg, flags=zmq.NOBLOCK)
+
+        log.trace('Awaiting reply.')
+        timeout = self.cmd_timeout
+        if cmd == 'stop_driver_process' and timeout is None:
+            # The driver process may exit before replying.
+            timeout = 5
+        if not self._wait(self.zmq_cmd_socket, zmq.POLLIN, timeout=timeout):
+            self._reset_cmd_socket()
+            if cmd == 'stop_driver_process':
+                return 'driver stopping'
+            raise Timeout('Driver did not reply to %s within %s seconds' % (cmd, self.cmd_timeout))
+        try:
+            reply = self.zmq_cmd_socket.recv_pyobj(flags=zmq.NOBLOCK)
+        except zmq.ZMQError:
+            raise SystemError('exception reading from zmq socket')
+
+        log.trace('Reply: %r', reply)
+
+        ## exception information is returned as a tuple (code, message, stacks)
+        if isinstance(reply, tuple) and len(reply)==3:
+            raise EXCEPTION_FACTORY.create_exception(*reply)
+        else:
+            return reply
+
@@ -25,7 +25,7 @@ from ion.agents.instrument.common import BaseEnum
 from ion.agents.instrument.exceptions import DriverLaunchException
 from ion.agents.instrument.exceptions import NotImplementedException
 from ion.agents.instrument.packet_factory_man import create_packet_builder
-from ion.agents.instrument.driver_client import ZmqDriverClient
+from ion.agents.instrument.driver_client import ZmqDriverClient, ZmqPollerDriverClient
 
 PYTHON_PATH = 'bin/python'
 CACHE_DIR = '/tmp'
@@ -39,6 +39,16 @@ class DriverProcessType(BaseEnum):
     EGG = 'ZMQEggDriverLauncher'
 
 
+class DriverTransport(BaseEnum):
+    """
+    Driver client transports, selected with the dvr_transport driver config key.
+    PICKLE is the legacy sleep-polling client, POLLER waits on the sockets
+    with the pickle framing the launched driver processes use.
+    """
+    PICKLE = 'pickle'
+    POLLER = 'poller'
+
+
 class DriverProcess(object):
     """
     Base class for driver process launcher
@@ -269,7 +279,11 @@ class DriverProcess(object):
         # Start client messaging and verify messaging.
         if not self._driver_client:
             try:
-                driver_client = ZmqDriverClient('localhost', self._command_port, self._event_port)
+                transport = self.config.get('dvr_transport', DriverTransport.PICKLE)
+                if transport == DriverTransport.POLLER:
+                    driver_client = ZmqPollerDriverClient('localhost', self._command_port, self._event_port)
+                else:
+                    driver_client = ZmqDriverClient('localhost', self._command_port, self._event_port)
                 self._driver_client = driver_client
             except Exception, e:
                 self.stop()
@@ -286,11 +300,15 @@ class ZMQPyClassDriverProcess(DriverProcess):
     dvr_mod :: the python module that defines the driver class
     dvr_cls :: the driver class defined in the module
 
+    Optional:
+    dvr_transport :: DriverTransport used by the client (default pickle)
+
     Example:
 
     driver_config = {
         dvr_mod: mi.instrument.seabird.sbe37smb.ooicore.driver
         dvr_cls: SBE37Driver
+        dvr_transport: DriverTransport.POLLER
 
         process_type: DriverProcessType.PYTHON_MODULE
     }
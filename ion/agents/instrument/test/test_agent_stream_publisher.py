@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""
+@package ion.agents.instrument.test.test_agent_stream_publisher
+@file ion/agents/instrument/test/test_agent_stream_publisher.py
+@brief Test cases and benchmarks for the agent stream publisher buffering.
+"""
+
+__license__ = 'Apache 2.0'
+
+# Pyon log and config objects.
+from pyon.public import log
+
+from nose.plugins.attrib import attr
+from mock import patch, Mock
+
+# Pyon unittest support.
+from pyon.util.int_test import IonIntegrationTestCase
+
+from interface.services.dm.ipubsub_management_service import PubsubManagementServiceClient
+from interface.services.dm.idataset_management_service import DatasetManagementServiceClient
+from ion.services.dm.utility.granule_utils import RecordDictionaryTool
+
+from ion.agents.agent_stream_publisher import AgentStreamPublisher
+
+# Standard imports.
+import time
+
+"""
+bin/nosetests -s -v --nologcapture ion/agents/instrument/test/test_agent_stream_publisher.py:TestAgentStreamPublisher
+bin/nosetests -s -v --nologcapture -a BENCHMARK ion/agents/instrument/test/test_agent_stream_publisher.py
+"""
+
+
+class FakeAgent(object):
+    def __init__(self, stream_config):
+        self.CFG = {'stream_config' : stream_config}
+        self.resource_id = 'fake_instrument_device'
+        self._proc_name = 'fake_instrument_agent'
+        self.aparam_streams = {}
+        self.aparam_pubrate = {}
+
+
+class AgentStreamPublisherMixin(object):
+    def setUp(self):
+        super(AgentStreamPublisherMixin, self).setUp()
+        self._start_container()
+        self.container.start_rel_from_url('res/deploy/r2deploy.yml')
+
+        pubsub_client = PubsubManagementServiceClient(node=self.container.node)
+        dataset_management = DatasetManagementServiceClient()
+        pd_id = dataset_management.read_parameter_dictionary_by_name('ctd_parsed_param_dict', id_only=True)
+        self.stream_def_id = pubsub_client.create_stream_definition(name='parsed', parameter_dictionary_id=pd_id)
+        self.addCleanup(pubsub_client.delete_stream_definition, self.stream_def_id)
+
+        patcher = patch('ion.agents.agent_stream_publisher.StreamPublisher')
+        self.publisher = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+        self.agent = FakeAgent({'parsed' : {'stream_definition_ref' : self.stream_def_id,
+                                            'exchange_point' : 'science_data',
+                                            'routing_key' : 'parsed',
+                                            'stream_id' : 'parsed_stream_id'}})
+        self.asp = AgentStreamPublisher(self.agent)
+        self.asp.reset_connection()
+        self.addCleanup(self.asp.aparam_set_pubrate, {'parsed' : 0})
+
+    def sample(self, i):
+        return {'stream_name' : 'parsed',
+                'pkt_format_id' : 'JSON_Data',
+                'pkt_version' : 1,
+                'preferred_timestamp' : 'driver_timestamp',
+                'quality_flag' : 'ok',
+                'driver_timestamp' : 3564867147.0 + i * 0.0001,
+                'values' : [{'value_id' : 'temp', 'value' : 10.0 + i % 100},
+                            {'value_id' : 'conductivity', 'value' : 40.0},
+                            {'value_id' : 'pressure', 'value' : 100.0 + i % 7}]}
+
+    def published_rdts(self):
+        return [RecordDictionaryTool.load_from_granule(args[0])
+                for args, kwargs in self.publisher.publish.call_args_list]
+
+
+@attr('INT', group='mi')
+class TestAgentStreamPublisher(AgentStreamPublisherMixin, IonIntegrationTestCase):
+
+    def test_buffered_publish(self):
+        # a throttled stream only buffers the samples, the publish loop is driven by hand
+        self.asp.aparam_set_pubrate({'parsed' : 600})
+        for i in xrange(5):
+            self.asp.on_sample(self.sample(i))
+        self.assertEqual(self.publisher.publish.call_count, 0)
+        self.assertEqual(len(self.asp._stream_buffers['parsed']), 5)
+
+        self.asp._publish_stream_buffer('parsed')
+        self.assertEqual(len(self.asp._stream_buffers['parsed']), 0)
+        rdt = self.published_rdts()[0]
+        self.assertEqual(len(rdt), 5)
+        self.assertEqual(list(rdt['temp']), [10.0, 11.0, 12.0, 13.0, 14.0])
+        self.assertTrue((rdt['time'][1:] > rdt['time'][:-1]).all())
+
+        # an empty buffer publishes nothing
+        self.asp._publish_stream_buffer('parsed')
+        self.assertEqual(self.publisher.publish.call_count, 1)
+
+        # unthrottled samples are published one granule each
+        self.asp.aparam_set_pubrate({'parsed' : 0})
+        self.asp.on_sample(self.sample(5))
+        self.asp.on_sample(self.sample(6))
+        rdts = self.published_rdts()
+        self.assertEqual([len(rdt) for rdt in rdts], [5, 1, 1])
+        self.assertEqual([rdt.connection_index for rdt in rdts], ['0', '1', '2'])
+        self.assertEqual(rdts[2]['temp'][0], 16.0)
+
+
+@attr('BENCHMARK', group='mi')
+class AgentStreamPublisherBenchmark(AgentStreamPublisherMixin, IonIntegrationTestCase):
+    # 10 kHz samples, the publish loop runs every pubrate seconds of samples
+    sample_rate = 10000
+
+    def run_samples(self, pubrate, seconds):
+        self.publisher.reset_mock()
+        samples = [self.sample(i) for i in xrange(self.sample_rate * seconds)]
+        self.asp.aparam_set_pubrate({'parsed' : pubrate or 0})
+        if pubrate:
+            # the timing is simulated, the loop greenlet is only kept so on_sample buffers
+            self.asp._stream_greenlets['parsed'].kill()
+            self.asp._stream_greenlets['parsed'] = Mock()
+        per_publish = self.sample_rate * pubrate
+
+        start = time.time()
+        for i, sample in enumerate(samples):
+            self.asp.on_sample(sample)
+            if per_publish and (i + 1) % per_publish == 0:
+                self.asp._publish_stream_buffer('parsed')
+        self.asp._publish_stream_buffer('parsed')
+        elapsed = time.time() - start
+
+        self.asp._stream_greenlets['parsed'] = None
+        print 'pubrate %2d s  %8d samples  %12.1f samples/sec  %8d granules' % (pubrate, len(samples),
+            len(samples) / elapsed, self.publisher.publish.call_count)
+
+    def test_pubrates(self):
+        # a granule per sample is far slower than the instrument, keep that run short
+        self.run_samples(0, 1)
+        self.run_samples(1, 20)
+        self.run_samples(10, 20)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+"""
+@package ion.agents.instrument.test.test_driver_client
+@file ion/agents/instrument/test/test_driver_client.py
+@brief Loopback tests and benchmarks for the driver client transports.
+"""
+
+__license__ = 'Apache 2.0'
+
+import time
+import multiprocessing
+
+import gevent
+import zmq
+from gevent.event import Event
+from nose.plugins.attrib import attr
+
+from pyon.util.unit_test import PyonTestCase
+from pyon.core.exception import BadRequest, Timeout
+
+from ion.agents.instrument.driver_client import ZmqDriverClient, ZmqPollerDriverClient
+
+
+def run_loopback_driver(ports):
+    """
+    Minimal driver process. Echoes commands and publishes bursts of sample
+    events, runs in a child process.
+    """
+    context = zmq.Context()
+    cmd_sock = context.socket(zmq.REP)
+    evt_sock = context.socket(zmq.PUB)
+    ports.put((cmd_sock.bind_to_random_port('tcp://127.0.0.1'),
+               evt_sock.bind_to_random_port('tcp://127.0.0.1')))
+
+    while True:
+        msg = cmd_sock.recv_pyobj()
+        cmd = msg['cmd']
+        kwargs = msg['kwargs']
+        if cmd == 'process_echo':
+            reply = kwargs.get('data')
+        elif cmd == 'process_sleep':
+            time.sleep(kwargs['seconds'])
+            reply = kwargs['seconds']
+        elif cmd == 'test_events':
+            reply = kwargs['count']
+        elif cmd == 'stop_driver_process':
+            reply = 'driver stopping'
+        else:
+            reply = (BadRequest.status_code, 'unknown command %s' % cmd, [])
+
+        cmd_sock.send_pyobj(reply)
+
+        if cmd == 'test_events':
+            sample = kwargs['sample']
+            for i in xrange(kwargs['count']):
+                evt_sock.send_pyobj(sample)
+        elif cmd == 'stop_driver_process':
+            break
+
+    cmd_sock.close()
+    evt_sock.close()
+    context.term()
+
+
+class LoopbackDriverMixin(object):
+    def start_loopback(self):
+        ports = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_loopback_driver, args=(ports,))
+        process.daemon = True
+        process.start()
+        self.addCleanup(process.terminate)
+        return ports.get(timeout=10)
+
+    def make_client(self, transport, **kwargs):
+        """
+        transport is 'legacy' or 'poller', kwargs go to the poller client.
+        """
+        cmd_port, evt_port = self.start_loopback()
+        if transport == 'legacy':
+            client = ZmqDriverClient('127.0.0.1', cmd_port, evt_port)
+        else:
+            client = ZmqPollerDriverClient('127.0.0.1', cmd_port, evt_port, **kwargs)
+        self.events = []
+        self.events_done = Event()
+        self.events_expected = 0
+        client.start_messaging(self.event_received)
+        return client
+
+    def event_received(self, evt):
+        self.events.append(evt)
+        if len(self.events) >= self.events_expected:
+            self.events_done.set()
+
+
+@attr('UNIT', group='mi')
+class TestZmqPollerDriverClient(PyonTestCase, LoopbackDriverMixin):
+
+    def test_commands_and_events(self):
+        client = self.make_client('poller')
+        self.assertEquals(client.cmd_dvr('process_echo', data='test 1 2 3'), 'test 1 2 3')
+        with self.assertRaises(BadRequest):
+            client.cmd_dvr('no_such_command')
+
+        # Give the event subscription a moment to connect
+        gevent.sleep(.5)
+        self.events_expected = 3
+        client.cmd_dvr('test_events', count=3, sample={'value':1.5})
+        self.assertTrue(self.events_done.wait(5))
+        self.assertEquals(self.events, [{'value':1.5}] * 3)
+
+        client.done()
+
+    def test_command_after_timeout(self):
+        client = self.make_client('poller', cmd_timeout=.5)
+        with self.assertRaises(Timeout):
+            client.cmd_dvr('process_sleep', seconds=1)
+        self.assertEquals(client.cmd_dvr('process_echo', data='still here'), 'still here')
+        client.done()
+
+    def test_stop_with_stuck_event_callback(self):
+        client = self.make_client('poller')
+        client.stop_timeout = .5
+        release = Event()
+        stuck = Event()
+        def blocking_callback(evt):
+            stuck.set()
+            release.wait()
+        client.evt_callback = blocking_callback
+
+        gevent.sleep(.5)
+        client.cmd_dvr('test_events', count=1, sample={'value':1.5})
+        self.assertTrue(stuck.wait(5))
+
+        # the event socket is closed so the context can terminate
+        event_thread = client.event_thread
+        with gevent.Timeout(5):
+            client.stop_messaging()
+        self.assertTrue(event_thread.ready())
+        self.assertIsNone(client.zmq_context)
+
+
+@attr('BENCHMARK', group='mi')
+class DriverClientBenchmark(PyonTestCase, LoopbackDriverMixin):
+    sample = {'type':'DRIVER_ASYNC_EVENT_SAMPLE',
+              'value':{'stream_name':'parsed',
+                       'values':[{'value_id':'temp%d' % i, 'value':float(i)} for i in xrange(30)]}}
+
+    def test_transports(self):
+        for transport, commands, count in (('legacy', 10, 1000),
+                                           ('poller', 1000, 10000)):
+            client = self.make_client(transport)
+            gevent.sleep(.5)
+
+            start = time.time()
+            for i in xrange(commands):
+                client.cmd_dvr('process_echo', data=i)
+            rtt = (time.time() - start) / commands
+
+            self.events_done.clear()
+            self.events_expected = count
+            start = time.time()
+            client.cmd_dvr('test_events', count=count, sample=self.sample)
+            self.assertTrue(self.events_done.wait(60))
+            rate = count / (time.time() - start)
+
+            client.done()
+            print '%-8s command round trip %9.3f ms   sample events %10.1f events/sec' % (transport, rtt * 1000, rate)
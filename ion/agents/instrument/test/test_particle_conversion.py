@@ -27,7 +27,13 @@ from interface.services.dm.ipubsub_management_service import PubsubManagementSer
 from interface.services.dm.idataset_management_service import DatasetManagementServiceClient
 from ion.services.dm.utility.granule_utils import RecordDictionaryTool
 
-from ion.agents.populate_rdt import populate_rdt
+from ion.agents.populate_rdt import populate_rdt, ParticleConverter
+from coverage_model import ParameterContext, AxisTypeEnum, QuantityType, ArrayType
+
+# Standard imports.
+import base64
+import numpy
+import time
 
 """
 bin/nosetests -s -v --nologcapture ion/agents/instrument/test/test_particle_conversion.py:TestParticleConversion
@@ -173,7 +179,133 @@ class TestParticleConversion(IonIntegrationTestCase):
             rdt[x['value_id']] = None
         
         rdt = populate_rdt(rdt, particle_list)
-        
+
+    def test_columnar_conversion(self):
+        """
+        test_columnar_conversion
+        Converted columns match the particle by particle conversion.
+        """
+        stream_name = 'raw'
+        param_dict_name = 'ctd_raw_param_dict'
+        particle_list = [{u'quality_flag': u'ok',
+                          u'preferred_timestamp': u'port_timestamp',
+                          u'stream_name': u'raw',
+                          u'port_timestamp': 3578927113.3578925 + i,
+                          u'pkt_format_id': u'JSON_Data',
+                          u'pkt_version': 1,
+                          u'values': [{u'binary': True,
+                                       u'value_id': u'raw',
+                                       u'value': base64.b64encode('sample %d' % i)},
+                                    {u'value_id': u'length',
+                                     u'value': 8 + len(str(i))},
+                                    {u'value_id': u'type',
+                                     u'value': 1},
+                                    {u'value_id': u'checksum',
+                                     u'value': None if i % 2 else 7}],
+                          u'driver_timestamp': 3578927113.75216 + i} for i in xrange(10)]
+
+        pd_id = self.dataset_management.read_parameter_dictionary_by_name(param_dict_name, id_only=True)
+        stream_def_id = self.pubsub_client.create_stream_definition(name=stream_name, parameter_dictionary_id=pd_id)
+        rdt = populate_rdt(RecordDictionaryTool(stream_definition_id=stream_def_id), particle_list)
+        expected = populate_rdt_rows(RecordDictionaryTool(stream_definition_id=stream_def_id), particle_list)
+
+        self.assertEqual(sorted(k for k, v in rdt.iteritems()), sorted(k for k, v in expected.iteritems()))
+        for k, v in expected.iteritems():
+            numpy.testing.assert_array_equal(rdt[k], v)
+        self.assertEqual(list(rdt['raw']), ['sample %d' % i for i in xrange(10)])
+
+        # a converter is reusable for record dictionaries of the same stream definition
+        converter = ParticleConverter(RecordDictionaryTool(stream_definition_id=stream_def_id))
+        for i in xrange(2):
+            rdt = converter.populate(RecordDictionaryTool(stream_definition_id=stream_def_id), particle_list[i:])
+            numpy.testing.assert_array_equal(rdt['time'], expected['time'][i:])
+
+
+def populate_rdt_rows(rdt, vals):
+    """
+    The particle by particle conversion populate_rdt did before it converted columns, as a reference.
+    """
+    array_size = len(vals)
+    data_arrays = {}
+    data_arrays[rdt.temporal_parameter] = [None] * array_size
+    for i, particle in enumerate(vals):
+        for k,v in particle.iteritems():
+            if k == 'values':
+                for value_dict in v:
+                    value_id = value_dict['value_id']
+                    value = value_dict['value']
+                    if value_id in rdt:
+                        if value_id not in data_arrays:
+                            data_arrays[value_id] = [None] * array_size
+                        if 'binary' in value_dict:
+                            value = base64.b64decode(value)
+                        data_arrays[value_id][i] = value
+            elif k == 'driver_timestamp':
+                data_arrays[rdt.temporal_parameter][i] = v
+            elif k in rdt:
+                if k not in data_arrays:
+                    data_arrays[k] = [None] * array_size
+                data_arrays[k][i] = v
+    for k,v in data_arrays.iteritems():
+        rdt[k] = numpy.array(v)
+    return rdt
+
+
+@attr('BENCHMARK', group='mi')
+class ParticleConversionBenchmark(IonIntegrationTestCase):
+    """
+    Particles per second converted in batches of 1000 particles with 30 fields.
+    """
+    batch_size = 1000
+    batches = 20
+    # time, quality_flag, raw and the quantities
+    quantities = 27
+
+    def setUp(self):
+        self._start_container()
+        self.container.start_rel_from_url('res/deploy/r2deploy.yml')
+        pubsub_client = PubsubManagementServiceClient(node=self.container.node)
+        dataset_management = DatasetManagementServiceClient()
+
+        contexts = []
+        ctxt = ParameterContext('time', param_type=QuantityType(value_encoding=numpy.dtype('float64')))
+        ctxt.axis = AxisTypeEnum.TIME
+        ctxt.uom = 'seconds since 01-01-1900'
+        contexts.append(ctxt)
+        contexts.append(ParameterContext('quality_flag', param_type=ArrayType()))
+        contexts.append(ParameterContext('raw', param_type=ArrayType()))
+        for i in xrange(self.quantities):
+            contexts.append(ParameterContext('value_%d' % i, param_type=QuantityType(value_encoding=numpy.dtype('float32'))))
+        context_ids = [dataset_management.create_parameter_context(ctxt.name, ctxt.dump()) for ctxt in contexts]
+        pd_id = dataset_management.create_parameter_dictionary('particle_benchmark', context_ids, temporal_context='time')
+        self.stream_def_id = pubsub_client.create_stream_definition(name='particle_benchmark', parameter_dictionary_id=pd_id)
+
+    def make_particles(self, batch):
+        return [{'quality_flag' : 'ok',
+                 'preferred_timestamp' : 'driver_timestamp',
+                 'stream_name' : 'particle_benchmark',
+                 'pkt_format_id' : 'JSON_Data',
+                 'pkt_version' : 1,
+                 'driver_timestamp' : 3578927113.0 + batch * self.batch_size + i,
+                 'values' : [{'value_id' : 'raw', 'value' : base64.b64encode('raw sample %d' % i), 'binary' : True}] +
+                            [{'value_id' : 'value_%d' % j, 'value' : float(i * j)} for j in xrange(self.quantities)]}
+                for i in xrange(self.batch_size)]
+
+    def convert(self, batches, populate):
+        start = time.time()
+        for particles in batches:
+            rdt = populate(RecordDictionaryTool(stream_definition_id=self.stream_def_id), particles)
+        return self.batches * self.batch_size / (time.time() - start)
+
+    def test_conversion(self):
+        batches = [self.make_particles(batch) for batch in xrange(self.batches)]
+        converter = ParticleConverter(RecordDictionaryTool(stream_definition_id=self.stream_def_id))
+
+        for name, populate in (('particle by particle', populate_rdt_rows),
+                               ('populate_rdt', populate_rdt),
+                               ('cached ParticleConverter', converter.populate)):
+            print '%-26s %12.1f particles/sec' % (name, self.convert(batches, populate))
+
 
 """
 
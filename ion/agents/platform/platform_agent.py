@@ -60,7 +60,9 @@ import time
 from gevent import Greenlet
 from gevent import sleep
 from gevent import spawn
+from gevent import Timeout
 from gevent.event import AsyncResult
+from gevent.pool import Pool
 
 import pprint
 
@@ -218,6 +220,11 @@ class PlatformAgent(ResourceAgent):
         # self.CFG.endpoint.receive.timeout -- see on_init
         self._timeout = 160
 
+        # Number of children commanded concurrently (1: sequentially) and
+        # optional per-child timeout for those commands -- see on_init
+        self._children_parallelism = 1
+        self._children_timeout = None
+
         # to sync in _initialize
         self._async_children_launched = None
 
@@ -270,6 +277,8 @@ class PlatformAgent(ResourceAgent):
         log.trace("on_init")
 
         self._timeout = self.CFG.get_safe("endpoint.receive.timeout", self._timeout)
+        self._children_parallelism = self.CFG.get_safe("platform_agent.children_parallelism", self._children_parallelism)
+        self._children_timeout = self.CFG.get_safe("platform_agent.children_timeout", self._children_timeout)
         self._plat_config = self.CFG.get("platform_config", None)
         self._plat_config_processed = False
 
@@ -980,6 +989,7 @@ class PlatformAgent(ResourceAgent):
                                    stream_definition_id=stream_def)
 
         pub_params = {}
+        alert_values = {}
         selected_timestamps = None
 
         for param_name, param_value in driver_event.vals_dict.iteritems():
@@ -1003,7 +1013,7 @@ class PlatformAgent(ResourceAgent):
             # separate values and timestamps:
             vals, timestamps = zip(*param_value)
 
-            self._dispatch_value_alerts(stream_name, param_name, vals)
+            alert_values[param_name] = vals
 
             # Use fill_value in context to replace any None values:
             param_ctx = param_dict.get_context(param_name)
@@ -1024,6 +1034,8 @@ class PlatformAgent(ResourceAgent):
 
             selected_timestamps = timestamps
 
+        self._dispatch_value_alerts(stream_name, alert_values)
+
         if selected_timestamps is None:
             # that is, all param_name's were unrecognized; just return:
             return
@@ -1068,20 +1080,23 @@ class PlatformAgent(ResourceAgent):
             log.exception("%r: Platform agent could not publish data on stream %s.",
                           self._platform_id, stream_name)
 
-    def _dispatch_value_alerts(self, stream_name, param_name, vals):
+    def _dispatch_value_alerts(self, stream_name, alert_values):
         """
         Dispatches alerts related with the values that were just generated.
-        Note: for convenience at the moment, the AgentAlertManager.process_alerts
-        call is done for each value in the vals list. A future version may include
-        a more elaborated algorithm to analyze the sequence for alert purposes.
-        """
-        for value in vals:
-            if value is not None:
-                log.trace('%r: to call process_alerts: stream_name=%r '
-                          'value_id=%r value=%s',
-                          self._platform_id, stream_name, param_name, value)
-                self._aam.process_alerts(stream_name=stream_name,
-                                         value=value, value_id=param_name)
+        The values of all the attributes in the event are evaluated in one
+        AgentAlertManager.process_value_alerts call, so the aggregate status
+        is only updated once per event.
+
+        @param stream_name    stream the values belong to
+        @param alert_values   dict of param_name to the sequence of values
+        """
+        if not alert_values:
+            return
+
+        log.trace('%r: to call process_value_alerts: stream_name=%r '
+                  'value_ids=%s',
+                  self._platform_id, stream_name, alert_values.keys())
+        self._aam.process_value_alerts(stream_name, alert_values)
 
     def _handle_external_event_driver_event(self, driver_event):
 
@@ -1167,6 +1182,61 @@ class PlatformAgent(ResourceAgent):
 
         return retval
 
+    def _children_fan_out(self, poi, child_ids, process_child):
+        """
+        Calls process_child(child_id) for each of the given children,
+        sequentially or, if _children_parallelism > 1, concurrently on a
+        bounded pool with each child limited to _children_timeout seconds.
+
+        @param poi            "platform" or "instrument" for logging
+        @param child_ids      IDs of the children to process
+        @param process_child  Called as process_child(child_id); returns None
+                              if OK, otherwise an error message.
+
+        @return dict with children having caused some error. Empty if all
+                children were processed OK.
+        """
+        children_with_errors = {}
+
+        if self._children_parallelism <= 1 or len(child_ids) <= 1:
+            for child_id in child_ids:
+                err_msg = process_child(child_id)
+                if err_msg is not None:
+                    children_with_errors[child_id] = err_msg
+            return children_with_errors
+
+        def process_child_with_timeout(child_id):
+            try:
+                with Timeout(self._children_timeout):
+                    return process_child(child_id)
+            except Timeout:
+                err_msg = "%r: %s %r did not complete within %s secs" % (
+                          self._platform_id, poi, child_id, self._children_timeout)
+                log.error(err_msg)
+                return err_msg
+
+        time_start = time.time()
+        pool = Pool(self._children_parallelism)
+        greenlets = [(child_id, pool.spawn(process_child_with_timeout, child_id))
+                     for child_id in child_ids]
+        pool.join()
+
+        for child_id, greenlet in greenlets:
+            if greenlet.successful():
+                err_msg = greenlet.value
+            else:
+                err_msg = "%r: exception processing %s %r: %s" % (
+                          self._platform_id, poi, child_id, greenlet.exception)
+                log.error(err_msg)
+            if err_msg is not None:
+                children_with_errors[child_id] = err_msg
+
+        log.debug("%r: fan-out to %d %ss completed in %.3f secs. children_with_errors=%s",
+                  self._platform_id, len(child_ids), poi, time.time() - time_start,
+                  children_with_errors)
+
+        return children_with_errors
+
     def _get_recursion_parameter(self, method_name, *args, **kwargs):
         """
         Utility to extract the 'recursion' parameter.
@@ -1444,10 +1514,8 @@ class PlatformAgent(ResourceAgent):
         children_with_errors = {}
         if len(subplatform_ids):
             log.debug("%r: initializing subplatforms %s", self._platform_id, subplatform_ids)
-            for subplatform_id in subplatform_ids:
-                err_msg = self._initialize_subplatform(subplatform_id)
-                if err_msg is not None:
-                    children_with_errors[subplatform_id] = err_msg
+            children_with_errors = self._children_fan_out("platform", subplatform_ids,
+                                                          self._initialize_subplatform)
 
             log.debug("%r: _subplatforms_initialize completed. children_with_errors=%s",
                       self._platform_id, children_with_errors)
@@ -1520,7 +1588,7 @@ class PlatformAgent(ResourceAgent):
             log.debug("%r: executing command on my sub-platforms: %s",
                       self._platform_id, str(subplatform_ids))
 
-        for subplatform_id in self._pa_clients:
+        def process_child(subplatform_id):
             if expected_state:
                 pa_client = self._pa_clients[subplatform_id].pa_client
                 sub_state = pa_client.get_agent_state()
@@ -1530,7 +1598,7 @@ class PlatformAgent(ResourceAgent):
                     #
                     log.trace("%r: sub-platform %r already in state: %r",
                               self._platform_id, subplatform_id, expected_state)
-                    continue
+                    return None
 
             if isinstance(command, AgentCommand):
                 cmd = command
@@ -1543,11 +1611,14 @@ class PlatformAgent(ResourceAgent):
 
             if err_msg is not None:
                 # some error happened; publish event:
-                children_with_errors[subplatform_id] = err_msg
                 dd = self._pa_clients[subplatform_id]
                 self._status_manager.publish_device_failed_command_event(dd.resource_id,
                                                                          cmd,
                                                                          err_msg)
+            return err_msg
+
+        children_with_errors = self._children_fan_out("platform", self._pa_clients.keys(),
+                                                      process_child)
         return children_with_errors
 
     def _subplatforms_reset(self):
@@ -1708,12 +1779,8 @@ class PlatformAgent(ResourceAgent):
         subplatform_ids = self._get_subplatform_ids()
         assert subplatform_ids == self._pa_clients.keys()
 
-        children_with_errors = {}
-        if len(subplatform_ids):
-            for subplatform_id in subplatform_ids:
-                err_msg = self._shutdown_and_terminate_subplatform(subplatform_id)
-                if err_msg is not None:
-                    children_with_errors[subplatform_id] = err_msg
+        children_with_errors = self._children_fan_out("platform", subplatform_ids,
+                                                      self._shutdown_and_terminate_subplatform)
 
         return children_with_errors
 
@@ -1943,10 +2010,8 @@ class PlatformAgent(ResourceAgent):
         children_with_errors = {}
         if len(instrument_ids):
             log.debug("%r: initializing instruments %s", self._platform_id, instrument_ids)
-            for instrument_id in instrument_ids:
-                err_msg = self._initialize_instrument(instrument_id)
-                if err_msg is not None:
-                    children_with_errors[instrument_id] = err_msg
+            children_with_errors = self._children_fan_out("instrument", instrument_ids,
+                                                          self._initialize_instrument)
 
             log.debug("%r: _instruments_initialize completed. children_with_errors=%s",
                       self._platform_id, children_with_errors)
@@ -2017,7 +2082,7 @@ class PlatformAgent(ResourceAgent):
             log.debug("%r: executing command on my instruments: %s",
                       self._platform_id, str(instrument_ids))
 
-        for instrument_id in self._ia_clients:
+        def process_child(instrument_id):
             if expected_state:
                 ia_client = self._ia_clients[instrument_id].ia_client
                 sub_state = ia_client.get_agent_state()
@@ -2027,18 +2092,21 @@ class PlatformAgent(ResourceAgent):
                     #
                     log.trace("%r: instrument %r already in state: %r",
                               self._platform_id, instrument_id, expected_state)
-                    continue
+                    return None
 
             cmd = AgentCommand(command=command) if command else create_command(instrument_id)
             err_msg = execute_cmd(instrument_id, cmd)
 
             if err_msg is not None:
                 # some error happened; publish event:
-                children_with_errors[instrument_id] = err_msg
                 dd = self._ia_clients[instrument_id]
                 self._status_manager.publish_device_failed_command_event(dd.resource_id,
                                                                          cmd,
                                                                          err_msg)
+            return err_msg
+
+        children_with_errors = self._children_fan_out("instrument", self._ia_clients.keys(),
+                                                      process_child)
         return children_with_errors
 
     def _instruments_reset(self):
@@ -2188,12 +2256,8 @@ class PlatformAgent(ResourceAgent):
         instrument_ids = self._get_instrument_ids()
         assert instrument_ids == self._ia_clients.keys()
 
-        instruments_with_errors = {}
-        if len(instrument_ids):
-            for instrument_id in instrument_ids:
-                err_msg = self._shutdown_and_terminate_instrument(instrument_id)
-                if err_msg is not None:
-                    instruments_with_errors[instrument_id] = err_msg
+        instruments_with_errors = self._children_fan_out("instrument", instrument_ids,
+                                                         self._shutdown_and_terminate_instrument)
 
         return instruments_with_errors
 
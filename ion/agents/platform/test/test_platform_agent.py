@@ -14,12 +14,78 @@ __license__ = 'Apache 2.0'
 import unittest
 from nose.plugins.attrib import attr
 
+from gevent import sleep
+
+from ion.agents.platform.platform_agent import PlatformAgent
+
+import time
+
 
 @attr('UNIT', group='sa')
 class TestPlatformAgent(unittest.TestCase):
     """
-    Class intended for *unit* tests; currently none as the current focus is
-    on the more integrated behavior, see test_platform_agent_with_oms.
+    Class intended for *unit* tests; the more integrated behavior is covered
+    by test_platform_agent_with_rsn.
     """
-    # TODO define appropriate unit tests for the platform agent class.
-    pass
+
+    def _agent(self, children_parallelism, children_timeout=5):
+        # only the attributes used by _children_fan_out are set up
+        agent = PlatformAgent.__new__(PlatformAgent)
+        agent._platform_id = 'fake_platform'
+        agent._children_parallelism = children_parallelism
+        agent._children_timeout = children_timeout
+        return agent
+
+    def test_children_fan_out_errors(self):
+        processed = []
+
+        def process_child(child_id):
+            if child_id == 'slow':
+                sleep(5)
+            elif child_id == 'boom':
+                raise Exception('boom failed')
+            processed.append(child_id)
+            return 'bad child' if child_id == 'bad' else None
+
+        child_ids = ['ok1', 'slow', 'boom', 'bad', 'ok2']
+        agent = self._agent(children_parallelism=3, children_timeout=0.2)
+
+        start_time = time.time()
+        children_with_errors = agent._children_fan_out("platform", child_ids, process_child)
+        self.assertLess(time.time() - start_time, 2)
+
+        # a timeout or exception in one child does not keep the others from running
+        self.assertEquals(sorted(processed), ['bad', 'ok1', 'ok2'])
+        self.assertEquals(sorted(children_with_errors), ['bad', 'boom', 'slow'])
+        self.assertEquals(children_with_errors['bad'], 'bad child')
+        self.assertIn('did not complete within 0.2 secs', children_with_errors['slow'])
+        self.assertIn('boom failed', children_with_errors['boom'])
+
+    def test_children_fan_out_sequential(self):
+        processed = []
+
+        def process_child(child_id):
+            processed.append(child_id)
+            return 'bad child' if child_id == 'bad' else None
+
+        agent = self._agent(children_parallelism=1)
+        children_with_errors = agent._children_fan_out("instrument", ['a', 'bad', 'c'], process_child)
+        self.assertEquals(processed, ['a', 'bad', 'c'])
+        self.assertEquals(children_with_errors, {'bad': 'bad child'})
+
+    def test_children_fan_out_parallelism(self):
+        for children_parallelism in (1, 3):
+            active = [0]
+            max_active = [0]
+
+            def process_child(child_id):
+                active[0] += 1
+                max_active[0] = max(max_active[0], active[0])
+                sleep(0.05)
+                active[0] -= 1
+
+            agent = self._agent(children_parallelism)
+            child_ids = ['child_%d' % i for i in xrange(10)]
+            children_with_errors = agent._children_fan_out("platform", child_ids, process_child)
+            self.assertEquals(children_with_errors, {})
+            self.assertEquals(max_active[0], children_parallelism)
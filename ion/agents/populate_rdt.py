@@ -13,42 +13,95 @@ __license__ = 'Apache 2.0'
 import numpy
 import base64
 
+from coverage_model import QuantityType
+from ion.services.dm.utility.granule.record_dictionary import RecordDictionaryTool
+
 def populate_rdt(rdt, vals):
-    
-    
-    array_size = len(vals)
-    data_arrays = {}    
-        
-    # Populate the temporal parameter.
-    data_arrays[rdt.temporal_parameter] = [None] * array_size
-        
-    
-    for i, particle in enumerate(vals):
-        for k,v in particle.iteritems():
-            if k == 'values':
-                for value_dict in v:
-                    value_id = value_dict['value_id']
-                    value = value_dict['value']
-                    if value_id in rdt:
-                        if value_id not in data_arrays:
-                            data_arrays[value_id] = [None] * array_size
-                        if 'binary' in value_dict:
-                            value = base64.b64decode(value)
-                        data_arrays[value_id][i] = value
-            
-            elif k == 'driver_timestamp':
-                data_arrays[rdt.temporal_parameter][i] = v
-            
-            elif k in rdt:
-                if k not in data_arrays:
-                    data_arrays[k] = [None] * array_size
-                data_arrays[k][i] = v
-                
-    for k,v in data_arrays.iteritems():
-        rdt[k] = numpy.array(v)
-    
-    return rdt
-                
+    """
+    Populates rdt with the particles in vals.
+    """
+    return ParticleConverter(rdt).populate(rdt, vals)
+
+
+class ParticleConverter(object):
+    """
+    Converts particles to record dictionary columns. The fields and value
+    encodings of the record dictionary are looked up once, so a converter
+    can be kept per stream and reused for every batch of particles with
+    record dictionaries of the same stream definition.
+    """
+    def __init__(self, rdt):
+        self.temporal_parameter = rdt.temporal_parameter
+        self.fields = frozenset(k for k in rdt if k in rdt)
+        self.dtypes = {}
+        if isinstance(rdt, RecordDictionaryTool):
+            for k in self.fields:
+                param_type = rdt.param_type(k)
+                if isinstance(param_type, QuantityType):
+                    self.dtypes[k] = param_type.value_encoding
+
+    def populate(self, rdt, vals):
+        """
+        Transposes the particles into one list per field in a single pass,
+        then sets each field of rdt from its list.
+        """
+        array_size = len(vals)
+        fields = self.fields
+        temporal_parameter = self.temporal_parameter
+        data_arrays = {}
+        binary_indexes = {}
+
+        # Populate the temporal parameter.
+        timestamps = data_arrays[temporal_parameter] = [None] * array_size
+
+        for i, particle in enumerate(vals):
+            for k,v in particle.iteritems():
+                if k == 'values':
+                    for value_dict in v:
+                        value_id = value_dict['value_id']
+                        if value_id in fields:
+                            data_array = data_arrays.get(value_id)
+                            if data_array is None:
+                                data_array = data_arrays[value_id] = [None] * array_size
+                            data_array[i] = value_dict['value']
+                            if 'binary' in value_dict:
+                                binary_indexes.setdefault(value_id, []).append(i)
+
+                elif k == 'driver_timestamp':
+                    timestamps[i] = v
+
+                elif k in fields:
+                    data_array = data_arrays.get(k)
+                    if data_array is None:
+                        data_array = data_arrays[k] = [None] * array_size
+                    data_array[i] = v
+
+        for k,indexes in binary_indexes.iteritems():
+            data_array = data_arrays[k]
+            decoded = map(base64.b64decode, [data_array[i] for i in indexes])
+            for i, value in zip(indexes, decoded):
+                data_array[i] = value
+
+        for k,v in data_arrays.iteritems():
+            rdt[k] = self._to_array(k, v)
+
+        return rdt
+
+    def _to_array(self, k, v):
+        """
+        Converts the list of values of field k in one step to the field's
+        value encoding. Lists with missing values are left to the record
+        dictionary, which replaces them with the fill value.
+        """
+        dtype = self.dtypes.get(k)
+        if dtype is not None:
+            try:
+                if None not in v:
+                    return numpy.asarray(v, dtype=dtype)
+            except (TypeError, ValueError):
+                pass
+        return numpy.array(v)
+
 """
 OLD
 def populate_rdt(rdt, vals):
@@ -41,6 +41,10 @@
       ooiparams= if True (default is False) create links to OOI parameter definitions
       exportui= if True, writes interface/ui_specs.json with UI object
       revert= if True (and debug==True) remove all resources and associations created if preload fails
+      parallel= number of categories to load concurrently (default 0: load categories in sequence). Categories
+          are scheduled by the preload IDs they reference and CATEGORY_DEPENDENCIES; org assignments are stored in
+          one batch per category
+      profile= path of a JSON file to write per category load timings to
 
     TODO:
       support attachments using HTTP URL
@@ -61,7 +65,11 @@ import copy
 import csv
 import re
 import requests
+import sys
 import time
+from gevent.local import local
+from gevent.pool import Pool
+from gevent.queue import Queue
 from udunitspy.udunits2 import UdunitsError
 
 from pyon.core.bootstrap import get_service_registry
@@ -174,6 +182,12 @@ DEFINITION_CATEGORIES = [
     'StreamConfiguration',
 ]
 
+# The following lists, for parallel loading, categories that use resources of earlier categories without
+# referencing their preload IDs in a cell, e.g. by name
+CATEGORY_DEPENDENCIES = {
+    'StreamConfiguration': ['ParameterDictionary'],     # cfg/parameter_dictionary_name
+}
+
 # The following lists the scenarios that are always ignored
 IGNORE_SCENARIOS = ["", "DOC", "DOC:README", "STOP!", "X"]
 
@@ -189,8 +203,22 @@ ID_WEB_AUTH_ACTOR = "USER_WEB_AUTH"
 
 UUID_RE = '^[0-9a-fA-F]{32}$'
 
+def _category_attr(name):
+    """
+    Attribute holding state of the category being loaded. It is greenlet local, so that independent
+    categories can be loaded concurrently.
+    """
+    return property(lambda self: getattr(self._category_state, name),
+                    lambda self, value: setattr(self._category_state, name, value))
+
+
 class IONLoader(ImmediateProcess):
 
+    bulk_objects = _category_attr('bulk_objects')        # Objects to be bulk inserted/updated at the end of a category
+    org_assignments = _category_attr('org_assignments')  # (org alias, resource id) to be stored at the end of a category
+    row_count = _category_attr('row_count')              # Counts all executions of row for category
+    ext_count = _category_attr('ext_count')              # Counts all executions of ext for category
+
     def __init__(self, *a, **b):
         super(IONLoader, self).__init__(*a,**b)
 
@@ -217,6 +245,9 @@ class IONLoader(ImmediateProcess):
 
         self.idmapping = {}             # Mapping of current to new preload IDs
 
+        self._category_state = local()  # Per category load state, see _category_attr
+        self.load_profile = []          # Per category load timings
+
     def on_start(self):
         cfg = self.CFG.get("cfg", None)
         if cfg:
@@ -301,6 +332,8 @@ class IONLoader(ImmediateProcess):
             self.clearcols = config.get("clearcols", None)          # Clear given columns in rows
             self.idmap = bool(config.get("idmap", False))           # Substitute column values in rows
             self.ooiparams = bool(config.get("ooiparams", False))   # Hook up with loaded OOI params
+            self.parallel = int(config.get("parallel", 0))          # Number of categories to load concurrently
+            self.profile = config.get("profile", None)              # Write category load timings to file
             if self.clearcols:
                 self.clearcols = self.clearcols.split(",")
 
@@ -515,56 +548,142 @@ class IONLoader(ImmediateProcess):
         # before you see an error
         self._read_and_parse(scenarios)
 
-        for index, category in enumerate(self.categories):
-            t = Timer() if stats.is_log_enabled() else None
-            self.bulk_objects = {}    # This keeps objects to be bulk inserted/updated at the end of a category
-            self.row_count, self.ext_count = 0, 0  # Counts all executions of row/ext for category
+        self.load_profile = []
+        if getattr(self, "parallel", 0) > 1:
+            self._load_categories_parallel(self.parallel)
+        else:
+            for index, category in enumerate(self.categories):
+                self._load_category(index, category)
+        if getattr(self, "profile", None):
+            self._write_load_profile(self.profile)
 
-            if category in self.excludecategories and category not in DEFINITION_CATEGORIES:
-                continue
+    def _load_category(self, index, category):
+        """
+        Loads the OOI assets and preload rows of one category
+        """
+        t = Timer() if stats.is_log_enabled() else None
+        self.bulk_objects = {}
+        self.org_assignments = []
+        self.row_count, self.ext_count = 0, 0
 
-            # First load all OOI assets for this category
-            if self.loadooi:
-                catfunc_ooi = getattr(self, "_load_%s_OOI" % category, None)
-                if catfunc_ooi:
-                    log.debug('Loading OOI assets for %s', category)
-                    catfunc_ooi()
-                if t:
-                    t.complete_step('preload.%s.catfunc' % category)
+        if category in self.excludecategories and category not in DEFINITION_CATEGORIES:
+            return
+        start = time.time()
+
+        # First load all OOI assets for this category
+        if self.loadooi:
+            catfunc_ooi = getattr(self, "_load_%s_OOI" % category, None)
+            if catfunc_ooi:
+                log.debug('Loading OOI assets for %s', category)
+                catfunc_ooi()
+            if t:
+                t.complete_step('preload.%s.catfunc' % category)
 
-            # Now load entries from preload spreadsheet top to bottom where scenario matches
-            if category not in self.object_definitions or not self.object_definitions[category]:
-                log.debug('no rows for category: %s', category)
+        # Now load entries from preload spreadsheet top to bottom where scenario matches
+        if category not in self.object_definitions or not self.object_definitions[category]:
+            log.debug('no rows for category: %s', category)
 
-            for row in self.object_definitions.get(category, []):
-                if COL_ID in row:
-                    log.trace('handling %s row %s: %r', category, row[COL_ID], row)
-                else:
-                    log.trace('handling %s row: %r', category, row)
+        for row in self.object_definitions.get(category, []):
+            if COL_ID in row:
+                log.trace('handling %s row %s: %r', category, row[COL_ID], row)
+            else:
+                log.trace('handling %s row: %r', category, row)
 
-                try:
-                    self.load_row(category, row)
-                except Exception:
-                    log.error('error loading %s row: %r', category, row, exc_info=True)
-                    raise
+            try:
+                self.load_row(category, row)
+            except Exception:
+                log.error('error loading %s row: %r', category, row, exc_info=True)
+                raise
 
-            source_row_count = len(self.object_definitions.get(category, []))
-            if t:
-                t.complete_step('preload.%s.load_row'%category)
-            if self.bulk:
-                num_bulk = self._finalize_bulk(category)
-                # Update resource and associations views
-                self.container.resource_registry.find_resources(restype="X", id_only=True)
-                self.container.resource_registry.find_associations(predicate="X", id_only=True)
-                # should we assert that num_bulk==source_row_count??
-                log.info("bulk loaded category %s: %d rows (%s bulk, %s source, %s ext)", category, self.row_count, num_bulk, source_row_count, self.ext_count)
-                if t:
-                    t.complete_step('preload.%s.bulk_load' % category)
-            else:
-                log.info("loaded category %s (%d/%d): %d rows (%s source, %s ext)", category, index+1, len(self.categories), self.row_count, source_row_count, self.ext_count)
+        source_row_count = len(self.object_definitions.get(category, []))
+        if t:
+            t.complete_step('preload.%s.load_row'%category)
+        if self.org_assignments:
+            self._finalize_org_assignments(category)
+        if self.bulk:
+            num_bulk = self._finalize_bulk(category)
+            # Update resource and associations views
+            self.container.resource_registry.find_resources(restype="X", id_only=True)
+            self.container.resource_registry.find_associations(predicate="X", id_only=True)
+            # should we assert that num_bulk==source_row_count??
+            log.info("bulk loaded category %s: %d rows (%s bulk, %s source, %s ext)", category, self.row_count, num_bulk, source_row_count, self.ext_count)
             if t:
-                stats.add(t)
-                stats.add_value('preload.%s.row_count' % category, self.row_count)
+                t.complete_step('preload.%s.bulk_load' % category)
+        else:
+            log.info("loaded category %s (%d/%d): %d rows (%s source, %s ext)", category, index+1, len(self.categories), self.row_count, source_row_count, self.ext_count)
+        if t:
+            stats.add(t)
+            stats.add_value('preload.%s.row_count' % category, self.row_count)
+        self.load_profile.append(dict(category=category, start=start, end=time.time(), duration=time.time() - start,
+                                      row_count=self.row_count, source_row_count=source_row_count, ext_count=self.ext_count))
+
+    def _category_dependencies(self, categories):
+        """
+        Returns a dict of category to the set of categories that have to be loaded before it. A category depends
+        on the earlier categories whose preload IDs are referenced in its rows, and on the earlier categories listed
+        for it in CATEGORY_DEPENDENCIES. IDMap and, with loadooi, categories
+        importing OOI assets generate or rewrite rows of later categories, so they are loaded on their own.
+        """
+        alias_category = {}
+        for category in categories:
+            for row in self.object_definitions.get(category, []):
+                if row.get(COL_ID):
+                    alias_category.setdefault(row[COL_ID], category)
+
+        barriers = set(category for category in categories
+                       if category == "IDMap" or (self.loadooi and hasattr(self, "_load_%s_OOI" % category)))
+        dependencies = {}
+        for index, category in enumerate(categories):
+            earlier = set(categories[:index])
+            if category in barriers:
+                dependencies[category] = earlier
+                continue
+            refs = set()
+            for row in self.object_definitions.get(category, []):
+                for value in row.itervalues():
+                    if value and isinstance(value, basestring):
+                        refs.update(alias_category.get(alias.strip()) for alias in value.split(","))
+            refs.update(CATEGORY_DEPENDENCIES.get(category, []))
+            dependencies[category] = (refs & earlier) | (barriers & earlier)
+        return dependencies
+
+    def _load_categories_parallel(self, parallelism):
+        """
+        Loads categories on a pool of parallelism greenlets, each as soon as the categories it depends on are loaded
+        """
+        pending = self._category_dependencies(self.categories)
+        positions = dict((category, index) for index, category in enumerate(self.categories))
+        for category, depends_on in pending.iteritems():
+            log.debug("category %s depends on %s", category, sorted(depends_on, key=positions.get))
+        done = Queue()
+        pool = Pool(parallelism)
+        running = 0
+        try:
+            while pending or running:
+                for category in [c for c in self.categories if c in pending and not pending[c]]:
+                    del pending[category]
+                    pool.spawn(self._load_category_task, positions[category], category, done)
+                    running += 1
+                category, exc_info = done.get()
+                running -= 1
+                if exc_info:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                for depends_on in pending.itervalues():
+                    depends_on.discard(category)
+        finally:
+            pool.kill()
+
+    def _load_category_task(self, index, category, done):
+        try:
+            self._load_category(index, category)
+            done.put((category, None))
+        except Exception:
+            done.put((category, sys.exc_info()))
+
+    def _write_load_profile(self, path):
+        with open(path, "w") as f:
+            json.dump(dict(categories=self.load_profile, parallel=getattr(self, "parallel", 0), bulk=self.bulk), f, indent=2)
+        log.info("Wrote preload profile for %d categories to %s", len(self.load_profile), path)
 
     def load_row(self, type, row):
         """ expose for use by utility function """
@@ -593,6 +712,28 @@ class IONLoader(ImmediateProcess):
         self.bulk_objects.clear()
         return num_objects
 
+    def _finalize_org_assignments(self, category):
+        """
+        Shares the resources of a category in their orgs, with one read and one bulk create of the associations
+        instead of one assign_resource_to_observatory_org call per assignment.
+        """
+        res_ids = list(set(res_id for org_id, res_id in self.org_assignments))
+        res_types = dict((res_obj._id, res_obj.type_) for res_obj in self.container.resource_registry.read_mult(res_ids))
+        assocs = []
+        for org_id, res_id in self.org_assignments:
+            assoc_obj = IonObject("Association",
+                s=self.resource_ids[org_id], st=RT.Org,
+                p=PRED.hasResource,
+                o=res_id, ot=res_types[res_id],
+                ts=get_ion_ts())
+            assoc_obj._id = create_unique_association_id()
+            assocs.append(assoc_obj)
+        self.resource_ds.create_mult(assocs, allow_ids=True)
+        # Update associations view
+        self.container.resource_registry.find_associations(predicate="X", id_only=True)
+        log.debug("Stored %d org assignments for category %s", len(assocs), category)
+        self.org_assignments = []
+
     def _create_object_from_row(self, objtype, row, prefix='',
                                 constraints=None, constraint_field='constraint_list',
                                 contacts=None, contact_field='contacts',
@@ -890,6 +1031,9 @@ class IONLoader(ImmediateProcess):
                     # Create association to given Org
                     # Simulate OMS.assign_resource_to_observatory_org -> Org MS.share_resource
                     assoc_obj = self._create_association(org_obj, PRED.hasResource, res_obj)
+                elif getattr(self, "parallel", 0) > 1:
+                    # Stored with the other assignments of the category in _finalize_org_assignments
+                    self.org_assignments.append((org_id, res_id))
                 else:
                     svc_client = self._get_service_client("observatory_management")
                     svc_client.assign_resource_to_observatory_org(res_id, self.resource_ids[org_id], headers=self._get_system_actor_headers())
@@ -7,9 +7,14 @@ from pyon.public import RT, PRED
 from pyon.util.int_test import IonIntegrationTestCase
 from pyon.util.unit_test import PyonTestCase
 import math
+import gevent
+import os
+import simplejson as json
+import tempfile
 from interface.services.dm.iingestion_management_service import IngestionManagementServiceClient
 import unittest
-from ion.processes.bootstrap.ion_loader import TESTED_DOC, IONLoader
+from ion.processes.bootstrap.ion_loader import TESTED_DOC, DEFAULT_CATEGORIES, IONLoader
+from ion.util.datastore.resources import ResourceRegistryHelper
 
 class TestLoaderAlgo(PyonTestCase):
 
@@ -68,6 +73,73 @@ class TestLoaderAlgo(PyonTestCase):
         self.assertEqual('temp', out['value_id'])
         self.assertEqual(3, len(out))
 
+    @attr('UNIT', group='loader')
+    def test_category_dependencies(self):
+        loader = IONLoader()
+        loader.loadooi = False
+        loader.object_definitions = {
+            'IDMap': [],
+            'User': [{'ID': 'USER_1', 'contact_id': ''}],
+            'Org': [{'ID': 'ORG_1', 'owner_id': 'USER_1'}],
+            'PlatformModel': [{'ID': 'PM_1', 'org_ids': 'ORG_1'}],
+            'InstrumentModel': [{'ID': 'IM_1', 'org_ids': ''}],
+            'PlatformDevice': [{'ID': 'PD_1', 'platform_model_id': 'PM_1', 'org_ids': 'ORG_1, ORG_ION'}],
+            }
+        categories = ['IDMap', 'User', 'Org', 'PlatformModel', 'InstrumentModel', 'PlatformDevice']
+        dependencies = loader._category_dependencies(categories)
+        self.assertEqual(dependencies, {
+            'IDMap': set(),
+            'User': set(['IDMap']),
+            'Org': set(['IDMap', 'User']),
+            'PlatformModel': set(['IDMap', 'Org']),
+            'InstrumentModel': set(['IDMap']),
+            'PlatformDevice': set(['IDMap', 'Org', 'PlatformModel']),
+            })
+
+        # Dependencies that are not preload IDs in a cell are declared
+        loader.object_definitions.update({
+            'ParameterDictionary': [{'ID': 'PD_1'}],
+            'StreamConfiguration': [{'ID': 'SC_1', 'cfg/parameter_dictionary_name': 'ctd_parsed_param_dict'}],
+            })
+        dependencies = loader._category_dependencies(['ParameterDictionary', 'StreamConfiguration'])
+        self.assertEqual(dependencies['StreamConfiguration'], set(['ParameterDictionary']))
+
+        # OOI asset imports are loaded on their own
+        loader.loadooi = True
+        dependencies = loader._category_dependencies(categories)
+        self.assertEqual(dependencies['InstrumentModel'], set(['IDMap', 'User', 'Org', 'PlatformModel']))
+        self.assertEqual(dependencies['PlatformDevice'], set(['IDMap', 'User', 'Org', 'PlatformModel', 'InstrumentModel']))
+
+    @attr('UNIT', group='loader')
+    def test_parallel_schedule(self):
+        loader = IONLoader()
+        loader.loadooi = False
+        loader.categories = ['User', 'Org', 'PlatformModel', 'InstrumentModel']
+        loader.object_definitions = {
+            'User': [{'ID': 'USER_1'}],
+            'Org': [{'ID': 'ORG_1', 'owner_id': 'USER_1'}],
+            'PlatformModel': [{'ID': 'PM_1', 'org_ids': 'ORG_1'}],
+            'InstrumentModel': [{'ID': 'IM_1', 'org_ids': ''}],
+            }
+        events = []
+        def load_category(index, category):
+            events.append(('start', category))
+            gevent.sleep(0.01)
+            events.append(('end', category))
+        loader._load_category = load_category
+        loader._load_categories_parallel(4)
+
+        # InstrumentModel is independent and loads while User is loading
+        self.assertEqual(events[:2], [('start', 'User'), ('start', 'InstrumentModel')])
+        self.assertLess(events.index(('end', 'User')), events.index(('start', 'Org')))
+        self.assertLess(events.index(('end', 'Org')), events.index(('start', 'PlatformModel')))
+
+        def fail_category(index, category):
+            raise ValueError(category)
+        loader._load_category = fail_category
+        with self.assertRaises(ValueError):
+            loader._load_categories_parallel(4)
+
 
 class TestLoader(IonIntegrationTestCase):
 
@@ -78,7 +150,7 @@ class TestLoader(IonIntegrationTestCase):
         self.ingestion_management = IngestionManagementServiceClient()
 
     def assert_can_load(self, scenarios, loadui=False, loadooi=False,
-            path=TESTED_DOC, ui_path='default'):
+            path=TESTED_DOC, ui_path='default', **kwargs):
         """ perform preload for given scenarios and raise exception if there is a problem with the data """
         config = dict(op="load",
                       scenario=scenarios,
@@ -88,6 +160,7 @@ class TestLoader(IonIntegrationTestCase):
                       path=path, ui_path=ui_path,
                       assets='res/preload/r2_ioc/ooi_assets',
                       bulk=loadooi)
+        config.update(kwargs)
         if loadooi:
             config["excludecategories"] = 'DataProduct,DataProductLink'
         self.container.spawn_process("Loader", "ion.processes.bootstrap.ion_loader", "IONLoader", config=config)
@@ -131,6 +204,56 @@ class TestLoader(IonIntegrationTestCase):
         """
         self.assert_can_load("BETA,DEVS", path='master')
 
+    @attr('INT', group='loader')
+    def test_parallel_load(self):
+        """ load categories concurrently and check the load profile """
+        fd, profile = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, profile)
+        self.assert_can_load("BETA,NOSE", parallel=4, profile=profile)
+
+        with open(profile) as f:
+            load_profile = json.load(f)
+        self.assertEquals(load_profile['parallel'], 4)
+        self.assertEquals(sorted(entry['category'] for entry in load_profile['categories']), sorted(DEFAULT_CATEGORIES))
+        self.find_object_by_name('Unit Test SMB37', RT.InstrumentDevice)
+
+    @attr('INT', group='loader')
+    def test_parallel_load_matches_sequential(self):
+        """ load a scenario in sequence and again with parallel categories, the same resources and associations result """
+        rrh = ResourceRegistryHelper(self.container)
+        snapshot = rrh.create_resources_snapshot()
+
+        self.assert_can_load("BETA,NOSE")
+        sequential = self.loaded_since(snapshot)
+        # Only remove what was created, revert_to_snapshot also deletes bootstrap resources updated by the load
+        self.container.resource_registry.rr_store.delete_mult(sequential['ids'])
+
+        self.assert_can_load("BETA,NOSE", parallel=4)
+        parallel = self.loaded_since(snapshot)
+
+        self.assertTrue(sequential['resources'])
+        self.assertEquals(parallel['resources'], sequential['resources'])
+        self.assertEquals(parallel['associations'], sequential['associations'])
+
+    def loaded_since(self, snapshot):
+        """ resources and associations created since snapshot, identified by type, name and lcstate instead of id """
+        rr = self.container.resource_registry
+        current = ResourceRegistryHelper(self.container).create_resources_snapshot()
+        new_res_ids = [res_id for res_id in current['resources'] if res_id not in snapshot['resources']]
+        new_assoc_ids = [assoc_id for assoc_id in current['associations'] if assoc_id not in snapshot['associations']]
+
+        res_keys = {}
+        def res_key(res_id):
+            if res_id not in res_keys:
+                res_obj = rr.read(res_id)
+                res_keys[res_id] = (res_obj.type_, getattr(res_obj, 'name', ''), getattr(res_obj, 'lcstate', ''))
+            return res_keys[res_id]
+
+        resources = sorted(res_key(res_obj._id) for res_obj in rr.read_mult(new_res_ids) if hasattr(res_obj, 'lcstate'))
+        associations = sorted((res_key(assoc.s), assoc.p, res_key(assoc.o)) for assoc in rr.read_mult(new_assoc_ids))
+        return dict(resources=resources, associations=associations, ids=new_res_ids + new_assoc_ids)
+
     def find_object_by_name(self, name, resource_type):
         objects,_ = self.container.resource_registry.find_resources(resource_type, id_only=False)
         self.assertGreaterEqual(len(objects), 1)
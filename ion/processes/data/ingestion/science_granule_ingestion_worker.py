@@ -34,6 +34,7 @@ import time
 import uuid
 import numpy as np
 from gevent.queue import Queue
+from gevent.event import Event
 
 REPORT_FREQUENCY=100
 MAX_RETRY_TIME=3600
@@ -59,6 +60,17 @@ class ScienceGranuleIngestionWorker(TransformStreamListener, BaseIngestionWorker
         # unique ID to identify this worker in log msgs
         self._id = uuid.uuid1()
 
+        #--------------------------------------------------------------------------------
+        # Micro-batching
+        # - Pending RDTs per stream
+        # - Flush deadline per stream
+        #--------------------------------------------------------------------------------
+        self._batches = collections.OrderedDict()
+        self._batch_deadlines = {}
+        self.batch_max_granules = 1
+        self.batch_max_latency = 0
+        self.batch_flusher = None
+
 
 
     def on_start(self): #pragma no cover
@@ -96,10 +108,28 @@ class ScienceGranuleIngestionWorker(TransformStreamListener, BaseIngestionWorker
         self.qc_publisher = EventPublisher(event_type=OT.ParameterQCEvent)
         self.connection_id = ''
         self.connection_index = None
+
+        #--------------------------------------------------------------------------------
+        # Micro-batching configuration
+        # - service.ingestion.batch_max_granules: granules written together per stream, 1 disables batching
+        # - service.ingestion.batch_max_latency_ms: oldest granule age at which a batch is written
+        # Buffered granules are acknowledged on receipt, before they are written. If the worker
+        # dies, up to batch_max_latency_ms (or batch_max_granules) of data per stream is lost.
+        #--------------------------------------------------------------------------------
+        self.batch_max_granules = self.CFG.get_safe('service.ingestion.batch_max_granules', 1)
+        self.batch_max_latency = self.CFG.get_safe('service.ingestion.batch_max_latency_ms', 1000) / 1000.
+        self.batch_lock = RLock()
+        self.batch_quit = Event()
+        if self.batch_max_granules > 1:
+            self.batch_flusher = self._process.thread_manager.spawn(self.flush_expired_batches_loop, thread_name='%s-batch-flusher' % self.id)
         
         self.start_listener()
 
     def on_quit(self): #pragma no cover
+        if self.batch_flusher:
+            self.batch_quit.set()
+            self.batch_flusher.join(timeout=10)
+        self.flush_all_batches()
         self.event_publisher.close()
         self.qc_publisher.close()
         if self.subscriber_thread:
@@ -124,6 +154,7 @@ class ScienceGranuleIngestionWorker(TransformStreamListener, BaseIngestionWorker
         with self.thread_lock:
             self.subscriber.close()
             self.subscriber_thread.join(timeout=10)
+            self.flush_all_batches()
             for stream, coverage in self._coverages.iteritems():
                 try:
                     coverage.close(timeout=5)
@@ -280,7 +311,82 @@ class ScienceGranuleIngestionWorker(TransformStreamListener, BaseIngestionWorker
             log.debug('Empty granule for stream %s', stream_id)
             return
 
-        self.persist_or_timeout(stream_id, rdt)
+        if self.batch_max_granules > 1:
+            self.buffer_granule(stream_id, rdt)
+        else:
+            self.persist_or_timeout(stream_id, rdt)
+
+    def buffer_granule(self, stream_id, rdt):
+        '''
+        Adds the RDT to the stream's pending batch, the batch is written as soon as it holds
+        batch_max_granules RDTs or its oldest RDT is older than batch_max_latency.
+        The granule's message is acknowledged when this returns, before the batch is written.
+        '''
+        with self.batch_lock:
+            batch = self._batches.get(stream_id)
+            if batch and not self.batch_accepts(batch[-1], rdt):
+                # Gaps and definition changes are only ever handled on batch boundaries
+                self.flush_batch(stream_id)
+                batch = None
+            if not batch:
+                batch = self._batches[stream_id] = []
+                self._batch_deadlines[stream_id] = time.time() + self.batch_max_latency
+            batch.append(rdt)
+            if len(batch) >= self.batch_max_granules or time.time() >= self._batch_deadlines[stream_id]:
+                self.flush_batch(stream_id)
+
+    def batch_accepts(self, previous, rdt):
+        '''
+        Determines if rdt can be appended to a batch ending with previous
+        '''
+        if previous._stream_def != rdt._stream_def:
+            return False
+        if self.ignore_gaps:
+            return True
+        if previous.connection_id != rdt.connection_id:
+            return False
+        try:
+            return int(rdt.connection_index) == int(previous.connection_index) + 1
+        except (TypeError, ValueError):
+            return True
+
+    def flush_batch(self, stream_id):
+        '''
+        Writes the stream's pending batch as a single granule: one expand, one flush and one DatasetModified event
+        '''
+        with self.batch_lock:
+            batch = self._batches.pop(stream_id, None)
+            self._batch_deadlines.pop(stream_id, None)
+            if not batch:
+                return
+            rdt = RecordDictionaryTool.concatenate(batch)
+            if rdt is None:
+                return
+            self.persist_or_timeout(stream_id, rdt)
+            self.update_connection_index(batch[-1].connection_id, batch[-1].connection_index)
+
+    def flush_all_batches(self):
+        with self.batch_lock:
+            for stream_id in self._batches.keys():
+                try:
+                    self.flush_batch(stream_id)
+                except:
+                    log.exception('Failed to flush the pending batch for stream %s', stream_id)
+
+    def flush_expired_batches(self):
+        with self.batch_lock:
+            now = time.time()
+            for stream_id, deadline in self._batch_deadlines.items():
+                if deadline > now:
+                    continue
+                try:
+                    self.flush_batch(stream_id)
+                except:
+                    log.exception('Failed to flush the pending batch for stream %s', stream_id)
+
+    def flush_expired_batches_loop(self):
+        while not self.batch_quit.wait(max(self.batch_max_latency / 2., 0.01)):
+            self.flush_expired_batches()
 
     def persist_or_timeout(self, stream_id, rdt):
         """ retry writing coverage multiple times and eventually time out """
@@ -7,7 +7,18 @@
 
 from pyon.util.unit_test import PyonTestCase
 from ion.processes.data.ingestion.science_granule_ingestion_worker import ScienceGranuleIngestionWorker
+from ion.services.dm.utility.granule import RecordDictionaryTool
+from ion.services.dm.utility.granule_utils import CoverageCraft, time_series_domain
+from coverage_model import SimplexCoverage
+from gevent.coros import RLock
+from mock import patch
 from nose.plugins.attrib import attr
+from uuid import uuid4
+
+import numpy as np
+import shutil
+import tempfile
+import time
 
 
 @attr('UNIT',group='dm')
@@ -40,4 +51,162 @@ class IngestionTest(PyonTestCase):
         self.assertFalse(ingestion.has_gap('',''))
 
 
+@attr('UNIT',group='dm')
+class IngestionBatchTest(PyonTestCase):
+    def setUp(self):
+        self.pdict = CoverageCraft.create_parameters()
+        self.persisted = []
+        self.ingestion = ScienceGranuleIngestionWorker()
+        self.ingestion.connection_id = ''
+        self.ingestion.connection_index = None
+        self.ingestion.ignore_gaps = False
+        self.ingestion.batch_max_granules = 10
+        self.ingestion.batch_max_latency = 3600
+        self.ingestion.batch_lock = RLock()
+        self.ingestion.persist_or_timeout = lambda stream_id, rdt: self.persisted.append((stream_id, rdt['time'].tolist()))
+
+    def make_rdt(self, t, connection_id='c1', connection_index=None, stream_def=None):
+        rdt = RecordDictionaryTool(param_dictionary=self.pdict)
+        rdt['time'] = np.array([t])
+        rdt.connection_id = connection_id
+        rdt.connection_index = str(t if connection_index is None else connection_index)
+        rdt._stream_def = stream_def
+        return rdt
+
+    def test_batch_full(self):
+        self.ingestion.batch_max_granules = 3
+        for t in xrange(7):
+            self.ingestion.buffer_granule('s1', self.make_rdt(t))
+        self.assertEquals(self.persisted, [('s1', [0,1,2]), ('s1', [3,4,5])])
+
+        self.ingestion.flush_all_batches()
+        self.assertEquals(self.persisted[-1], ('s1', [6]))
+        self.assertEquals(self.ingestion.connection_index, 6)
+
+    def test_batch_splits_on_gaps(self):
+        for t in (0, 1, 3):
+            self.ingestion.buffer_granule('s1', self.make_rdt(t))
+        self.assertEquals(self.persisted, [('s1', [0,1])])
+
+        self.ingestion.buffer_granule('s1', self.make_rdt(4, connection_id='c2'))
+        self.assertEquals(self.persisted, [('s1', [0,1]), ('s1', [3])])
+
+        # Streams are batched independently
+        self.ingestion.buffer_granule('s2', self.make_rdt(10))
+        self.ingestion.flush_all_batches()
+        self.assertEquals(self.persisted[2:], [('s1', [4]), ('s2', [10])])
+
+    def test_batch_splits_on_stream_definition(self):
+        self.ingestion.buffer_granule('s1', self.make_rdt(0, stream_def='sd1'))
+        self.ingestion.buffer_granule('s1', self.make_rdt(1, stream_def='sd1'))
+        self.ingestion.buffer_granule('s1', self.make_rdt(2, stream_def='sd2'))
+        self.assertEquals(self.persisted, [('s1', [0,1])])
+
+        self.ingestion.flush_all_batches()
+        self.assertEquals(self.persisted, [('s1', [0,1]), ('s1', [2])])
+
+    def test_batch_ignore_gaps(self):
+        self.ingestion.ignore_gaps = True
+        self.ingestion.buffer_granule('s1', self.make_rdt(0))
+        self.ingestion.buffer_granule('s1', self.make_rdt(5))
+        self.ingestion.buffer_granule('s1', self.make_rdt(6, connection_id='c2'))
+        self.assertEquals(self.persisted, [])
+
+        # Stream definition changes still split the batch
+        self.ingestion.buffer_granule('s1', self.make_rdt(7, connection_id='c2', stream_def='sd2'))
+        self.assertEquals(self.persisted, [('s1', [0,5,6])])
+
+    @patch('ion.processes.data.ingestion.science_granule_ingestion_worker.time')
+    def test_batch_latency_deadline(self, time_mock):
+        self.ingestion.batch_max_latency = 10
+
+        time_mock.time.return_value = 100
+        self.ingestion.buffer_granule('s1', self.make_rdt(0))
+        time_mock.time.return_value = 105
+        self.ingestion.buffer_granule('s1', self.make_rdt(1))
+        time_mock.time.return_value = 109
+        self.ingestion.flush_expired_batches()
+        self.assertEquals(self.persisted, [])
+
+        # The flusher writes the batch once its oldest granule is batch_max_latency old
+        time_mock.time.return_value = 110
+        self.ingestion.flush_expired_batches()
+        self.assertEquals(self.persisted, [('s1', [0,1])])
+
+        # A granule arriving after the deadline is written with its batch
+        time_mock.time.return_value = 120
+        self.ingestion.buffer_granule('s1', self.make_rdt(2))
+        time_mock.time.return_value = 131
+        self.ingestion.buffer_granule('s1', self.make_rdt(3))
+        self.assertEquals(self.persisted, [('s1', [0,1]), ('s1', [2,3])])
+
+
+@attr('BENCHMARK',group='dm')
+class IngestionBatchBenchmark(PyonTestCase):
+    granules = 1000
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root_dir, True)
+
+    def make_coverage(self):
+        sdom, tdom = time_series_domain()
+        pdict = CoverageCraft.create_parameters()
+        coverage = SimplexCoverage(self.root_dir, uuid4().hex, 'Ingestion benchmark', parameter_dictionary=pdict, temporal_domain=tdom, spatial_domain=sdom)
+        self.addCleanup(coverage.close)
+        return coverage
+
+    def make_worker(self, coverage, batch_size):
+        ingestion = ScienceGranuleIngestionWorker()
+        ingestion.connection_id = ''
+        ingestion.connection_index = None
+        ingestion.ignore_gaps = False
+        ingestion.qc_enabled = False
+        ingestion.batch_max_granules = batch_size
+        ingestion.batch_max_latency = 3600
+        ingestion.batch_lock = RLock()
+        ingestion.events = 0
+        ingestion.get_dataset = lambda stream_id: 'benchmark_dataset'
+        ingestion.get_coverage = lambda stream_id: coverage
+        ingestion.fill_lookup_values = lambda rdt: None
+        def dataset_changed(dataset_id, extents, window):
+            ingestion.events += 1
+        ingestion.dataset_changed = dataset_changed
+        return ingestion
+
+    def make_rdts(self, pdict):
+        rdts = []
+        for i in xrange(self.granules):
+            rdt = RecordDictionaryTool(param_dictionary=pdict)
+            rdt['time'] = np.array([i])
+            rdt['temp'] = np.array([10 + (i % 7)], dtype=np.float32)
+            rdt['conductivity'] = np.array([30 + (i % 5)], dtype=np.float32)
+            rdt['pressure'] = np.array([i % 11], dtype=np.float32)
+            rdt.connection_id = 'c1'
+            rdt.connection_index = str(i)
+            rdts.append(rdt)
+        return rdts
+
+    def run_batch_size(self, batch_size):
+        coverage = self.make_coverage()
+        ingestion = self.make_worker(coverage, batch_size)
+        rdts = self.make_rdts(coverage.parameter_dictionary)
+
+        start = time.time()
+        for rdt in rdts:
+            if batch_size > 1:
+                ingestion.buffer_granule('stream_id', rdt)
+            else:
+                ingestion.persist_or_timeout('stream_id', rdt)
+        ingestion.flush_all_batches()
+        elapsed = time.time() - start
+
+        self.assertEquals(coverage.num_timesteps, self.granules)
+        self.assertEquals(ingestion.events, -(-self.granules // batch_size))
+        np.testing.assert_array_equal(coverage.get_parameter_values('time'), np.arange(self.granules))
+        return self.granules / elapsed, ingestion.events
 
+    def test_batch_throughput(self):
+        for batch_size in (1, 10, 100):
+            rate, events = self.run_batch_size(batch_size)
+            print 'batch_max_granules=%-4d %10.1f granules/sec %6d flushes/events' % (batch_size, rate, events)
@@ -44,6 +44,9 @@ class ReplayProcess(BaseReplayProcess):
         start_time: 0         # Start time (index value) to be replayed
         end_time:   0         # End time (index value) to be replayed
         parameters: []        # List of parameters to form in the granule
+        publish_limit: 10     # Number of records per published granule
+        streaming: False      # Read and publish the coverage window by window
+        window_size: None     # Records per window when streaming (defaults to publish_limit)
       
 
     '''
@@ -57,6 +60,9 @@ class ReplayProcess(BaseReplayProcess):
     parameters      = None
     stream_id       = ''
     stream_def_id   = ''
+    streaming       = False
+    window_size     = None
+    time_scan_chunk = 1000000 # Records read at a time while resolving streamed time bounds
 
 
     def __init__(self, *args, **kwargs):
@@ -83,6 +89,8 @@ class ReplayProcess(BaseReplayProcess):
         self.parameters      = self.CFG.get_safe('process.query.parameters',None)
         self.publish_limit   = self.CFG.get_safe('process.query.publish_limit', 10)
         self.tdoa            = self.CFG.get_safe('process.query.tdoa',None)
+        self.streaming       = self.CFG.get_safe('process.query.streaming', False)
+        self.window_size     = self.CFG.get_safe('process.query.window_size', None) or self.publish_limit
         self.stream_id       = self.CFG.get_safe('process.publish_streams.output', '')
         self.stream_def      = pubsub.read_stream_definition(stream_id=self.stream_id)
         self.stream_def_id   = self.stream_def._id
@@ -108,9 +116,41 @@ class ReplayProcess(BaseReplayProcess):
         idx = TimeUtils.get_relative_time(coverage, units)
         return idx
 
+    @classmethod
+    def scan_time_indices(cls, coverage, timevals, chunk_size=None):
+        '''
+        Resolves every timestamp to its nearest time index like get_time_idx, in one scan of the time axis
+        that reads at most chunk_size (defaults to time_scan_chunk) records at a time
+        '''
+        temporal_variable = coverage.temporal_parameter_name
+        uom = coverage.get_parameter_context(temporal_variable).uom
+
+        units = TimeUtils.ts_to_units_array(uom, timevals)
+
+        idx = TimeUtils.scan_relative_times(coverage, units, chunk_size or cls.time_scan_chunk)
+        if idx is None:
+            raise BadRequest('Streaming time bounds are not supported for time units: %s' % uom)
+        return idx
+
+    @classmethod
+    def get_time_indices(cls, coverage, timevals, tolerance=None):
+        '''
+        Resolves every timestamp to its nearest time index at once, returns the sorted unique indices.
+        Timestamps further than tolerance (in the coverage's time units) from any sample are dropped.
+        '''
+        temporal_variable = coverage.temporal_parameter_name
+        uom = coverage.get_parameter_context(temporal_variable).uom
+
+        units = TimeUtils.ts_to_units_array(uom, timevals)
+
+        idx = TimeUtils.get_relative_times(coverage, units, tolerance)
+        if idx is None:
+            raise BadRequest('Striding is not supported for time units: %s' % uom)
+        return np.unique(idx[idx >= 0])
+
 
     @classmethod
-    def _coverage_to_granule(cls, coverage, start_time=None, end_time=None, stride_time=None, fuzzy_stride=True, parameters=None, stream_def_id=None, tdoa=None):
+    def _coverage_to_granule(cls, coverage, start_time=None, end_time=None, stride_time=None, fuzzy_stride=True, parameters=None, stream_def_id=None, tdoa=None, tolerance=None):
         slice_ = slice(None) # Defaults to all values
 
 
@@ -125,12 +165,10 @@ class ReplayProcess(BaseReplayProcess):
         if tdoa is not None and isinstance(tdoa,slice):
             slice_ = tdoa
         
-        elif stride_time is not None and not fuzzy_stride: # SLOW 
+        elif stride_time is not None and not fuzzy_stride:
             ugly_range = np.arange(start_time, end_time, stride_time)
-            idx_values = [cls.get_time_idx(coverage,i) for i in ugly_range]
-            idx_values = list(set(idx_values)) # Removing duplicates - also mixes the order of the list!!!
-            idx_values.sort()
-            slice_ = [idx_values]
+            idx_values = cls.get_time_indices(coverage, ugly_range, tolerance)
+            slice_ = [idx_values.tolist()]
 
 
         elif not (start_time is None and end_time is None):
@@ -152,9 +190,12 @@ class ReplayProcess(BaseReplayProcess):
         else:
             fields = rdt.fields
 
-        if slice_.start == slice_.stop and slice_.start is not None:
+        if isinstance(slice_, slice) and slice_.start == slice_.stop and slice_.start is not None:
             log.warning('Requested empty set of data.  %s', slice_)
             return rdt
+        if isinstance(slice_, list) and not slice_[0]:
+            log.warning('Requested timestamps resolved to no data.')
+            return rdt
         
         # Do time first
         tname = coverage.temporal_parameter_name
@@ -255,12 +296,68 @@ class ReplayProcess(BaseReplayProcess):
         
         return rdt.to_granule()
 
+    @classmethod
+    def _coverage_windows(cls, coverage, start_time=None, end_time=None, stride_time=None, window_size=10):
+        '''
+        Resolves the requested time range into consecutive time-index windows of at most window_size records each.
+        The start and end times are resolved together in one scan of the time axis, time_scan_chunk records at a time.
+        '''
+        start = 0
+        stop = coverage.num_timesteps
+        if stride_time is not None:
+            validate_is_instance(stride_time, Number, 'stride_time must be a number for striding.')
+        if start_time is not None:
+            validate_is_instance(start_time, Number, 'start_time must be a number for striding.')
+        if end_time is not None:
+            validate_is_instance(end_time, Number, 'end_time must be a number for striding.')
+        bounds = [t for t in (start_time, end_time) if t is not None]
+        if bounds:
+            indices = list(cls.scan_time_indices(coverage, bounds))
+            if start_time is not None:
+                start = int(indices.pop(0))
+            if end_time is not None:
+                stop = int(indices.pop(0))
+        span = window_size * int(stride_time or 1)
+        for i in xrange(start, stop, span):
+            yield slice(i, min(i + span, stop), stride_time)
+
+    @classmethod
+    def _stream_coverage(cls, coverage, start_time=None, end_time=None, stride_time=None, parameters=None, stream_def_id=None, window_size=10):
+        '''
+        Generates one record dictionary per time-index window, only a single window is read into memory at a time.
+        The start and end times are resolved time_scan_chunk records at a time
+        '''
+        tname = coverage.temporal_parameter_name
+        fields = None
+        for slice_ in cls._coverage_windows(coverage, start_time, end_time, stride_time, window_size):
+            if stream_def_id:
+                rdt = RecordDictionaryTool(stream_definition_id=stream_def_id)
+            else:
+                rdt = RecordDictionaryTool(param_dictionary=coverage.parameter_dictionary)
+            if fields is None:
+                fields = list(set(parameters).intersection(rdt.fields)) if parameters is not None else rdt.fields
+            # Do time first
+            cls.map_cov_rdt(coverage, rdt, tname, slice_)
+            for field in fields:
+                if field == tname:
+                    continue
+                cls.map_cov_rdt(coverage, rdt, field, slice_)
+            yield rdt
+
     def _replay(self):
         coverage = DatasetManagementService._get_coverage(self.dataset_id,mode='r')
+        if self.streaming:
+            try:
+                for rdt in self._stream_coverage(coverage, start_time=self.start_time, end_time=self.end_time, stride_time=self.stride_time, parameters=self.parameters, stream_def_id=self.stream_def_id, window_size=self.window_size):
+                    yield rdt
+            finally:
+                coverage.close(timeout=5)
+            return
+
         rdt = self._coverage_to_granule(coverage=coverage, start_time=self.start_time, end_time=self.end_time, stride_time=self.stride_time, parameters=self.parameters, stream_def_id=self.stream_def_id)
         elements = len(rdt)
         
-        for i in xrange(elements / self.publish_limit):
+        for i in xrange((elements + self.publish_limit - 1) / self.publish_limit):
             outgoing = RecordDictionaryTool(stream_definition_id=self.stream_def_id)
             fields = self.parameters or outgoing.fields
             for field in fields:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+'''
+@file ion/processes/data/replay/test/test_replay.py
+@description Tests and benchmarks for the replay process coverage reads
+'''
+
+from pyon.util.unit_test import PyonTestCase
+from ion.processes.data.replay.replay_process import ReplayProcess
+from ion.services.dm.utility.granule_utils import CoverageCraft, time_series_domain
+from ion.util.time_utils import TimeUtils
+from coverage_model import SimplexCoverage
+from nose.plugins.attrib import attr
+from uuid import uuid4
+
+import numpy as np
+import resource
+import shutil
+import tempfile
+import time
+
+
+class ReplayCoverageMixin(object):
+    def make_coverage(self, size):
+        root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root_dir, True)
+        sdom, tdom = time_series_domain()
+        pdict = CoverageCraft.create_parameters()
+        coverage = SimplexCoverage(root_dir, uuid4().hex, 'Replay test coverage', parameter_dictionary=pdict, temporal_domain=tdom, spatial_domain=sdom)
+        self.addCleanup(coverage.close)
+        coverage.insert_timesteps(size)
+        coverage.set_parameter_values('time', value=np.arange(size))
+        coverage.set_parameter_values('temp', value=np.arange(size, dtype=np.float32))
+        return coverage
+
+
+@attr('UNIT',group='dm')
+class ReplayStreamingTest(PyonTestCase, ReplayCoverageMixin):
+    def test_windows(self):
+        coverage = self.make_coverage(25)
+
+        windows = list(ReplayProcess._coverage_windows(coverage, window_size=10))
+        self.assertEquals(windows, [slice(0,10,None), slice(10,20,None), slice(20,25,None)])
+
+        windows = list(ReplayProcess._coverage_windows(coverage, start_time=3, end_time=20, stride_time=2, window_size=4))
+        self.assertEquals(windows, [slice(3,11,2), slice(11,19,2), slice(19,20,2)])
+
+    def test_scan_time_indices(self):
+        coverage = self.make_coverage(25)
+        coverage.set_parameter_values('time', value=np.array([5, 3, 9, 1, 7] * 5))
+
+        timevals = [0, 1, 4, 6, 8, 100]
+        expected = [ReplayProcess.get_time_idx(coverage, timeval) for timeval in timevals]
+        for chunk_size in (1, 4, 10, 30):
+            np.testing.assert_array_equal(ReplayProcess.scan_time_indices(coverage, timevals, chunk_size), expected)
+
+    def test_windows_scan_chunk(self):
+        coverage = self.make_coverage(25)
+        reads = []
+        get_parameter_values = coverage.get_parameter_values
+        def counting_get(*args, **kwargs):
+            reads.append(kwargs.get('tdoa'))
+            return get_parameter_values(*args, **kwargs)
+        coverage.get_parameter_values = counting_get
+
+        # Both bounds are resolved in one scan whose chunks don't depend on the window size
+        windows = list(ReplayProcess._coverage_windows(coverage, start_time=3, end_time=20, window_size=2))
+        self.assertEquals(windows[0], slice(3,5,None))
+        self.assertEquals(windows[-1], slice(19,20,None))
+        self.assertEquals(reads, [slice(0, ReplayProcess.time_scan_chunk)])
+
+    def test_stream_coverage(self):
+        coverage = self.make_coverage(25)
+
+        rdts = list(ReplayProcess._stream_coverage(coverage, parameters=['time','temp'], window_size=10))
+        self.assertEquals([len(rdt) for rdt in rdts], [10, 10, 5])
+        np.testing.assert_array_equal(np.concatenate([rdt['time'] for rdt in rdts]), np.arange(25))
+        np.testing.assert_array_equal(np.concatenate([rdt['temp'] for rdt in rdts]), np.arange(25, dtype=np.float32))
+
+        full = ReplayProcess._coverage_to_granule(coverage, start_time=3, end_time=20, stride_time=2, parameters=['time'])
+        rdts = list(ReplayProcess._stream_coverage(coverage, start_time=3, end_time=20, stride_time=2, parameters=['time'], window_size=4))
+        np.testing.assert_array_equal(np.concatenate([rdt['time'] for rdt in rdts]), full['time'])
+
+    def test_find_nearest_array(self):
+        arr = np.array([0., 10., 20., 30.])
+        vals = np.array([-5., 4., 6., 15., 29., 100.])
+        np.testing.assert_array_equal(TimeUtils.find_nearest_array(arr, vals), [TimeUtils.find_nearest(arr, v) for v in vals])
+        np.testing.assert_array_equal(TimeUtils.find_nearest_array(arr, vals, tolerance=1), [-1, -1, -1, -1, 3, -1])
+        np.testing.assert_array_equal(TimeUtils.find_nearest_array(arr[::-1], vals), [TimeUtils.find_nearest(arr[::-1], v) for v in vals])
+
+    def test_vectorized_stride(self):
+        coverage = self.make_coverage(100)
+
+        rdt = ReplayProcess._coverage_to_granule(coverage, start_time=0, end_time=100, stride_time=7.5, fuzzy_stride=False, parameters=['time','temp'])
+        expected = sorted(set([ReplayProcess.get_time_idx(coverage, t) for t in np.arange(0, 100, 7.5)]))
+        np.testing.assert_array_equal(rdt['time'], expected)
+
+        rdt = ReplayProcess._coverage_to_granule(coverage, start_time=0, end_time=100, stride_time=7.5, fuzzy_stride=False, parameters=['time'], tolerance=0.1)
+        np.testing.assert_array_equal(rdt['time'], np.arange(0, 100, 15))
+
+
+@attr('BENCHMARK',group='dm')
+class ReplayStrideBenchmark(PyonTestCase, ReplayCoverageMixin):
+    samples = 1000000
+
+    def test_stride_resolution(self):
+        coverage = self.make_coverage(self.samples)
+
+        for points in (1000, 100000, 1000000):
+            timestamps = np.linspace(0, self.samples, points, endpoint=False)
+            start = time.time()
+            indices = ReplayProcess.get_time_indices(coverage, timestamps)
+            elapsed = time.time() - start
+            self.assertEquals(len(indices), points)
+            print 'vectorized  %8d stride points %12.1f points/sec' % (points, points / elapsed)
+
+        timestamps = np.linspace(0, self.samples, 100, endpoint=False)
+        start = time.time()
+        indices = [ReplayProcess.get_time_idx(coverage, t) for t in timestamps]
+        elapsed = time.time() - start
+        np.testing.assert_array_equal(indices, ReplayProcess.get_time_indices(coverage, timestamps))
+        print 'per-point   %8d stride points %12.1f points/sec' % (len(timestamps), len(timestamps) / elapsed)
+
+
+@attr('BENCHMARK',group='dm')
+class ReplayStreamingBenchmark(PyonTestCase, ReplayCoverageMixin):
+    samples = 10000000
+
+    def test_streaming_replay(self):
+        coverage = self.make_coverage(self.samples)
+
+        for window_size in (1000, 10000, 100000, 1000000):
+            records = 0
+            peak_window = 0
+            last_time = None
+            start = time.time()
+            for rdt in ReplayProcess._stream_coverage(coverage, parameters=['time','temp'], window_size=window_size):
+                records += len(rdt)
+                peak_window = max(peak_window, rdt['time'].nbytes + rdt['temp'].nbytes)
+                last_time = rdt['time'][-1]
+            elapsed = time.time() - start
+
+            self.assertEquals(records, self.samples)
+            self.assertEquals(last_time, self.samples - 1)
+            print 'window_size=%-8d %12.1f records/sec  window bytes=%-10d maxrss=%d KB' % (window_size, records / elapsed, peak_window, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+    def test_streaming_replay_time_bounds(self):
+        coverage = self.make_coverage(self.samples)
+        start_time, end_time = self.samples / 4, self.samples - 1
+
+        for window_size in (10, 1000, 100000):
+            start = time.time()
+            first = iter(ReplayProcess._stream_coverage(coverage, start_time=start_time, end_time=end_time, parameters=['time'], window_size=window_size)).next()
+            first_granule = time.time() - start
+            self.assertEquals(first['time'][0], start_time)
+            print 'window_size=%-8d time bounds resolved, first granule after %8.3f sec' % (window_size, first_granule)
+
+        start = time.time()
+        records = 0
+        for rdt in ReplayProcess._stream_coverage(coverage, start_time=start_time, end_time=end_time, parameters=['time'], window_size=100000):
+            records += len(rdt)
+        elapsed = time.time() - start
+        self.assertEquals(records, end_time - start_time)
+        print 'window_size=%-8d time bounded %12.1f records/sec' % (100000, records / elapsed)
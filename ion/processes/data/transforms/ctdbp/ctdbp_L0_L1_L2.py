@@ -0,0 +1,131 @@
+"""
+@file ion/processes/data/transforms/ctdbp/ctdbp_L0_L1_L2.py
+@description Transforms incoming CTDBP parsed data into the L0, L1 and L2 density and salinity products in one process
+"""
+from pyon.util.log import log
+from pyon.core.exception import BadRequest
+from ion.core.process.transform import TransformDataProcess
+from ion.services.dm.utility.granule.record_dictionary import RecordDictionaryTool
+from ion.core.function.transform_function import SimpleGranuleTransformFunction
+from interface.services.dm.ipubsub_management_service import PubsubManagementServiceProcessClient
+
+from ion.processes.data.transforms.ctdbp.ctdbp_L0 import ctdbp_L0_algorithm
+from ion.processes.data.transforms.ctdbp.ctdbp_L1 import CTDBP_L1_TransformAlgorithm
+from ion.processes.data.transforms.ctdbp.ctdbp_L2_density import CTDBP_DensityTransformAlgorithm
+
+class CTDBP_L0_L1_L2_Transform(TransformDataProcess):
+    """
+    Fused CTDBP transform chain. The parsed granule is decoded once, the L0, L1, density and salinity
+    products are computed from the same arrays and each one is published on its own stream, instead of
+    running the L0, L1 and L2 transforms as separate processes republishing over the exchange.
+
+    The output streams are passed in publish_streams with the keys L0, L1, density and salinity, any
+    of which may be left out. The calibration coefficients, lat, lon and gsw_backend are configured
+    as for the individual transforms.
+    """
+    output_bindings = ['L0', 'L1', 'density', 'salinity']
+
+    def on_start(self):
+        super(CTDBP_L0_L1_L2_Transform, self).on_start()
+
+        config_streams = self.CFG.process.publish_streams
+        self.products = [name for name in self.output_bindings if config_streams.has_key(name)]
+        if not self.products:
+            raise BadRequest("For the fused CTDBP transform, please send the stream_ids for the products "
+                             "using the keywords %s" % ', '.join(self.output_bindings))
+
+        pubsub = PubsubManagementServiceProcessClient(process=self)
+        stream_defs = {}
+        for name in self.products:
+            stream_defs[name] = pubsub.read_stream_definition(stream_id=config_streams[name])._id
+
+        self.params = {'stream_defs' : stream_defs,
+                       'calibration_coeffs' : self.CFG.get_safe('process.calibration_coeffs'),
+                       'lat' : self.CFG.get_safe('process.lat', None),
+                       'lon' : self.CFG.get_safe('process.lon', None),
+                       'gsw_backend' : self.CFG.get_safe('process.gsw_backend', 'pygsw')}
+
+        if self.products != ['L0'] and not self.params['calibration_coeffs']:
+            raise BadRequest('Calibration coefficients are required to determine the L1 and L2 products')
+        if 'density' in self.products and (self.params['lat'] is None or self.params['lon'] is None):
+            raise BadRequest('Latitude and longitude are required to determine density')
+        if self.params['gsw_backend'] not in CTDBP_DensityTransformAlgorithm.GSW_BACKENDS:
+            raise BadRequest('Unknown GSW backend %s' % self.params['gsw_backend'])
+
+        log.debug("the params: %s", self.params)
+
+    def recv_packet(self, packet, stream_route, stream_id):
+        """
+        Processes incoming data!!!!
+        """
+        if packet == {}:
+            return
+
+        granules = CTDBP_L0_L1_L2_Algorithm.execute(packet, params=self.params)
+        for name in self.products:
+            getattr(self, name).publish(msg=granules[name])
+
+
+class CTDBP_L0_L1_L2_Algorithm(SimpleGranuleTransformFunction):
+
+    @staticmethod
+    @SimpleGranuleTransformFunction.validate_inputs
+    def execute(input=None, context=None, config=None, params=None, state=None):
+        """
+        Computes every requested product from one parsed granule with the L1 and L2 algorithms of the
+        individual CTDBP transforms. The practical salinity computed for density is the salinity product,
+        so both come from the same GSW backend.
+
+        @param input parsed granule
+        @param params dict of the product stream definition ids under stream_defs, any of L0, L1, density and
+                      salinity, the calibration_coeffs, and lat, lon and gsw_backend for density
+        @retval dict of product name to granule
+        """
+        stream_defs = params['stream_defs']
+
+        rdt = RecordDictionaryTool.load_from_granule(input)
+        time = rdt['time']
+        conductivity = rdt['conductivity']
+        pressure = rdt['pressure']
+        temperature = rdt['temperature']
+
+        granules = {}
+        if 'L0' in stream_defs:
+            granules['L0'] = ctdbp_L0_algorithm._build_granule(stream_definition_id=stream_defs['L0'],
+                field_names=['conductivity', 'pressure', 'temperature', 'time'],
+                values=[conductivity, pressure, temperature, time])
+
+        if len(granules) == len(stream_defs):
+            return granules
+
+        calibration_coeffs = params['calibration_coeffs']
+        temp_L1 = CTDBP_L1_TransformAlgorithm.calculate_temperature(temperature, calibration_coeffs['temp_calibration_coeffs'])
+        pressure_L1 = CTDBP_L1_TransformAlgorithm.calculate_pressure(pressure, temperature, calibration_coeffs['pres_calibration_coeffs'])
+        conductivity_L1 = CTDBP_L1_TransformAlgorithm.calculate_conductivity(conductivity, temp_L1, pressure_L1,
+                                                                             calibration_coeffs['cond_calibration_coeffs'])
+
+        if 'L1' in stream_defs:
+            granules['L1'] = ctdbp_L0_algorithm._build_granule(stream_definition_id=stream_defs['L1'],
+                field_names=['conductivity', 'pressure', 'temp', 'time'],
+                values=[conductivity_L1, pressure_L1, temp_L1, time])
+
+        if 'density' in stream_defs:
+            pracsal, dens_value = CTDBP_DensityTransformAlgorithm.calculate_density(conductivity_L1, temp_L1, pressure_L1,
+                                                                                    params['lat'], params['lon'],
+                                                                                    params.get('gsw_backend', 'pygsw'))
+            granules['density'] = ctdbp_L0_algorithm._build_granule(stream_definition_id=stream_defs['density'],
+                field_names=['density', 'time'],
+                values=[dens_value, time])
+
+        elif 'salinity' in stream_defs:
+            pracsal = CTDBP_DensityTransformAlgorithm.calculate_salinity(conductivity_L1, temp_L1, pressure_L1,
+                                                                         params.get('gsw_backend', 'pygsw'))
+
+        if 'salinity' in stream_defs:
+            granules['salinity'] = ctdbp_L0_algorithm._build_granule(stream_definition_id=stream_defs['salinity'],
+                field_names=['salinity', 'time'],
+                values=[pracsal, time])
+
+        log.debug("CTDBP L0 L1 L2 algorithm built the products: %s", granules.keys())
+
+        return granules
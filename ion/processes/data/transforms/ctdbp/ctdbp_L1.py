@@ -31,16 +31,36 @@ class CTDBP_L1_Transform(TransformDataProcess):
         stream_def = pubsub.read_stream_definition(stream_id=self.L1_stream_id)
         self.stream_definition_id = stream_def._id
 
-        self.temp_calibration_coeffs = self.CFG.process.calibration_coeffs['temp_calibration_coeffs']
-        self.pres_calibration_coeffs = self.CFG.process.calibration_coeffs['pres_calibration_coeffs']
-        self.cond_calibration_coeffs = self.CFG.process.calibration_coeffs['cond_calibration_coeffs']
+        self.params = {'stream_def' : self.stream_definition_id,
+                       'calibration_coeffs' : self.CFG.process.calibration_coeffs}
 
     def recv_packet(self, packet, stream_route, stream_id):
         if packet == {}:
             return
 
-        l0_values = RecordDictionaryTool.load_from_granule(packet)
-        l1_values = RecordDictionaryTool(stream_definition_id=self.stream_definition_id)
+        granule = CTDBP_L1_TransformAlgorithm.execute(packet, params=self.params)
+        self.publisher.publish(msg=granule)
+
+
+class CTDBP_L1_TransformAlgorithm(SimpleGranuleTransformFunction):
+    """
+    The L1 calculations on numpy arrays of L0 values, shared by the L1 transform
+    and the fused L0 -> L1 -> L2 transform.
+    """
+
+    @staticmethod
+    @SimpleGranuleTransformFunction.validate_inputs
+    def execute(input=None, context=None, config=None, params=None, state=None):
+        """
+        @param input L0 granule
+        @param params dict with the output stream definition id as stream_def and
+                      the calibration_coeffs of the process configuration
+        @retval L1 granule
+        """
+        calibration_coeffs = params['calibration_coeffs']
+
+        l0_values = RecordDictionaryTool.load_from_granule(input)
+        l1_values = RecordDictionaryTool(stream_definition_id=params['stream_def'])
         log.debug("CTDBP L1 transform using L0 values: tempurature %s, pressure %s, conductivity %s",
                   l0_values['temperature'], l0_values['pressure'], l0_values['conductivity'])
 
@@ -49,22 +69,26 @@ class CTDBP_L1_Transform(TransformDataProcess):
             if key in l1_values:
                 l1_values[key] = value[:]
 
-        l1_values['temp'] = self.calculate_temperature(l0=l0_values)
-        l1_values['pressure'] = self.calculate_pressure(l0=l0_values)
-        l1_values['conductivity'] = self.calculate_conductivity(l0=l0_values, l1=l1_values)
+        l1_values['temp'] = CTDBP_L1_TransformAlgorithm.calculate_temperature(l0_values['temperature'],
+                                                                              calibration_coeffs['temp_calibration_coeffs'])
+        l1_values['pressure'] = CTDBP_L1_TransformAlgorithm.calculate_pressure(l0_values['pressure'], l0_values['temperature'],
+                                                                               calibration_coeffs['pres_calibration_coeffs'])
+        l1_values['conductivity'] = CTDBP_L1_TransformAlgorithm.calculate_conductivity(l0_values['conductivity'],
+                                                                                       l1_values['temp'], l1_values['pressure'],
+                                                                                       calibration_coeffs['cond_calibration_coeffs'])
 
         log.debug('calculated L1 values: temp %s, pressure %s, conductivity %s',
                   l1_values['temp'], l1_values['pressure'], l1_values['conductivity'])
-        self.publisher.publish(msg=l1_values.to_granule())
+        return l1_values.to_granule()
 
-    def calculate_temperature(self, l0):
-        TEMPWAT_L0 = l0['temperature']
+    @staticmethod
+    def calculate_temperature(TEMPWAT_L0, temp_calibration_coeffs):
 
         #------------  CALIBRATION COEFFICIENTS FOR TEMPERATURE  --------------
-        a0 = self.temp_calibration_coeffs['TA0']
-        a1 = self.temp_calibration_coeffs['TA1']
-        a2 = self.temp_calibration_coeffs['TA2']
-        a3 = self.temp_calibration_coeffs['TA3']
+        a0 = temp_calibration_coeffs['TA0']
+        a1 = temp_calibration_coeffs['TA1']
+        a2 = temp_calibration_coeffs['TA2']
+        a3 = temp_calibration_coeffs['TA3']
 
         #------------  Computation -------------------------------------
         MV = (TEMPWAT_L0 - 524288) / 1.6e+007
@@ -74,26 +98,25 @@ class CTDBP_L1_Transform(TransformDataProcess):
 
         return TEMPWAT_L1
 
-    def calculate_pressure(self, l0):
-        PRESWAT_L0 = l0['pressure']
-        TEMPWAT_L0 = l0['temperature']
+    @staticmethod
+    def calculate_pressure(PRESWAT_L0, TEMPWAT_L0, pres_calibration_coeffs):
 
         #------------  CALIBRATION COEFFICIENTS FOR TEMPERATURE  --------------
-        PTEMPA0 = self.pres_calibration_coeffs['PTEMPA0']
-        PTEMPA1 = self.pres_calibration_coeffs['PTEMPA1']
-        PTEMPA2 = self.pres_calibration_coeffs['PTEMPA2']
+        PTEMPA0 = pres_calibration_coeffs['PTEMPA0']
+        PTEMPA1 = pres_calibration_coeffs['PTEMPA1']
+        PTEMPA2 = pres_calibration_coeffs['PTEMPA2']
 
-        PTCA0 = self.pres_calibration_coeffs['PTCA0']
-        PTCA1 = self.pres_calibration_coeffs['PTCA1']
-        PTCA2 = self.pres_calibration_coeffs['PTCA2']
+        PTCA0 = pres_calibration_coeffs['PTCA0']
+        PTCA1 = pres_calibration_coeffs['PTCA1']
+        PTCA2 = pres_calibration_coeffs['PTCA2']
 
-        PTCB0 = self.pres_calibration_coeffs['PTCB0']
-        PTCB1 = self.pres_calibration_coeffs['PTCB1']
-        PTCB2 = self.pres_calibration_coeffs['PTCB2']
+        PTCB0 = pres_calibration_coeffs['PTCB0']
+        PTCB1 = pres_calibration_coeffs['PTCB1']
+        PTCB2 = pres_calibration_coeffs['PTCB2']
 
-        PA0 = self.pres_calibration_coeffs['PA0']
-        PA1 = self.pres_calibration_coeffs['PA1']
-        PA2 = self.pres_calibration_coeffs['PA2']
+        PA0 = pres_calibration_coeffs['PA0']
+        PA1 = pres_calibration_coeffs['PA1']
+        PA2 = pres_calibration_coeffs['PA2']
 
         #------------  Computation -------------------------------------
         tvolt = TEMPWAT_L0 / 13107.0
@@ -105,18 +128,16 @@ class CTDBP_L1_Transform(TransformDataProcess):
 
         return PRESWAT_L1
 
-    def calculate_conductivity(self, l0, l1):
-        CONDWAT_L0 = l0['conductivity']
-        TEMPWAT_L1 = l1['temp']
-        PRESWAT_L1 = l1['pressure']
+    @staticmethod
+    def calculate_conductivity(CONDWAT_L0, TEMPWAT_L1, PRESWAT_L1, cond_calibration_coeffs):
 
         #------------  CALIBRATION COEFFICIENTS FOR CONDUCTIVITY  --------------
-        g = self.cond_calibration_coeffs['G']
-        h = self.cond_calibration_coeffs['H']
-        I = self.cond_calibration_coeffs['I']
-        j = self.cond_calibration_coeffs['J']
-        CTcor = self.cond_calibration_coeffs['CTCOR']
-        CPcor = self.cond_calibration_coeffs['CPCOR']
+        g = cond_calibration_coeffs['G']
+        h = cond_calibration_coeffs['H']
+        I = cond_calibration_coeffs['I']
+        j = cond_calibration_coeffs['J']
+        CTcor = cond_calibration_coeffs['CTCOR']
+        CPcor = cond_calibration_coeffs['CPCOR']
 
         log.debug('g %e, h %e, i %e, j %e, CTcor %e, CPcor %e', g, h, I, j, CTcor, CPcor)
 
@@ -132,4 +153,3 @@ class CTDBP_L1_Transform(TransformDataProcess):
         # Update the conductivity values
         #------------------------------------------------------------------------
         return CONDWAT_L1
-
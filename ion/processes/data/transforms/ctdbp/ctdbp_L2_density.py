@@ -33,11 +33,15 @@ class CTDBP_DensityTransform(TransformDataProcess):
         if lon is None:
             raise BadRequest('Longitude is required to determine density')
 
+        gsw_backend = self.CFG.get_safe('process.gsw_backend', 'pygsw')
+        if gsw_backend not in CTDBP_DensityTransformAlgorithm.GSW_BACKENDS:
+            raise BadRequest('Unknown GSW backend %s' % gsw_backend)
+
         # Read the parameter dict from the stream def of the stream
         pubsub = PubsubManagementServiceProcessClient(process=self)
         self.stream_definition = pubsub.read_stream_definition(stream_id=self.dens_stream_id)
 
-        self.params = {'stream_def' : self.stream_definition._id, 'lat': lat, 'lon' : lon}
+        self.params = {'stream_def' : self.stream_definition._id, 'lat': lat, 'lon' : lon, 'gsw_backend' : gsw_backend}
 
     def recv_packet(self, packet, stream_route, stream_id):
         """
@@ -56,6 +60,9 @@ class CTDBP_DensityTransform(TransformDataProcess):
 
 class CTDBP_DensityTransformAlgorithm(SimpleGranuleTransformFunction):
 
+    # pygsw, or the seawater.gibbs functions the transform used to compute alongside it
+    GSW_BACKENDS = ('pygsw', 'seawater')
+
     @staticmethod
     @SimpleGranuleTransformFunction.validate_inputs
     def execute(input=None, context=None, config=None, params=None, state=None):
@@ -80,6 +87,7 @@ class CTDBP_DensityTransformAlgorithm(SimpleGranuleTransformFunction):
         lat = params['lat']
         lon = params['lon']
         stream_def_id = params['stream_def']
+        gsw_backend = params.get('gsw_backend', 'pygsw')
 
 
         rdt = RecordDictionaryTool.load_from_granule(input)
@@ -93,41 +101,62 @@ class CTDBP_DensityTransformAlgorithm(SimpleGranuleTransformFunction):
         log.debug('L2 transform using L1 values: temp %s, pressure %s, conductivity %s',
                   temperature, pressure, conductivity)
 
+        pracsal, dens_value = CTDBP_DensityTransformAlgorithm.calculate_density(conductivity, temperature, pressure,
+                                                                                lat, lon, gsw_backend)
+
+        for key, value in rdt.iteritems():
+            if key in out_rdt:
+                if key=='conductivity' or key=='temp' or key=='pressure':
+                    continue
+                out_rdt[key] = value[:]
+
+        out_rdt['density'] = dens_value
+
+        return out_rdt.to_granule()
+
+    @staticmethod
+    def calculate_salinity(conductivity, temperature, pressure, gsw_backend='pygsw'):
+        """
+        Computes the practical salinity from the L1 values with the given GSW backend.
+        """
+        # Doing: PRACSAL = gsw_SP_from_C((CONDWAT_L1 * 10),TEMPWAT_L1,PRESWAT_L1)
+        if gsw_backend == 'seawater':
+            pracsal = SP_from_cndr(conductivity * 10, t=temperature, p=pressure)
+        else:
+            pracsal = gsw.sp_from_c(conductivity * 10, temperature, pressure)
+
+        log.debug("CTDBP Density algorithm calculated the pracsal (practical salinity) values: %s", pracsal)
+        return pracsal
+
+    @staticmethod
+    def calculate_density(conductivity, temperature, pressure, lat, lon, gsw_backend='pygsw'):
+        """
+        Computes the practical salinity and density from the L1 values with a
+        single GSW backend.
+
+        @retval (pracsal, density) tuple of numpy arrays
+        """
         latitude = np.ones(conductivity.shape) * lat
         longitude = np.ones(conductivity.shape) * lon
 
-        log.debug("Using latitude: %s, longitude: %s", latitude, longitude)
+        log.debug("Using latitude: %s, longitude: %s, GSW backend: %s", latitude, longitude, gsw_backend)
 
-        # Doing: PRACSAL = gsw_SP_from_C((CONDWAT_L1 * 10),TEMPWAT_L1,PRESWAT_L1)
-        pracsal = gsw.sp_from_c(conductivity * 10, temperature, pressure)
-        old_pracsal = SP_from_cndr(conductivity * 10, t=temperature, p=pressure)
+        if gsw_backend == 'seawater':
+            sa_from_sp, ct_from_t, density = SA_from_SP, conservative_t, rho
+        else:
+            sa_from_sp, ct_from_t, density = gsw.sa_from_sp, gsw.ct_from_t, gsw.rho
 
-        log.debug("CTDBP Density algorithm calculated the pracsal (practical salinity) values: %s (old: %s)", pracsal, old_pracsal)
+        pracsal = CTDBP_DensityTransformAlgorithm.calculate_salinity(conductivity, temperature, pressure, gsw_backend)
 
         # Doing: absolute_salinity = gsw_SA_from_SP(PRACSAL,PRESWAT_L1,longitude,latitude)
-        absolute_salinity = gsw.sa_from_sp(pracsal, pressure, longitude, latitude)
-        old_absolute_salinity = SA_from_SP(old_pracsal, pressure, longitude, latitude)
-        log.debug('absolute_salinity = SA_from_SP(pracsal=%s, pressure=%s, longitude=%s, latitude=%s)=%s (old value: %s)',
-                  pracsal, pressure, longitude, latitude, absolute_salinity, old_absolute_salinity)
-
+        absolute_salinity = sa_from_sp(pracsal, pressure, longitude, latitude)
         log.debug("CTDBP Density algorithm calculated the absolute_salinity (actual salinity) values: %s", absolute_salinity)
 
-        conservative_temperature = gsw.ct_from_t(absolute_salinity, temperature, pressure)
-        old_conservative_temperature = conservative_t(old_absolute_salinity, temperature, pressure)
-        log.debug("CTDBP Density algorithm calculated the conservative temperature values: %s (old value: %s)",
-                  conservative_temperature, old_conservative_temperature)
+        conservative_temperature = ct_from_t(absolute_salinity, temperature, pressure)
+        log.debug("CTDBP Density algorithm calculated the conservative temperature values: %s", conservative_temperature)
 
         # Doing: DENSITY = gsw_rho(absolute_salinity,conservative_temperature,PRESWAT_L1)
-        dens_value = gsw.rho(absolute_salinity, conservative_temperature, pressure)
-        old_dens_value = rho(old_absolute_salinity, old_conservative_temperature, pressure)
-        log.debug("Calculated density values: %s (old: %s)", dens_value, old_dens_value)
+        dens_value = density(absolute_salinity, conservative_temperature, pressure)
+        log.debug("Calculated density values: %s", dens_value)
 
-        for key, value in rdt.iteritems():
-            if key in out_rdt:
-                if key=='conductivity' or key=='temp' or key=='pressure':
-                    continue
-                out_rdt[key] = value[:]
-
-        out_rdt['density'] = dens_value
-
-        return out_rdt.to_granule()
+        return pracsal, dens_value
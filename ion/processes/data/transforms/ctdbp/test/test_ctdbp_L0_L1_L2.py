@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+"""
+@brief Tests and benchmarks for the fused CTDBP L0, L1 and L2 transform
+"""
+
+from pyon.public import log
+from pyon.util.int_test import IonIntegrationTestCase
+from pyon.util.containers import DotDict
+from pyon.ion.stream import StandaloneStreamPublisher, StandaloneStreamSubscriber
+from nose.plugins.attrib import attr
+
+from interface.services.dm.ipubsub_management_service import PubsubManagementServiceClient
+from interface.services.dm.idataset_management_service import DatasetManagementServiceClient
+from ion.services.dm.utility.granule.record_dictionary import RecordDictionaryTool
+from ion.processes.data.transforms.ctdbp.ctdbp_L0 import ctdbp_L0_algorithm
+from ion.processes.data.transforms.ctdbp.ctdbp_L1 import CTDBP_L1_TransformAlgorithm
+from ion.processes.data.transforms.ctdbp.ctdbp_L2_density import CTDBP_DensityTransformAlgorithm
+from ion.processes.data.transforms.ctdbp.ctdbp_L2_salinity import CTDBP_SalinityTransformAlgorithm
+from ion.processes.data.transforms.ctdbp.ctdbp_L0_L1_L2 import CTDBP_L0_L1_L2_Algorithm
+from coverage_model import ParameterContext, AxisTypeEnum, QuantityType
+
+from collections import defaultdict
+from gevent.event import Event
+import numpy
+import time
+
+
+CALIBRATION_COEFFS = {
+    'temp_calibration_coeffs': {
+        'TA0' : 1.561342e-03,
+        'TA1' : 2.561486e-04,
+        'TA2' : 1.896537e-07,
+        'TA3' : 1.301189e-07,
+        'TOFFSET' : 0.000000e+00
+    },
+    'cond_calibration_coeffs':  {
+        'G' : -9.896568e-01,
+        'H' : 1.316599e-01,
+        'I' : -2.213854e-04,
+        'J' : 3.292199e-05,
+        'CPCOR' : -9.570000e-08,
+        'CTCOR' : 3.250000e-06,
+        'CSLOPE' : 1.000000e+00
+    },
+    'pres_calibration_coeffs' : {
+        'PA0' : 4.960417e-02,
+        'PA1' : 4.883682e-04,
+        'PA2' : -5.687309e-12,
+        'PTCA0' : 5.249802e+05,
+        'PTCA1' : 7.595719e+00,
+        'PTCA2' : -1.322776e-01,
+        'PTCB0' : 2.503125e+01,
+        'PTCB1' : 5.000000e-05,
+        'PTCB2' : 0.000000e+00,
+        'PTEMPA0' : -6.431504e+01,
+        'PTEMPA1' : 5.168177e+01,
+        'PTEMPA2' : -2.847757e-01,
+        'POFFSET' : 0.000000e+00
+    }
+}
+
+PRODUCT_PARAMETERS = {
+    'parsed' : ['time', 'conductivity', 'pressure', 'temperature'],
+    'L0' : ['time', 'conductivity', 'pressure', 'temperature'],
+    'L1' : ['time', 'conductivity', 'pressure', 'temp'],
+    'density' : ['time', 'density'],
+    'salinity' : ['time', 'salinity'],
+}
+
+
+class CTDBPFusedMixin(object):
+    def setUp(self):
+        super(CTDBPFusedMixin, self).setUp()
+        self._start_container()
+        self.container.start_rel_from_url('res/deploy/r2deploy.yml')
+
+        self.pubsub = PubsubManagementServiceClient()
+        self.dataset_management = DatasetManagementServiceClient()
+
+        context_ids = {}
+        self.stream_defs = {}
+        for product, parameters in PRODUCT_PARAMETERS.iteritems():
+            for name in parameters:
+                if name not in context_ids:
+                    context_ids[name] = self._create_parameter_context(name)
+            pdict_id = self.dataset_management.create_parameter_dictionary('ctdbp_fused_%s' % product,
+                                                                           [context_ids[name] for name in parameters])
+            self.addCleanup(self.dataset_management.delete_parameter_dictionary, pdict_id)
+            self.stream_defs[product] = self.pubsub.create_stream_definition(name='ctdbp_fused_%s' % product,
+                                                                             parameter_dictionary_id=pdict_id)
+            self.addCleanup(self.pubsub.delete_stream_definition, self.stream_defs[product])
+
+    def _create_parameter_context(self, name):
+        if name == 'time':
+            ctxt = ParameterContext(name, param_type=QuantityType(value_encoding=numpy.dtype('float64')))
+            ctxt.axis = AxisTypeEnum.TIME
+            ctxt.uom = 'seconds since 01-01-1900'
+        else:
+            ctxt = ParameterContext(name, param_type=QuantityType(value_encoding=numpy.dtype('float32')))
+        ctxt_id = self.dataset_management.create_parameter_context(name, ctxt.dump())
+        self.addCleanup(self.dataset_management.delete_parameter_context, ctxt_id)
+        return ctxt_id
+
+    def get_parsed_granule(self, length, offset=0):
+        rdt = RecordDictionaryTool(stream_definition_id=self.stream_defs['parsed'])
+        rdt['time'] = numpy.arange(offset, offset + length)
+        # raw counts in the range of the calibration
+        rdt['conductivity'] = numpy.random.uniform(1.0e6, 1.4e6, length)
+        rdt['pressure'] = numpy.random.uniform(5.3e5, 5.4e5, length)
+        rdt['temperature'] = numpy.random.uniform(4.8e5, 5.4e5, length)
+        return rdt.to_granule()
+
+    def get_params(self, products=('L0', 'L1', 'density', 'salinity')):
+        return {'stream_defs' : dict((name, self.stream_defs[name]) for name in products),
+                'calibration_coeffs' : CALIBRATION_COEFFS,
+                'lat' : 45.0,
+                'lon' : -124.0,
+                'gsw_backend' : 'pygsw'}
+
+    def run_chain(self, packet):
+        """
+        The CTDBP transforms algorithms as the chained deployment runs them, one granule per hop.
+        """
+        L0 = ctdbp_L0_algorithm.execute([packet], params={'L0_stream' : self.stream_defs['L0']})[0]
+        L1 = CTDBP_L1_TransformAlgorithm.execute(L0, params={'stream_def' : self.stream_defs['L1'],
+                                                             'calibration_coeffs' : CALIBRATION_COEFFS})
+        density = CTDBP_DensityTransformAlgorithm.execute(L1, params={'stream_def' : self.stream_defs['density'],
+                                                                      'lat' : 45.0, 'lon' : -124.0})
+        salinity = CTDBP_SalinityTransformAlgorithm.execute(L1, params={'stream_def' : self.stream_defs['salinity']})
+        return {'L0' : L0, 'L1' : L1, 'density' : density, 'salinity' : salinity}
+
+
+@attr('INT', group='dm')
+class TestCTDBPFusedTransform(CTDBPFusedMixin, IonIntegrationTestCase):
+
+    def test_fused_matches_chain(self):
+        packet = self.get_parsed_granule(100)
+
+        chained = self.run_chain(packet)
+        fused = CTDBP_L0_L1_L2_Algorithm.execute(packet, params=self.get_params())
+        self.assertEquals(sorted(fused.keys()), ['L0', 'L1', 'density', 'salinity'])
+
+        for product, granule in fused.iteritems():
+            rdt = RecordDictionaryTool.load_from_granule(granule)
+            chained_rdt = RecordDictionaryTool.load_from_granule(chained[product])
+            for name in PRODUCT_PARAMETERS[product]:
+                log.debug('%s %s fused %s chained %s', product, name, rdt[name], chained_rdt[name])
+                # the fused L1 values are not rounded to float32 before the L2 calculations
+                numpy.testing.assert_allclose(rdt[name], chained_rdt[name], rtol=1e-4)
+
+    def test_products(self):
+        packet = self.get_parsed_granule(10)
+
+        fused = CTDBP_L0_L1_L2_Algorithm.execute(packet, params=self.get_params(['L0']))
+        self.assertEquals(fused.keys(), ['L0'])
+
+        fused = CTDBP_L0_L1_L2_Algorithm.execute(packet, params=self.get_params(['salinity']))
+        self.assertEquals(fused.keys(), ['salinity'])
+        salinity = RecordDictionaryTool.load_from_granule(fused['salinity'])['salinity']
+
+        params = self.get_params(['salinity'])
+        params['gsw_backend'] = 'seawater'
+        fused = CTDBP_L0_L1_L2_Algorithm.execute(packet, params=params)
+        self.assertEquals(len(RecordDictionaryTool.load_from_granule(fused['salinity'])['salinity']), len(salinity))
+
+
+@attr('BENCHMARK', group='dm')
+class CTDBPFusedBenchmark(CTDBPFusedMixin, IonIntegrationTestCase):
+    granules = 100
+
+    def test_fused_throughput(self):
+        """
+        Times the chained and fused algorithms in-process. Granule serialization between the algorithms is
+        included, the exchange and the separate transform processes of the chained deployment are not (see
+        test_fused_bus_messages).
+        """
+        for length in (10, 1000, 10000):
+            packets = [self.get_parsed_granule(length, i * length) for i in xrange(self.granules)]
+
+            start = time.time()
+            for packet in packets:
+                self.run_chain(packet)
+            chained = time.time() - start
+
+            params = self.get_params()
+            start = time.time()
+            for packet in packets:
+                CTDBP_L0_L1_L2_Algorithm.execute(packet, params=params)
+            fused = time.time() - start
+
+            samples = self.granules * length
+            print '%6d samples/granule  chained algorithms %12.1f samples/sec' % (length, samples / chained)
+            print '%6d samples/granule  fused algorithm    %12.1f samples/sec' % (length, samples / fused)
+
+    def create_stream(self, deployment, product):
+        stream_id, route = self.pubsub.create_stream('ctdbp_%s_%s' % (deployment, product), exchange_point='science_data',
+                                                     stream_definition_id=self.stream_defs[product])
+        self.addCleanup(self.pubsub.delete_stream, stream_id)
+        return stream_id, route
+
+    def subscribe(self, queue_name, stream_ids):
+        sub_id = self.pubsub.create_subscription(queue_name, stream_ids=stream_ids, exchange_name=queue_name)
+        self.addCleanup(self.pubsub.delete_subscription, sub_id)
+        self.pubsub.activate_subscription(sub_id)
+        self.addCleanup(self.pubsub.deactivate_subscription, sub_id)
+        self.addCleanup(self.container.ex_manager.create_xn_queue(queue_name).delete)
+
+    def spawn_transform(self, queue_name, module, class_name, input_stream_id, publish_streams, delivered, **config):
+        """
+        Launches a transform listening to input_stream_id, counting the granules delivered to it in delivered
+        """
+        self.subscribe(queue_name, [input_stream_id])
+        process_config = DotDict()
+        process_config.process.queue_name = queue_name
+        process_config.process.publish_streams = publish_streams
+        process_config.process.update(config)
+        pid = self.container.spawn_process(queue_name, module, class_name, process_config)
+        self.addCleanup(self.container.terminate_process, pid)
+
+        process = self.container.proc_manager.procs[pid]
+        recv_packet = process.recv_packet
+        def counting_recv_packet(packet, stream_route, stream_id):
+            delivered[queue_name] += 1
+            return recv_packet(packet, stream_route, stream_id)
+        process.recv_packet = counting_recv_packet
+
+    def deploy_chain(self, delivered):
+        """
+        The L0, L1, density and salinity transforms as separate processes, each republishing over the exchange
+        """
+        streams = dict((product, self.create_stream('chained', product)) for product in PRODUCT_PARAMETERS)
+        module = 'ion.processes.data.transforms.ctdbp.'
+        self.spawn_transform('ctdbp_chained_L0', module + 'ctdbp_L0', 'CTDBP_L0_all', streams['parsed'][0],
+                             {'L0_stream' : streams['L0'][0]}, delivered)
+        self.spawn_transform('ctdbp_chained_L1', module + 'ctdbp_L1', 'CTDBP_L1_Transform', streams['L0'][0],
+                             {'L1_stream' : streams['L1'][0]}, delivered, calibration_coeffs=CALIBRATION_COEFFS)
+        self.spawn_transform('ctdbp_chained_density', module + 'ctdbp_L2_density', 'CTDBP_DensityTransform',
+                             streams['L1'][0], {'density' : streams['density'][0]}, delivered, lat=45.0, lon=-124.0)
+        self.spawn_transform('ctdbp_chained_salinity', module + 'ctdbp_L2_salinity', 'CTDBP_SalinityTransform',
+                             streams['L1'][0], {'salinity' : streams['salinity'][0]}, delivered)
+        return streams
+
+    def deploy_fused(self, delivered):
+        """
+        The fused transform as one process publishing every product
+        """
+        streams = dict((product, self.create_stream('fused', product)) for product in PRODUCT_PARAMETERS)
+        publish_streams = dict((product, streams[product][0]) for product in ('L0', 'L1', 'density', 'salinity'))
+        self.spawn_transform('ctdbp_fused', 'ion.processes.data.transforms.ctdbp.ctdbp_L0_L1_L2', 'CTDBP_L0_L1_L2_Transform',
+                             streams['parsed'][0], publish_streams, delivered, calibration_coeffs=CALIBRATION_COEFFS,
+                             lat=45.0, lon=-124.0, gsw_backend='pygsw')
+        return streams
+
+    def test_fused_bus_messages(self):
+        """
+        Runs the chained and the fused deployments over the exchange and counts, per parsed granule, the granules
+        published on the streams of the deployment and the granules delivered to its transforms.
+        """
+        self.measure_deployment('chained', self.deploy_chain)
+        self.measure_deployment('fused', self.deploy_fused)
+
+    def measure_deployment(self, deployment, deploy):
+        delivered = defaultdict(int)
+        streams = deploy(delivered)
+        products = dict((stream_id, product) for product, (stream_id, _) in streams.iteritems())
+
+        published = defaultdict(int)
+        done = Event()
+        def count(msg, stream_route, stream_id):
+            published[products[stream_id]] += 1
+            if min(published['density'], published['salinity']) >= self.granules:
+                done.set()
+        queue_name = 'ctdbp_%s_counter' % deployment
+        self.subscribe(queue_name, products.keys())
+        counter = StandaloneStreamSubscriber(queue_name, count)
+        counter.start()
+        self.addCleanup(counter.stop)
+
+        publisher = StandaloneStreamPublisher(*streams['parsed'])
+        for length in (10, 1000, 10000):
+            packets = [self.get_parsed_granule(length, i * length) for i in xrange(self.granules)]
+            published.clear()
+            delivered.clear()
+            done.clear()
+
+            start = time.time()
+            for packet in packets:
+                publisher.publish(packet)
+            self.assertTrue(done.wait(600))
+            elapsed = time.time() - start
+
+            print '%6d samples/granule  %-7s %12.1f samples/sec' % (length, deployment, self.granules * length / elapsed),
+            print '%4.1f granules published, %4.1f delivered to transforms per parsed granule' % \
+                  (sum(published.values()) / float(self.granules), sum(delivered.values()) / float(self.granules))
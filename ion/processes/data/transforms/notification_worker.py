@@ -7,13 +7,13 @@
 @brief NotificationWorker Class. An instance of this class acts as an notification worker.
 '''
 
-from pyon.public import log, RT
+from pyon.public import log, RT, CFG
 from pyon.util.async import spawn
 from pyon.core.exception import BadRequest, NotFound
 from ion.core.process.transform import TransformEventListener
 from pyon.event.event import EventSubscriber
-from ion.services.dm.utility.uns_utility_methods import send_email, calculate_reverse_user_info
-from ion.services.dm.utility.uns_utility_methods import setting_up_smtp_client, check_user_notification_interest
+from ion.services.dm.utility.uns_utility_methods import calculate_reverse_user_info, EmailDeliveryEngine
+from ion.services.dm.utility.uns_utility_methods import NotificationIndex
 from interface.services.coi.iresource_registry_service import ResourceRegistryServiceClient
 
 import gevent, time
@@ -41,6 +41,7 @@ class NotificationWorker(TransformEventListener):
 
         self.reverse_user_info = None
         self.user_info = None
+        self.notification_index = NotificationIndex()
 
         #------------------------------------------------------------------------------------
         # Start by loading the user info and reverse user info dictionaries
@@ -49,6 +50,7 @@ class NotificationWorker(TransformEventListener):
         try:
             self.user_info = self.load_user_info()
             self.reverse_user_info =  calculate_reverse_user_info(self.user_info)
+            self.notification_index.update_user_info(self.user_info)
 
             log.debug("On start up, notification workers loaded the following user_info dictionary: %s" % self.user_info)
             log.debug("The calculated reverse user info: %s" % self.reverse_user_info )
@@ -77,6 +79,7 @@ class NotificationWorker(TransformEventListener):
                 log.warning("ElasticSearch has not yet loaded the user_index.")
 
             self.reverse_user_info =  calculate_reverse_user_info(self.user_info)
+            self.notification_index.update_user_info(self.user_info)
             self.test_hook(self.user_info, self.reverse_user_info)
 
             log.debug("After a reload, the user_info: %s" % self.user_info)
@@ -91,19 +94,29 @@ class NotificationWorker(TransformEventListener):
 
         self.add_endpoint(self.reload_user_info_subscriber)
 
+        #------------------------------------------------------------------------------------
+        # Emails go out over a small pool of persistent smtp connections
+        #------------------------------------------------------------------------------------
+
+        self.delivery = EmailDeliveryEngine(pool_size=CFG.get_safe('server.smtp.pool_size', 2),
+                                            queue_size=CFG.get_safe('server.smtp.queue_size', 1000),
+                                            digest_window=CFG.get_safe('server.smtp.digest_window', 0))
+        self.delivery.start()
+
+    def on_quit(self):
+        self.delivery.stop()
+        super(NotificationWorker, self).on_quit()
 
     def process_event(self, msg, headers):
         """
         Callback method for the subscriber listening for all events
         """
         #------------------------------------------------------------------------------------
-        # From the reverse user info dict find out which users have subscribed to that event
+        # From the notification index find out which users have subscribed to that event
         #------------------------------------------------------------------------------------
 
-        user_ids = []
-        if self.reverse_user_info:
-            user_ids = check_user_notification_interest(event = msg, reverse_user_info = self.reverse_user_info)
-
+        user_ids = self.notification_index.match(msg)
+        if user_ids:
             log.debug("Notification worker found interested users %s" % user_ids)
 
         #------------------------------------------------------------------------------------
@@ -112,9 +125,7 @@ class NotificationWorker(TransformEventListener):
 
         for user_id in user_ids:
             msg_recipient = self.user_info[user_id]['user_contact'].email
-            self.smtp_client = setting_up_smtp_client()
-            send_email(message = msg, msg_recipient = msg_recipient, smtp_client = self.smtp_client )
-            self.smtp_client.quit()
+            self.delivery.deliver(msg, msg_recipient)
 
 
     def load_user_info(self):
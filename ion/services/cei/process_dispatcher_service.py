@@ -3,6 +3,7 @@
 import uuid
 import json
 import logging
+from collections import OrderedDict
 from time import time
 
 import gevent
@@ -587,7 +588,16 @@ class PDLocalBackend(object):
     def __init__(self, container):
         self.container = container
         self.event_pub = EventPublisher()
-        self._processes = []
+
+        # Process objects by upid, and secondary indexes of upids by process
+        # state and by process definition id. Each upid gets a sequence number
+        # when added, so index matches can be listed in insertion order.
+        self._processes = OrderedDict()
+        self._processes_by_state = {}
+        self._processes_by_definition = {}
+        self._process_definitions = {}
+        self._process_sequence = {}
+        self._next_sequence = 0
 
         self._spawn_greenlets = set()
 
@@ -626,7 +636,7 @@ class PDLocalBackend(object):
 
     def create(self, process_id, definition_id):
         if not self._get_process(process_id):
-            self._add_process(process_id, {}, ProcessStateEnum.REQUESTED)
+            self._add_process(process_id, {}, ProcessStateEnum.REQUESTED, definition_id)
         return process_id
 
     def schedule(self, process_id, definition_id, schedule, configuration, name):
@@ -647,13 +657,13 @@ class PDLocalBackend(object):
             if process:
                 process.process_configuration = configuration
             else:
-                self._add_process(process_id, configuration, None)
+                self._add_process(process_id, configuration, None, definition_id)
 
         else:
             if process:
                 process.process_configuration = configuration
             else:
-                self._add_process(process_id, configuration, None)
+                self._add_process(process_id, configuration, None, definition_id)
             self._inner_spawn(process_id, name, definition, schedule, configuration)
 
         return process_id
@@ -674,8 +684,7 @@ class PDLocalBackend(object):
         log.debug('PD: Spawned Process (%s)', pid)
 
         # update state on the existing process
-        process = self._get_process(process_id)
-        process.process_state = ProcessStateEnum.RUNNING
+        self._set_process_state(process_id, ProcessStateEnum.RUNNING)
 
         self.event_pub.publish_event(event_type="ProcessLifecycleEvent",
             origin=process_id, origin_type="DispatchedProcess",
@@ -697,7 +706,7 @@ class PDLocalBackend(object):
             except BadRequest, e:
                 log.warn("PD: Failed to terminate process %s in container. already dead?: %s",
                     process_id, str(e))
-            process.process_state = ProcessStateEnum.TERMINATED
+            self._set_process_state(process_id, ProcessStateEnum.TERMINATED)
 
             try:
                 self.event_pub.publish_event(event_type="ProcessLifecycleEvent",
@@ -717,24 +726,62 @@ class PDLocalBackend(object):
             raise NotFound("process %s unknown" % process_id)
         return process
 
-    def _add_process(self, pid, config, state):
+    def _add_process(self, pid, config, state, definition_id=None):
         proc = Process(process_id=pid, process_state=state,
                 process_configuration=config)
 
-        self._processes.append(proc)
+        self._processes[pid] = proc
+        self._process_sequence[pid] = self._next_sequence
+        self._next_sequence += 1
+        self._processes_by_state.setdefault(state, set()).add(pid)
+        self._processes_by_definition.setdefault(definition_id, set()).add(pid)
+        self._process_definitions[pid] = definition_id
 
     def _remove_process(self, pid):
-        self._processes = filter(lambda u: u.process_id != pid, self._processes)
+        proc = self._processes.pop(pid, None)
+        if proc is None:
+            return
+
+        del self._process_sequence[pid]
+        self._discard_index(self._processes_by_state, proc.process_state, pid)
+        self._discard_index(self._processes_by_definition,
+            self._process_definitions.pop(pid, None), pid)
+
+    def _set_process_state(self, pid, state):
+        proc = self._processes[pid]
+        if proc.process_state != state:
+            self._discard_index(self._processes_by_state, proc.process_state, pid)
+            self._processes_by_state.setdefault(state, set()).add(pid)
+            proc.process_state = state
+
+    def _discard_index(self, index, key, pid):
+        pids = index.get(key)
+        if pids is not None:
+            pids.discard(pid)
+            if not pids:
+                del index[key]
 
     def _get_process(self, pid):
-        wanted_procs = filter(lambda u: u.process_id == pid, self._processes)
-        if len(wanted_procs) >= 1:
-            return wanted_procs[0]
-        else:
-            return None
+        return self._processes.get(pid)
 
     def list(self):
-        return self._processes
+        return self._processes.values()
+
+    def list_processes(self, state=None, definition_id=None):
+        """Lists the processes, optionally only those in the given state
+        and/or of the given process definition, in the order they were added
+        """
+        if state is None and definition_id is None:
+            return self.list()
+
+        pids = None
+        if state is not None:
+            pids = self._processes_by_state.get(state, set())
+        if definition_id is not None:
+            definition_pids = self._processes_by_definition.get(definition_id, set())
+            pids = definition_pids if pids is None else pids & definition_pids
+
+        return [self._processes[pid] for pid in sorted(pids, key=self._process_sequence.get)]
 
 
 # map from internal PD states to external ProcessStateEnum values
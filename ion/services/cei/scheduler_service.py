@@ -7,21 +7,128 @@ from pyon.public import IonObject, RT, log
 from pyon.core.exception import BadRequest
 from pyon.event.event import EventPublisher
 from pyon.core.bootstrap import CFG
+from pyon.ion.identifier import create_unique_resource_id
 from interface.services.cei.ischeduler_service import BaseSchedulerService
 from interface.objects import IntervalTimer, TimeOfDayTimer
 
+from gevent.event import Event
+from gevent.pool import Pool
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from math import ceil
+import itertools
+import heapq
 import time
 import gevent
 import calendar
 
 
+class TimerDispatcher(object):
+    """
+    Fires any number of timers from a single greenlet. Deadlines are kept in a min-heap; the dispatcher sleeps until
+    the earliest one and hands every due timer to a bounded pool in one batch. Cancelled or rescheduled heap entries
+    are dropped when they surface (lazy deletion).
+    """
+
+    def __init__(self, callback, pool_size=100):
+        self._callback = callback
+        self._heap = []
+        self._deadlines = {}
+        self._counter = itertools.count()
+        self._wakeup = Event()
+        self._pool = Pool(pool_size)
+        self._greenlet = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def start(self):
+        if self._greenlet is None:
+            self._greenlet = gevent.spawn(self._run)
+
+    def stop(self, timeout=10):
+        if self._greenlet is not None:
+            self._greenlet.kill()
+            self._greenlet = None
+        self.clear(timeout)
+
+    def clear(self, timeout=10):
+        """
+        Cancels all pending timers and waits for the ones already firing to finish.
+        """
+        del self._heap[:]
+        self._deadlines.clear()
+        self._pool.join(timeout=timeout)
+
+    def schedule(self, key, delay):
+        """
+        Fires callback(key) in delay seconds, replacing any pending timer with the same key.
+        """
+        deadline = time.time() + delay
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+        if self._heap[0][0] == deadline:
+            self._wakeup.set()
+        return key
+
+    def cancel(self, key):
+        self._deadlines.pop(key, None)
+        # Compact once cancelled entries dominate the heap
+        if len(self._heap) > 2 * len(self._deadlines) + 1024:
+            self._heap = [entry for entry in self._heap if self._deadlines.get(entry[2]) == entry[0]]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                due.append(key)
+        return due
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            for key in self._pop_due(time.time()):
+                self._pool.spawn(self._fire, key)
+            if self._heap:
+                timeout = self._heap[0][0] - time.time()
+                if timeout > 0:
+                    self._wakeup.wait(timeout)
+            else:
+                self._wakeup.wait()
+
+    def _fire(self, key):
+        try:
+            self._callback(key)
+        except Exception:
+            log.exception("TimerDispatcher: timer %s failed", key)
+
+
 class SchedulerService(BaseSchedulerService):
     schedule_entries = {}
     _no_reschedule = False
+    _dispatcher = None
+    _write_behind = False
 
     def on_start(self):
+        # The heap engine runs all timers from one dispatcher greenlet and persists timers write-behind in batches,
+        # the default spawns one greenlet per timer and persists each timer synchronously.
+        if CFG.get_safe("service.scheduler.engine", "greenlet") == "heap":
+            self._dispatcher = TimerDispatcher(self._dispatch_expired, pool_size=CFG.get_safe("service.scheduler.pool_size", 100))
+            self._dispatcher.start()
+            self._write_behind = True
+            self._pending_creates = OrderedDict()
+            self._pending_deletes = set()
+            self._persist_interval = CFG.get_safe("service.scheduler.persist_interval", 1.0)
+            self._persist_quit = Event()
+            self._persister = gevent.spawn(self._persist_loop)
+
         if CFG.get_safe("process.start_mode") == "RESTART" or CFG.get_safe("bootmode") == "restart":
             self.on_system_restart()
         self.pub = EventPublisher(event_type="TimerEvent")
@@ -35,6 +142,13 @@ class SchedulerService(BaseSchedulerService):
         # terminate any pending spawns
         self._stop_pending_timers()
 
+        if self._dispatcher:
+            self._dispatcher.stop()
+        if self._write_behind:
+            self._persist_quit.set()
+            self._persister.join(timeout=10)
+            self._flush_persistence()
+
     def _notify(self, task, id_, index):
         log.debug("SchedulerService:_notify: - " + task.event_origin + " - Time: " + str(self._now()) + " - id_: " + id_ + " -Index:" + str(index))
         self.pub.publish_event(origin=task.event_origin)
@@ -51,12 +165,76 @@ class SchedulerService(BaseSchedulerService):
         if not self._reschedule(id_, index):
             self._delete(id_, index)
 
+    def _dispatch_expired(self, key):
+        self._expire_callback(*key)
+
+    def _spawn_timer(self, id_, index, expire_time):
+        if self._dispatcher:
+            return self._dispatcher.schedule((id_, index), expire_time)
+        return gevent.spawn_later(expire_time, self._expire_callback, id_, index)
+
+    def _kill_timer(self, spawn, pending_only=False):
+        if self._dispatcher:
+            self._dispatcher.cancel(spawn)
+        elif not pending_only or spawn._start_event is not None:
+            spawn.kill()
+
+    def _persist_create(self, scheduler_entry):
+        if not self._write_behind:
+            id_, _ = self.clients.resource_registry.create(scheduler_entry)
+            return id_
+
+        # The id is handed out now, the resource registry initializes the resource when it is written
+        id_ = create_unique_resource_id()
+        self._pending_creates[id_] = scheduler_entry
+        return id_
+
+    def _persist_delete(self, id_):
+        if not self._write_behind:
+            self.clients.resource_registry.delete(id_)
+        elif self._pending_creates.pop(id_, None) is None:
+            # Only entries that already reached the resource registry need a delete
+            self._pending_deletes.add(id_)
+
+    def _flush_persistence(self):
+        if not self._write_behind:
+            return
+        creates, self._pending_creates = self._pending_creates, OrderedDict()
+        deletes, self._pending_deletes = self._pending_deletes, set()
+        # Written through the container resource registry so the timers get their lifecycle state and resource
+        # events as with a synchronous create
+        rr = self.container.resource_registry
+        for count, (id_, scheduler_entry) in enumerate(creates.items()):
+            try:
+                rr.create(scheduler_entry, object_id=id_)
+            except Exception:
+                log.exception("SchedulerService:_flush_persistence: failed to persist %s created timers, will retry", len(creates) - count)
+                # Retried ahead of the timers created since. A timer deleted since has its delete pending,
+                # which the retry runs after the create.
+                retry = OrderedDict(creates.items()[count:])
+                retry.update(self._pending_creates)
+                self._pending_creates = retry
+                held = deletes.intersection(retry)
+                if held:
+                    deletes = deletes - held
+                    self._pending_deletes.update(held)
+                break
+        for id_ in deletes:
+            try:
+                rr.delete(id_)
+            except Exception:
+                log.exception("SchedulerService:_flush_persistence: failed to persist deleted timer %s, will retry", id_)
+                self._pending_deletes.add(id_)
+
+    def _persist_loop(self):
+        while not self._persist_quit.wait(self._persist_interval):
+            self._flush_persistence()
+
     def _calculate_next_interval(self, task, current_time):
         if task.start_time < current_time:
-            next_interval = task.start_time
-            while next_interval < current_time:
-                next_interval = next_interval + task.interval
-            return next_interval - current_time
+            # Next multiple of the interval past start_time, in closed form
+            periods = ceil((current_time - task.start_time) / float(task.interval))
+            return task.start_time + periods * task.interval - current_time
         else:
             return (task.start_time - current_time) + task.interval
 
@@ -123,12 +301,12 @@ class SchedulerService(BaseSchedulerService):
             return False
 
         if not id_:
-            id_, _ = self.clients.resource_registry.create(scheduler_entry)
+            id_ = self._persist_create(scheduler_entry)
         self._create_entry(task, spawns, id_)
         for index, expire_time in enumerate(expire_times):
             log.debug("SchedulerService:_schedule: scheduling: - " + task.event_origin + " - Now: " + str(self._now()) +
                       " - Expire: " + str(expire_time) + " - ID: " + id_ + " - Index:" + str(index))
-            spawn = gevent.spawn_later(expire_time, self._expire_callback, id_, index)
+            spawn = self._spawn_timer(id_, index, expire_time)
             spawns.append(spawn)
         return id_
 
@@ -142,7 +320,7 @@ class SchedulerService(BaseSchedulerService):
         if expire_time:
             log.debug("SchedulerService:_reschedule: rescheduling: - " + task.event_origin + " - Now: " + str(self._now()) +
                       " - Expire: " + str(expire_time) + " - ID: " + id_ + " -Index:" + str(index))
-            spawn = gevent.spawn_later(expire_time, self._expire_callback, id_, index)
+            spawn = self._spawn_timer(id_, index, expire_time)
             self._update_entry(id_=id_, index=index, spawn=spawn)
 
             return True
@@ -175,7 +353,7 @@ class SchedulerService(BaseSchedulerService):
             if force and type(task) == TimeOfDayTimer:
                 log.debug("SchedulerService:_delete: entry deleted " + id_ + " -Index:" + str(index))
                 del self.schedule_entries[id_]
-                self.clients.resource_registry.delete(id_)
+                self._persist_delete(id_)
             elif type(task) == TimeOfDayTimer:
                 task = self._get_entry(id_)
                 task.times_of_day[index] = None
@@ -188,11 +366,11 @@ class SchedulerService(BaseSchedulerService):
                 if are_all_timers_expired:
                     log.debug("SchedulerService:_delete: entry deleted " + id_ + " -Index:" + str(index))
                     del self.schedule_entries[id_]
-                    self.clients.resource_registry.delete(id_)
+                    self._persist_delete(id_)
             else:
                 log.debug("SchedulerService:_delete: entry deleted " + id_ + " -Index:" + str(index))
                 del self.schedule_entries[id_]
-                self.clients.resource_registry.delete(id_)
+                self._persist_delete(id_)
             return True
         return False
 
@@ -203,6 +381,9 @@ class SchedulerService(BaseSchedulerService):
             return False
             # Validate the timer is set correctly
         if type(task) == IntervalTimer:
+            if task.interval <= 0:
+                log.error("SchedulerService._is_timer_valid: IntervalTimer interval must be positive")
+                return False
             if task.end_time != -1 and (self._convert_to_posix_time(self._now()) >= task.end_time):
                 log.error("SchedulerService._is_timer_valid: IntervalTimer is set to incorrect value")
                 return False
@@ -236,17 +417,20 @@ class SchedulerService(BaseSchedulerService):
             spawns = self._get_spawns(timer_id)
 
             for spawn in spawns:
-                gls.append(spawn)
+                if not self._dispatcher:
+                    gls.append(spawn)
                 # only kill spawns that haven't started yet
-                if spawn._start_event is not None:
-                    spawn.kill()
+                self._kill_timer(spawn, pending_only=True)
 
             log.debug("_stop_pending_timers: timer %s deleted", timer_id)
 
         self.schedule_entries.clear()
 
         # wait for running gls to finish up
-        gevent.joinall(gls, timeout=10)
+        if self._dispatcher:
+            self._dispatcher.clear(timeout=10)
+        else:
+            gevent.joinall(gls, timeout=10)
 
         # allow reschedules from here on out
         self._no_reschedule = False
@@ -259,6 +443,7 @@ class SchedulerService(BaseSchedulerService):
         # When this method is called, there should not be any active timers but if it is called from test, this helps
         # to remove current active timer and restore them from Resource Regstiry
         self._stop_pending_timers()
+        self._flush_persistence()
 
         # Restore the timer from Resource Registry
         scheduler_entries, _ = self.clients.resource_registry.find_resources(RT.SchedulerEntry, id_only=False)
@@ -300,7 +485,7 @@ class SchedulerService(BaseSchedulerService):
         try:
             spawns = self._get_spawns(timer_id)
             for spawn in spawns:
-                spawn.kill()
+                self._kill_timer(spawn)
             log.debug("SchedulerService: cancel_timer: id_: " + str(timer_id))
             self._delete(id_=timer_id, index=None, force=True)
         except:
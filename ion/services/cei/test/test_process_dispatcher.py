@@ -45,9 +45,8 @@ except ImportError:
 # communication.
 
 
-@attr('UNIT', group='cei')
-class ProcessDispatcherServiceLocalTest(PyonTestCase):
-    """Tests the local backend of the PD
+class LocalBackendMixin(object):
+    """Sets up the PD service with the local backend and a mocked container
     """
 
     def setUp(self):
@@ -69,6 +68,12 @@ class ProcessDispatcherServiceLocalTest(PyonTestCase):
         self.pd_service.backend.rr = self.mock_rr = Mock()
         self.pd_service.backend.event_pub = self.mock_event_pub = Mock()
 
+
+@attr('UNIT', group='cei')
+class ProcessDispatcherServiceLocalTest(LocalBackendMixin, PyonTestCase):
+    """Tests the local backend of the PD
+    """
+
     def test_create_schedule(self):
 
         backend = self.pd_service.backend
@@ -152,6 +157,96 @@ class ProcessDispatcherServiceLocalTest(PyonTestCase):
         self.assertTrue(ok)
         self.mock_cc_terminate.assert_called_once_with(pid)
 
+    def test_list_processes(self):
+        backend = self.pd_service.backend
+
+        proc_def = DotDict()
+        proc_def['name'] = "someprocess"
+        proc_def['executable'] = {'module': 'my_module', 'class': 'class'}
+        self.mock_rr.read.return_value = proc_def
+
+        pids = [self.pd_service.create_process("def-1") for i in range(3)]
+        pids.append(self.pd_service.create_process("def-2"))
+        for pid in pids[1:]:
+            self.pd_service.schedule_process("def-1" if pid != pids[3] else "def-2",
+                DotDict(), {}, pid)
+        self.pd_service.cancel_process(pids[2])
+
+        self.assertEqual([p.process_id for p in self.pd_service.list_processes()], pids)
+        self.assertEqual([p.process_id for p in backend.list_processes()], pids)
+
+        def listed(**kwargs):
+            return [p.process_id for p in backend.list_processes(**kwargs)]
+
+        self.assertEqual(listed(state=ProcessStateEnum.REQUESTED), pids[:1])
+        self.assertEqual(listed(state=ProcessStateEnum.RUNNING), [pids[1], pids[3]])
+        self.assertEqual(listed(state=ProcessStateEnum.TERMINATED), pids[2:3])
+        self.assertEqual(listed(state=ProcessStateEnum.FAILED), [])
+        self.assertEqual(listed(definition_id="def-1"), pids[:3])
+        self.assertEqual(listed(definition_id="def-2"), pids[3:])
+        self.assertEqual(listed(state=ProcessStateEnum.RUNNING, definition_id="def-1"), pids[1:2])
+
+        backend._remove_process(pids[1])
+        self.assertEqual(listed(state=ProcessStateEnum.RUNNING), pids[3:])
+        self.assertEqual(listed(definition_id="def-1"), [pids[0], pids[2]])
+        self.assertIsNone(backend._get_process(pids[1]))
+
+        for pid in (pids[0], pids[2], pids[3]):
+            backend._remove_process(pid)
+        self.assertEqual(backend._processes_by_state, {})
+        self.assertEqual(backend._processes_by_definition, {})
+        self.assertEqual(backend._process_sequence, {})
+        self.assertEqual(backend.list(), [])
+
+
+@attr('BENCHMARK', group='cei')
+class ProcessDispatcherLocalBackendBenchmark(LocalBackendMixin, PyonTestCase):
+    """Schedules, reads, lists and terminates many processes on the local backend
+    with a mocked container
+    """
+
+    processes = 10000
+
+    def test_process_table_throughput(self):
+        backend = self.pd_service.backend
+
+        proc_def = DotDict()
+        proc_def['name'] = "someprocess"
+        proc_def['executable'] = {'module': 'my_module', 'class': 'class'}
+        self.mock_rr.read.return_value = proc_def
+
+        pids = ["someprocess%d" % i for i in xrange(self.processes)]
+
+        def timed(label, func, count=self.processes):
+            start = time.time()
+            func()
+            elapsed = time.time() - start
+            print "%-10s %6d ops %8.3f s %12.1f ops/sec" % (label, count, elapsed, count / elapsed)
+
+        def schedule():
+            for pid in pids:
+                backend.schedule(pid, "def-1", None, {}, pid)
+
+        def read():
+            for pid in pids:
+                backend.read_process(pid)
+
+        def list_running():
+            for i in xrange(100):
+                backend.list_processes(state=ProcessStateEnum.RUNNING)
+
+        def terminate():
+            for pid in pids:
+                backend.cancel(pid)
+
+        timed("schedule", schedule)
+        timed("read", read)
+        timed("list", list_running, 100)
+        timed("terminate", terminate)
+
+        self.assertEqual(len(backend.list_processes(state=ProcessStateEnum.TERMINATED)), self.processes)
+        self.assertEqual(backend.list_processes(state=ProcessStateEnum.RUNNING), [])
+
 
 class FakeDashiNotFoundError(Exception):
     pass
@@ -2,10 +2,13 @@
 
 from pyon.core.exception import BadRequest, NotFound
 from pyon.util.int_test import IonIntegrationTestCase
+from pyon.util.unit_test import PyonTestCase
+from pyon.util.containers import DotDict
 from pyon.util.context import LocalContextMixin
 from pyon.event.event import EventSubscriber
 from interface.services.coi.iresource_registry_service import ResourceRegistryServiceProcessClient
 from interface.services.cei.ischeduler_service import SchedulerServiceProcessClient
+from ion.services.cei.scheduler_service import SchedulerService, TimerDispatcher
 from nose.plugins.attrib import attr
 import gevent
 from gevent.event import AsyncResult
@@ -13,10 +16,13 @@ import datetime
 from datetime import timedelta
 import time
 import math
-from pyon.public import log
+from pyon.public import IonObject, RT, log
 import unittest
 import calendar
 import os
+import resource
+from collections import OrderedDict
+from mock import Mock, call
 
 class FakeProcess(LocalContextMixin):
     name = 'scheduler_test'
@@ -435,3 +441,144 @@ class TestSchedulerService(IonIntegrationTestCase):
         # assert empty
         self.assertEquals(p.schedule_entries, {})
 
+
+@attr('UNIT', group='cei')
+class TestTimerDispatcher(PyonTestCase):
+
+    def test_next_interval(self):
+        def next_interval(task, current_time):
+            # the original iterative computation
+            next_time = task.start_time
+            while next_time < current_time:
+                next_time += task.interval
+            return next_time - current_time
+
+        scheduler = SchedulerService()
+        for start_time, interval, current_time in ((0, 7, 100), (0, 5, 100), (95, 10, 100), (3, 0.5, 1000.25)):
+            task = DotDict(start_time=start_time, interval=interval)
+            self.assertAlmostEquals(scheduler._calculate_next_interval(task, current_time), next_interval(task, current_time))
+
+    def test_flush_persistence_retry(self):
+        scheduler = SchedulerService()
+        scheduler._write_behind = True
+        scheduler._pending_creates = OrderedDict()
+        scheduler._pending_deletes = set()
+        scheduler.container = DotDict()
+        rr = scheduler.container['resource_registry'] = Mock()
+
+        scheduler._pending_creates['a'] = 'entry_a'
+        scheduler._pending_creates['b'] = 'entry_b'
+        scheduler._pending_creates['c'] = 'entry_c'
+        scheduler._pending_deletes.add('old')
+
+        def create_fails(entry, object_id):
+            if object_id == 'b':
+                # a timer created and one deleted while the write is in flight
+                scheduler._pending_creates['d'] = 'entry_d'
+                scheduler._persist_delete('c')
+                raise Exception('resource registry unavailable')
+        rr.create.side_effect = create_fails
+        scheduler._flush_persistence()
+
+        # the timers are written through the container resource registry, which initializes them
+        self.assertEquals(rr.create.call_args_list, [call('entry_a', object_id='a'), call('entry_b', object_id='b')])
+        rr.delete.assert_called_once_with('old')
+        self.assertEquals(scheduler._pending_creates.keys(), ['b', 'c', 'd'])
+        self.assertEquals(scheduler._pending_deletes, set(['c']))
+
+        rr.create.side_effect = None
+        rr.create.reset_mock()
+        rr.delete.reset_mock()
+        scheduler._flush_persistence()
+        self.assertEquals(rr.create.call_args_list, [call('entry_b', object_id='b'), call('entry_c', object_id='c'),
+                                                     call('entry_d', object_id='d')])
+        rr.delete.assert_called_once_with('c')
+        self.assertEquals(scheduler._pending_creates, OrderedDict())
+        self.assertEquals(scheduler._pending_deletes, set())
+
+        # a failed delete is retried
+        scheduler._pending_deletes.add('e')
+        rr.delete.side_effect = Exception('resource registry unavailable')
+        scheduler._flush_persistence()
+        self.assertEquals(scheduler._pending_deletes, set(['e']))
+        rr.delete.side_effect = None
+        scheduler._flush_persistence()
+        rr.delete.assert_called_with('e')
+        self.assertEquals(scheduler._pending_deletes, set())
+
+    def test_persist_create_write_behind(self):
+        scheduler = SchedulerService()
+        scheduler._write_behind = True
+        scheduler._pending_creates = OrderedDict()
+        entry = IonObject(RT.SchedulerEntry)
+
+        id_ = scheduler._persist_create(entry)
+        # left for the resource registry to initialize when the timer is written
+        self.assertEquals(scheduler._pending_creates, OrderedDict([(id_, entry)]))
+        self.assertIsNone(getattr(entry, '_id', None))
+        self.assertFalse(entry.ts_created)
+
+    def test_dispatch(self):
+        fired = []
+        done = AsyncResult()
+        def callback(key):
+            fired.append(key)
+            if len(fired) == 3:
+                done.set()
+
+        dispatcher = TimerDispatcher(callback)
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+
+        dispatcher.schedule('c', 0.3)
+        dispatcher.schedule('a', 0.1)
+        dispatcher.schedule('x', 0.15)
+        dispatcher.schedule('b', 0.2)
+        dispatcher.cancel('x')
+        # Rescheduling replaces the pending timer
+        dispatcher.schedule('c', 0.25)
+        self.assertEquals(len(dispatcher), 3)
+
+        done.get(timeout=5)
+        gevent.sleep(0.2)
+        self.assertEquals(fired, ['a', 'b', 'c'])
+        self.assertEquals(len(dispatcher), 0)
+
+
+@attr('BENCHMARK', group='cei')
+class TimerDispatcherBenchmark(PyonTestCase):
+    timers = 100000
+    spread = 5.0
+
+    def run_timers(self, schedule):
+        fired = []
+        done = AsyncResult()
+        def callback(deadline):
+            fired.append(time.time() - deadline)
+            if len(fired) == self.timers:
+                done.set()
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.time()
+        base = start + 1
+        for i in xrange(self.timers):
+            deadline = base + self.spread * i / self.timers
+            schedule(callback, deadline, deadline - time.time())
+        setup = time.time() - start
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+
+        done.get(timeout=self.spread + 60)
+        fired.sort()
+        return setup, rss, fired[len(fired) / 2], fired[int(len(fired) * .99)], fired[-1]
+
+    def test_timers(self):
+        # The heap runs first, ru_maxrss only grows
+        dispatcher = TimerDispatcher(lambda key: key[0](key[1]))
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+        heap = self.run_timers(lambda callback, deadline, delay: dispatcher.schedule((callback, deadline), delay))
+        greenlets = self.run_timers(lambda callback, deadline, delay: gevent.spawn_later(delay, callback, deadline))
+
+        for name, (setup, rss, median, p99, worst) in (('heap', heap), ('greenlet', greenlets)):
+            print '%-8s %d timers  setup %7.3f s  maxrss +%8d KB  jitter median %7.2f ms  p99 %7.2f ms  max %7.2f ms' % (
+                name, self.timers, setup, rss, median * 1000, p99 * 1000, worst * 1000)
@@ -38,6 +38,7 @@ service_gateway_instance = None
 DEFAULT_WEB_SERVER_HOSTNAME = ""
 DEFAULT_WEB_SERVER_PORT = 5000
 DEFAULT_USER_CACHE_SIZE = 2000
+DEFAULT_USER_CACHE_TTL = 300000  # milliseconds, 0 to keep cached actor identities until evicted
 
 GATEWAY_RESPONSE = 'GatewayResponse'
 GATEWAY_ERROR = 'GatewayError'
@@ -95,6 +96,16 @@ class ServiceGatewayService(BaseServiceGatewayService):
         #maxAgeMs = oldest entry to keep
         self.user_role_cache = LRUCache(self.user_cache_size,0,0)
 
+        #Actor identities and service clients are cached for performance reasons unless disabled
+        self.cache_enabled = self.CFG.get_safe('container.service_gateway.cache_enabled', True)
+        self.user_cache_ttl = self.CFG.get_safe('container.service_gateway.user_cache_ttl', DEFAULT_USER_CACHE_TTL)
+
+        #Initialize an LRU Cache of the known actor identities, each with the time it was read at
+        self.actor_identity_cache = LRUCache(self.user_cache_size,0,0)
+
+        #Service definition and process client by service name
+        self.service_client_cache = dict()
+
         #Start the gevent web server unless disabled
         if self.web_server_enabled:
             log.info("Starting service gateway on %s:%s", self.server_hostname, self.server_port)
@@ -109,6 +120,10 @@ class ServiceGatewayService(BaseServiceGatewayService):
             callback=self.user_role_reset_callback)
         self.add_endpoint(self.user_role_reset_subscriber)
 
+        self.actor_identity_event_subscriber = EventSubscriber(event_type=OT.ResourceModifiedEvent, origin_type="ActorIdentity",
+            callback=self.actor_identity_event_callback)
+        self.add_endpoint(self.actor_identity_event_subscriber)
+
     def on_quit(self):
         self.stop_service()
 
@@ -155,11 +170,32 @@ class ServiceGatewayService(BaseServiceGatewayService):
             log.debug('Evicting user from the user_role_cache: %s' % actor_id)
             service_gateway_instance.user_role_cache.evict(actor_id)
 
+        self.evict_actor_identity(actor_id)
+
     def user_role_reset_callback(self, *args, **kwargs):
         '''
         This method is a callback function for when an event is received to clear the user data cache
         '''
         self.user_role_cache.clear()
+        self.actor_identity_cache.clear()
+
+    def actor_identity_event_callback(self, *args, **kwargs):
+        """
+        This method is a callback function for receiving Events when Actor Identities are created, modified or deleted.
+        """
+        actor_identity_event = args[0]
+        actor_id = actor_identity_event.origin
+        log.debug("Actor Identity modified: %s %s" % (actor_id, actor_identity_event.sub_type))
+
+        self.evict_actor_identity(actor_id)
+
+    def evict_actor_identity(self, actor_id):
+        """
+        Evict the actor identity from the cache so that it gets read again with the next call.
+        """
+        if self.actor_identity_cache and self.actor_identity_cache.has_key(actor_id):
+            log.debug('Evicting user from the actor_identity_cache: %s' % actor_id)
+            self.actor_identity_cache.evict(actor_id)
 
 @service_gateway_app.errorhandler(403)
 def custom_403(error):
@@ -201,22 +237,12 @@ def process_gateway_request(service_name, operation):
         service_name = str(service_name)
         operation = str(operation)
 
-        #Retrieve service definition
-        from pyon.core.bootstrap import get_service_registry
-        # MM: Note: service_registry can do more now
-        target_service = get_service_registry().get_service_by_name(service_name)
-
-        if not target_service:
-            raise BadRequest("The requested service (%s) is not available" % service_name)
+        #Retrieve service definition and the client for making the RPC calls
+        target_service, client = get_service_client(service_name)
 
         if operation == '':
             raise BadRequest("Service operation not specified in the URL")
 
-
-        #Find the concrete client class for making the RPC calls.
-        if not target_service.client:
-            raise Inconsistent("Cannot find a client class for the specified service: %s" % service_name )
-
         target_client = target_service.client
 
         #Retrieve json data from HTTP Post payload
@@ -250,7 +276,6 @@ def process_gateway_request(service_name, operation):
         ion_actor_id, expiry = validate_request(ion_actor_id, expiry)
         param_list['headers'] = build_message_headers(ion_actor_id, expiry)
 
-        client = target_client(node=Container.instance.node, process=service_gateway_instance)
         methodToCall = getattr(client, operation)
         result = methodToCall(**param_list)
 
@@ -403,14 +428,29 @@ def validate_request(ion_actor_id, expiry):
         expiry = DEFAULT_EXPIRY  #Since this is now an anonymous request, there really is no expiry associated with it
         return ion_actor_id, expiry
 
-    idm_client = IdentityManagementServiceProcessClient(node=Container.instance.node, process=service_gateway_instance)
+    #Check to see if the actor identity was read recently - keyed by user id
+    actor_identity_cache = service_gateway_instance.actor_identity_cache
+    user_cache_ttl = service_gateway_instance.user_cache_ttl
+    read_time = None
+    if service_gateway_instance.cache_enabled and actor_identity_cache.has_key(ion_actor_id):
+        read_time = actor_identity_cache.get(ion_actor_id)
+        if read_time is not None and user_cache_ttl > 0 and current_time_millis() - read_time > user_cache_ttl:
+            actor_identity_cache.evict(ion_actor_id)
+            read_time = None
 
-    try:
-        user = idm_client.read_actor_identity(actor_id=ion_actor_id, headers={"ion-actor-id": service_gateway_instance.name, 'expiry': DEFAULT_EXPIRY })
-    except NotFound, e:
-        ion_actor_id = DEFAULT_ACTOR_ID  # If the user isn't found default to anonymous
-        expiry = DEFAULT_EXPIRY  #Since this is now an anonymous request, there really is no expiry associated with it
-        return ion_actor_id, expiry
+    #The actor identity was not cached so check that it exists.
+    if read_time is None:
+        idm_client = IdentityManagementServiceProcessClient(node=Container.instance.node, process=service_gateway_instance)
+
+        try:
+            user = idm_client.read_actor_identity(actor_id=ion_actor_id, headers={"ion-actor-id": service_gateway_instance.name, 'expiry': DEFAULT_EXPIRY })
+        except NotFound, e:
+            ion_actor_id = DEFAULT_ACTOR_ID  # If the user isn't found default to anonymous
+            expiry = DEFAULT_EXPIRY  #Since this is now an anonymous request, there really is no expiry associated with it
+            return ion_actor_id, expiry
+
+        if service_gateway_instance.cache_enabled:
+            actor_identity_cache.put(ion_actor_id, current_time_millis())
 
     #need to convert to a float first in order to compare against current time.
     try:
@@ -425,6 +465,32 @@ def validate_request(ion_actor_id, expiry):
 
     return ion_actor_id, expiry
 
+def get_service_client(service_name):
+    """
+    Returns the service definition and a process client for the named service. Both are
+    cached by service name unless caching is disabled.
+    """
+    if service_gateway_instance.cache_enabled and service_gateway_instance.service_client_cache.has_key(service_name):
+        return service_gateway_instance.service_client_cache[service_name]
+
+    from pyon.core.bootstrap import get_service_registry
+    # MM: Note: service_registry can do more now
+    target_service = get_service_registry().get_service_by_name(service_name)
+
+    if not target_service:
+        raise BadRequest("The requested service (%s) is not available" % service_name)
+
+    #Find the concrete client class for making the RPC calls.
+    if not target_service.client:
+        raise Inconsistent("Cannot find a client class for the specified service: %s" % service_name )
+
+    client = target_service.client(node=Container.instance.node, process=service_gateway_instance)
+
+    if service_gateway_instance.cache_enabled:
+        service_gateway_instance.service_client_cache[service_name] = (target_service, client)
+
+    return target_service, client
+
 def build_message_headers( ion_actor_id, expiry):
 
     headers = dict()
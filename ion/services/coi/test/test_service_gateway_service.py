@@ -25,6 +25,7 @@ from pyon.public import OT
 import unittest
 import os
 import gevent
+import time
 
 USER1_CERTIFICATE =  """-----BEGIN CERTIFICATE-----
 MIIEMzCCAxugAwIBAgICBQAwDQYJKoZIhvcNAQEFBQAwajETMBEGCgmSJomT8ixkARkWA29yZzEX
@@ -598,3 +599,85 @@ class TestServiceGatewayServiceInt(IonIntegrationTestCase):
 
         id_client.delete_actor_identity(actor_id)
 
+    def test_actor_identity_cache(self):
+
+        #Create a user
+        id_client = IdentityManagementServiceClient(node=self.container.node)
+
+        actor_id, valid_until, registered = id_client.signon(USER1_CERTIFICATE, True)
+
+        service_gateway = self.container.proc_manager.procs_by_name['service_gateway']
+        actor_identity_cache = service_gateway.actor_identity_cache
+        self.assertEqual(actor_identity_cache.has_key(actor_id), False)
+
+        #Make a request with this new user to get it into the cache
+        response = self.test_app.get('/ion-service/resource_registry/find_resources?name=TestDataProduct&id_only=True&requester=' + actor_id)
+        self.check_response_headers(response)
+        self.assertIn(GATEWAY_RESPONSE, response.json['data'])
+        self.assertEqual(actor_identity_cache.has_key(actor_id), True)
+        self.assertIn('resource_registry', service_gateway.service_client_cache)
+
+        #Expired entries are read again
+        actor_identity_cache.put(actor_id, 0)
+        response = self.test_app.get('/ion-service/resource_registry/find_resources?name=TestDataProduct&id_only=True&requester=' + actor_id)
+        self.check_response_headers(response)
+        self.assertTrue(actor_identity_cache.get(actor_id) > 0)
+
+        id_client.delete_actor_identity(actor_id)
+
+        #Just allow some time for event processing on slower platforms
+        gevent.sleep(2)
+
+        #The user should be evicted from the cache since the actor identity is gone
+        self.assertEqual(actor_identity_cache.has_key(actor_id), False)
+
+        #Unknown users become anonymous and are not cached
+        response = self.test_app.get('/ion-service/resource_registry/find_resources?name=TestDataProduct&id_only=True&requester=' + actor_id)
+        self.check_response_headers(response)
+        self.assertIn(GATEWAY_RESPONSE, response.json['data'])
+        self.assertEqual(actor_identity_cache.has_key(actor_id), False)
+
+
+@attr('BENCHMARK', group='coi-sgs')
+class ServiceGatewayLoadTest(IonIntegrationTestCase):
+    requests = 1000
+
+    def setUp(self):
+        # Start container
+        self._start_container()
+        self.container.start_rel_from_url('res/deploy/r2deploy.yml')
+
+        # Stop the web server, the requests go through the WSGI application directly
+        ServiceGatewayServiceClient(node=self.container.node).stop_service()
+
+        self.test_app = TestApp(service_gateway_app)
+        self.service_gateway = self.container.proc_manager.procs_by_name['service_gateway']
+        self.addCleanup(setattr, self.service_gateway, 'cache_enabled', self.service_gateway.cache_enabled)
+
+    def run_requests(self, url):
+        latencies = []
+        start = time.time()
+        for i in xrange(self.requests):
+            request_start = time.time()
+            response = self.test_app.get(url)
+            latencies.append(time.time() - request_start)
+            self.assertIn(GATEWAY_RESPONSE, response.json['data'])
+        elapsed = time.time() - start
+        latencies.sort()
+        return self.requests / elapsed, latencies[int(len(latencies) * 0.99)]
+
+    def test_request_rate(self):
+        id_client = IdentityManagementServiceClient(node=self.container.node)
+        actor_id, valid_until, registered = id_client.signon(USER1_CERTIFICATE, True)
+        self.addCleanup(id_client.delete_actor_identity, actor_id)
+
+        url = '/ion-service/resource_registry/find_resources?name=TestDataProduct&id_only=True&requester=' + actor_id
+        for cache_enabled in (False, True):
+            self.service_gateway.cache_enabled = cache_enabled
+            self.service_gateway.actor_identity_cache.clear()
+            self.service_gateway.service_client_cache.clear()
+
+            # warm up
+            self.test_app.get(url)
+            rate, p99 = self.run_requests(url)
+            print 'cache_enabled=%-5s %8.1f requests/sec  p99 %8.2f ms' % (cache_enabled, rate, p99 * 1000)
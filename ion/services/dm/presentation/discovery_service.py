@@ -19,6 +19,8 @@ from ion.services.dm.inventory.index_management_service import IndexManagementSe
 from ion.processes.bootstrap.index_bootstrap import STD_INDEXES
 from collections import deque
 from ion.services.dm.utility.query_language import QueryLanguage
+from gevent.pool import Pool
+from gevent.queue import Queue
 
 import dateutil.parser
 import calendar
@@ -29,6 +31,8 @@ import heapq
 
 class DiscoveryService(BaseDiscoveryService):
     SEARCH_BUFFER_SIZE=CFG.get_safe('service.discovery.search_buffer_size', 1048576)
+    # Number of tier-2 sub-queries of a request that run concurrently
+    QUERY_PARALLELISM=CFG.get_safe('service.discovery.query_parallelism', 4)
 
     """
     class docstring
@@ -190,34 +194,48 @@ class DiscoveryService(BaseDiscoveryService):
 #
 #        return db.query_view(view_name,opts=opts)
 
+    def _object_edges(self, resource_ids):
+        return self.clients.resource_registry.find_objects_mult(subjects=resource_ids,id_only=True)[0]
+
+    def _subject_edges(self, resource_ids):
+        return self.clients.resource_registry.find_subjects_mult(objects=resource_ids,id_only=True)[0]
+
+    def _traverse(self, resource_id, edges, depth=None, limit=0):
+        '''
+        Breadth first traversal of the association graph from a resource. Each level is expanded with a single
+        edges call for the whole frontier and every resource is expanded once.
+
+        @param resource_id    str
+        @param edges          function of a list of resource ids to the ids associated with them
+        @param depth          number of levels to expand beyond the resources associated with resource_id,
+                              None for no bound
+        @param limit          maximum number of resources to return, 0 for no limit
+        @retval resources     list of resource ids in the order they were found
+        '''
+        visited = set()
+        resources = []
+        frontier = [resource_id]
+        level = -1
+        while frontier and (depth is None or level < depth):
+            next_frontier = []
+            for e in edges(frontier):
+                if e not in visited:
+                    visited.add(e)
+                    next_frontier.append(e)
+            resources.extend(next_frontier)
+            if limit and len(resources) >= limit:
+                return resources[:limit]
+            frontier = next_frontier
+            level += 1
+        return resources
+
     def traverse(self, resource_id=''):
         """Breadth-first traversal of the association graph for a specified resource.
 
         @param resource_id    str
         @retval resources    list
         """
-        
-        def edges(resource_ids=[]):
-            if not isinstance(resource_ids, list):
-                resource_ids = list(resource_ids)
-            return self.clients.resource_registry.find_objects_mult(subjects=resource_ids,id_only=True)[0]
-            
-        visited_resources = deque(edges([resource_id]))
-        traversal_queue = deque()
-        done = False
-        t = None
-        while not done:
-            t = traversal_queue or deque(visited_resources)
-            traversal_queue = deque()
-            for e in edges(t):
-                if not e in visited_resources:
-                    visited_resources.append(e)
-                    traversal_queue.append(e)
-            if not len(traversal_queue): done = True
-
-
-
-        return list(visited_resources)
+        return self._traverse(resource_id, self._object_edges)
 
     def reverse_traverse(self, resource_id=''):
         """Breadth-first traversal of the association graph for a specified resource.
@@ -225,89 +243,19 @@ class DiscoveryService(BaseDiscoveryService):
         @param resource_id    str
         @retval resources    list
         """
-        
-        def edges(resource_ids=[]):
-            if not isinstance(resource_ids,list):
-                resource_ids = list(resource_ids)
-            return self.clients.resource_registry.find_subjects_mult(objects=resource_ids,id_only=True)[0]
-            
-        visited_resources = deque(edges([resource_id]))
-        traversal_queue = deque()
-        done = False
-        t = None
-        while not done:
-            t = traversal_queue or deque(visited_resources)
-            traversal_queue = deque()
-            for e in edges(t):
-                if not e in visited_resources:
-                    visited_resources.append(e)
-                    traversal_queue.append(e)
-            if not len(traversal_queue): done = True
-
-
-
-        return list(visited_resources)
-    
+        return self._traverse(resource_id, self._subject_edges)
 
     def iterative_traverse(self, resource_id='', limit=-1):
         '''
-        Iterative breadth first traversal of the resource associations
+        Iterative breadth first traversal of the resource associations, limit levels beyond the direct associations
         '''
-        #--------------------------------------------------------------------------------
-        # Retrieve edges for this resource
-        #--------------------------------------------------------------------------------
-        def edges(resource_ids=[]):
-            if not isinstance(resource_ids, list):
-                resource_ids = list(resource_ids)
-            return self.clients.resource_registry.find_objects_mult(subjects=resource_ids,id_only=True)[0]
-            
-        gathered = deque()
-        visited_resources = deque(edges([resource_id]))
-        while limit>0:
-            t = gathered or deque(visited_resources)
-            for e in edges(t):
-                if not e in visited_resources:
-                    visited_resources.append(e)
-                    gathered.append(e)
-            if not len(gathered): break
-
-            t = deque(gathered)
-            gathered = deque()
-            limit -= 1
-
-        return list(visited_resources)
+        return self._traverse(resource_id, self._object_edges, depth=max(limit, 0))
 
     def iterative_reverse_traverse(self, resource_id='', limit=-1):
         '''
-        Iterative breadth first traversal of the resource associations
+        Iterative breadth first traversal of the resource associations, limit levels beyond the direct associations
         '''
-        #--------------------------------------------------------------------------------
-        # Retrieve edges for this resource
-        #--------------------------------------------------------------------------------
-        def edges(resource_ids=[]):
-            if not isinstance(resource_ids, list):
-                resource_ids = list(resource_ids)
-            return self.clients.resource_registry.find_subjects_mult(objects=resource_ids,id_only=True)[0]
-            
-        gathered = deque()
-        visited_resources = deque(edges([resource_id]))
-        while limit>0:
-            t = gathered or deque(visited_resources)
-            for e in edges(t):
-                if not e in visited_resources:
-                    visited_resources.append(e)
-                    gathered.append(e)
-            if not len(gathered): break
-
-            t = deque(gathered)
-            gathered = deque()
-            limit -= 1
-
-        return list(visited_resources)
-
-
-            
-
+        return self._traverse(resource_id, self._subject_edges, depth=max(limit, 0))
 
     def intersect(self, left=[], right=[]):
         """The intersection between two sets of resources.
@@ -1107,8 +1055,6 @@ class DiscoveryService(BaseDiscoveryService):
         if not (query.has_key('query') and query.has_key('and') and query.has_key('or')):
             raise BadRequest('Improper query request: %s' % query)
 
-        query_queue = list()
-
         query = DotDict(query)
         #================================================
         # Tier-1 Query
@@ -1123,35 +1069,65 @@ class DiscoveryService(BaseDiscoveryService):
         #================================================
         # Tier-2 Query
         #================================================
-        
-        query_queue.append(self.query_request(query.query,limit=self.SEARCH_BUFFER_SIZE, id_only=True))
-        
-        #==================
-        # Intersection
-        #==================
-        for q in query['and']:
-            query_queue.append(self.query_request(q, limit=self.SEARCH_BUFFER_SIZE, id_only=True))
-        while len(query_queue) > 1:
-            tmp = self.intersect(query_queue.pop(), query_queue.pop())
-            query_queue.append(tmp)
-        
-        #==================
-        # Union
-        #==================
-        for q in query['or']:
-            query_queue.append(self.query_request(q, limit=self.SEARCH_BUFFER_SIZE, id_only=True))
-        while len(query_queue) > 1:
-            tmp = self.union(query_queue.pop(), query_queue.pop())
-            query_queue.append(tmp)
-        
-        if id_only:
-            return query_queue[0]
 
-        objects = self.clients.resource_registry.read_mult(query_queue[0])
-        return objects
+        results = self._tier2_request(query)
 
+        if id_only:
+            return results
 
+        objects = self.clients.resource_registry.read_mult(results)
+        return objects
 
+    def _tier2_request(self, query):
+        '''
+        Runs the sub-queries of a tier-2 request, up to QUERY_PARALLELISM at a time, and returns the ids matching
+        the query and all the 'and' queries, or any of the 'or' queries.
+        The intersection starts with the smallest result; once it is empty the remaining 'and' queries are dropped.
+        Sub-queries can not be limited: the intersection needs their complete results.
+        '''
+        pending = deque([(True, query.query)] + [(True, q) for q in query['and']] + [(False, q) for q in query['or']])
+        and_results = []
+        union = set()
+        empty = False # The intersection is known to be empty
+
+        pool = Pool(self.QUERY_PARALLELISM)
+        done = Queue()
+        running = {}
+        try:
+            while pending or running:
+                while pending and pool.free_count():
+                    is_and, q = pending.popleft()
+                    greenlet = pool.spawn(self.query_request, q, limit=self.SEARCH_BUFFER_SIZE, id_only=True)
+                    greenlet.link(done.put)
+                    running[greenlet] = is_and
+                greenlet = done.get()
+                if greenlet not in running: # Cancelled
+                    continue
+                is_and = running.pop(greenlet)
+                if not greenlet.successful():
+                    raise greenlet.exception
+                if not is_and:
+                    union.update(greenlet.value)
+                elif not greenlet.value:
+                    empty = True
+                    pending = deque(item for item in pending if not item[0])
+                    for g in [g for g, a in running.iteritems() if a]:
+                        del running[g]
+                        g.kill()
+                else:
+                    and_results.append(greenlet.value)
+        finally:
+            pool.kill()
+
+        intersection = set()
+        if not empty:
+            and_results.sort(key=len)
+            intersection.update(and_results[0])
+            for result in and_results[1:]:
+                intersection.intersection_update(result)
+                if not intersection:
+                    break
+        return list(intersection | union)
 
     def raise_search_buffer_exceeded(self):
         self.ep.publish_event(origin='Discovery Service', description='Search buffer was exceeded, results may not contain all the possible results.')
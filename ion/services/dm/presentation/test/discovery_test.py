@@ -31,6 +31,7 @@ from pyon.util.ion_time import IonTime
 from pyon.util.containers import get_ion_ts
 
 import gevent
+from collections import deque
 import elasticpy as ep
 import dateutil.parser
 import time
@@ -146,21 +147,22 @@ class DiscoveryUnitTest(PyonTestCase):
         pass
         
 
-    @skip('Needs to be adjusted for new traversal')
     def test_traverse(self):
-        edge_list = ['B','C','D']
-        callers = []
-        def pop_edge(*args, **kwargs):
-            callers.append(args[0])
-            if len(edge_list):
-                val = edge_list.pop(0)
-                return [val], 'blah'
-            return [], 'blah'
-        self.rr_find_obj.side_effect = pop_edge
+        graph = {'A':['B','C'], 'B':['D','A'], 'C':['D'], 'D':['E'], 'E':[]}
+        calls = []
+        def find_objects_mult(subjects, id_only=True):
+            calls.append(list(subjects))
+            return [o for subject in subjects for o in graph[subject]], []
+        self.rr_find_assocs_mult.side_effect = find_objects_mult
 
         retval = self.discovery.traverse('A')
-        retval.sort()
-        self.assertTrue(retval == ['B','C','D'], '%s' % retval)
+        self.assertEquals(retval, ['B','C','D','A','E'])
+        # One call per level, every resource expanded once
+        self.assertEquals(calls, [['A'], ['B','C'], ['D','A'], ['E']])
+
+        self.assertEquals(self.discovery.iterative_traverse('A'), ['B','C'])
+        self.assertEquals(self.discovery.iterative_traverse('A', 1), ['B','C','D','A'])
+        self.assertEquals(self.discovery._traverse('A', self.discovery._object_edges, limit=3), ['B','C','D'])
 
     def test_intersect(self):
         test_vals = [0,1,2,3]
@@ -336,6 +338,28 @@ class DiscoveryUnitTest(PyonTestCase):
 
         self.assertTrue(retval == [0,1,2,3,4])
 
+    def test_tier2_concurrency(self):
+        backend = StubSearchBackend({'a':(0.05, [0,1,2,3]), 'b':(0.01, []), 'c':(0.2, [0,1]), 'd':(0.02, [7])})
+        self.discovery.query_request = backend.query_request
+        self.discovery.QUERY_PARALLELISM = 2
+
+        request = {'query':{'id':'a'}, 'and':[{'id':'b'}, {'id':'c'}], 'or':[{'id':'d'}]}
+        retval = self.discovery.request(request)
+
+        # The empty 'b' result cancels 'c' before it completes or is started
+        self.assertEquals(retval, [7])
+        self.assertNotIn('c', backend.completed)
+        self.assertEquals(backend.max_running, 2)
+
+        request = {'query':{'id':'a'}, 'and':[{'id':'c'}], 'or':[{'id':'d'}]}
+        retval = self.discovery.request(request)
+        retval.sort()
+        self.assertEquals(retval, [0,1,7])
+
+        request = {'query':{'id':'a'}, 'and':[{'id':'unknown'}], 'or':[]}
+        with self.assertRaises(KeyError):
+            self.discovery.request(request)
+
     def test_bad_requests(self):
         #================================
         # Battery of broken requests
@@ -420,6 +444,92 @@ class DiscoveryUnitTest(PyonTestCase):
 
 
         
+class StubSearchBackend(object):
+    '''
+    Search backend answering sub-queries {'id':<name>} from a table of name -> (latency, result ids)
+    '''
+    def __init__(self, table):
+        self.table = table
+        self.running = 0
+        self.max_running = 0
+        self.completed = []
+
+    def query_request(self, query=None, limit=0, id_only=False):
+        latency, result = self.table[query['id']]
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            gevent.sleep(latency)
+        finally:
+            self.running -= 1
+        self.completed.append(query['id'])
+        return list(result)
+
+
+def legacy_traverse(edges, resource_id):
+    '''
+    Traversal with deque membership checks, as DiscoveryService.traverse before the traversal engine
+    '''
+    visited_resources = deque(edges([resource_id]))
+    traversal_queue = deque()
+    done = False
+    while not done:
+        t = traversal_queue or deque(visited_resources)
+        traversal_queue = deque()
+        for e in edges(list(t)):
+            if not e in visited_resources:
+                visited_resources.append(e)
+                traversal_queue.append(e)
+        if not len(traversal_queue): done = True
+    return list(visited_resources)
+
+
+@attr('BENCHMARK', group='dm')
+class DiscoveryTraversalBenchmark(PyonTestCase):
+    nodes = 50000
+    fan_out = 8
+
+    def test_tree_traversal(self):
+        # Site/device like tree, node i is associated with its children
+        children = dict((i, range(i * self.fan_out + 1, min((i + 1) * self.fan_out + 1, self.nodes))) for i in xrange(self.nodes))
+        self.calls = 0
+        def edges(resource_ids):
+            self.calls += 1
+            return [child for resource_id in resource_ids for child in children[resource_id]]
+        discovery = DiscoveryService()
+
+        for name, traverse in (('frontier set', lambda : discovery._traverse(0, edges)), ('legacy deque', lambda : legacy_traverse(edges, 0))):
+            self.calls = 0
+            start = time.time()
+            resources = traverse()
+            elapsed = time.time() - start
+            self.assertEquals(len(resources), self.nodes - 1)
+            print '%-14s %6d nodes %10.3f s  %4d edge queries' % (name, self.nodes, elapsed, self.calls)
+
+
+@attr('BENCHMARK', group='dm')
+class DiscoveryRequestBenchmark(PyonTestCase):
+    latency = 0.02
+    repeat = 20
+
+    def test_clause_latency(self):
+        discovery = DiscoveryService()
+        table = dict(('q%d' % i, (self.latency, range(i, 10000))) for i in xrange(8))
+        for parallelism in (1, 4, 8):
+            discovery.QUERY_PARALLELISM = parallelism
+            for clauses in xrange(1, 9):
+                backend = StubSearchBackend(table)
+                discovery.query_request = backend.query_request
+                request = {'query':{'id':'q0'}, 'and':[{'id':'q%d' % i} for i in xrange(1, clauses)], 'or':[]}
+                if clauses == 1:
+                    request['or'] = [{'id':'q1'}]
+                start = time.time()
+                for i in xrange(self.repeat):
+                    discovery.request(request)
+                elapsed = (time.time() - start) / self.repeat
+                print 'parallelism=%d clauses=%d latency %8.1f ms (backend latency %.1f ms per clause)' % (parallelism, clauses, elapsed * 1000, self.latency * 1000)
+
+
 @attr('INT', group='dm')
 @attr('LOCOINT')
 @unittest.skipIf(os.getenv('CEI_LAUNCH_TEST', False), 'Skip test while in CEI LAUNCH mode')
@@ -13,6 +13,19 @@ from pyon.util.unit_test import PyonTestCase
 from nose.plugins.attrib import attr
 from ion.services.dm.presentation.discovery_service import QueryLanguage
 
+import time
+
+
+def interpreted_condition(event, query_dict):
+    '''
+    Evaluates a condition by interpreting the queries on each call, for comparison with compiled conditions
+    '''
+    if any(QueryLanguage.match(event, or_query) for or_query in query_dict['or']):
+        return True
+    if not all(QueryLanguage.match(event, and_query) for and_query in query_dict['and']):
+        return False
+    return QueryLanguage.match(event, query_dict['query'])
+
 
 @attr('UNIT', group='dm')
 class QueryLanguageUnitTest(PyonTestCase):
@@ -196,3 +209,101 @@ class QueryLanguageUnitTest(PyonTestCase):
         test_string = "search 'geospatial_bounds' vertical from 0.5 to 10.2 from 'index'"
         retval = self.parser.parse(test_string)
         self.assertEquals(retval, {'and':[], 'or':[], 'query':{'field':'geospatial_bounds', 'vertical_bounds':{'from':0.5, 'to':10.2}, 'index':'index'}})
+
+    def test_parse_cache(self):
+        test_string = "SEARCH 'model' IS 'abc*' FROM 'models' AND BELONGS TO 'platformDeviceID'"
+        retval = self.parser.parse(test_string)
+        retval['query']['value'] = 'modified'
+        self.assertEquals(QueryLanguage().parse(test_string)['query']['value'], 'abc*')
+        self.assertIs(QueryLanguage().get_grammar(), self.parser.sentence)
+
+        with self.assertRaises(BadRequest):
+            self.parser.parse("SEARCH 'model' IS FROM")
+
+    def test_compiled_condition(self):
+        events = [DotDict(origin='instrument_%d' % i, sub_type='OPERATIONAL', value=i) for i in xrange(5)]
+        cases = [
+            "SEARCH 'origin' IS 'instrument_1' FROM 'events'",
+            "SEARCH 'origin' IS 'instrument_1' FROM 'events' OR SEARCH 'origin' IS 'instrument_3' FROM 'events'",
+            "SEARCH 'sub_type' IS 'OPERATIONAL' FROM 'events' AND SEARCH 'origin' IS 'instrument_2' FROM 'events'",
+            "SEARCH 'value' VALUES FROM 1 TO 3 FROM 'events'",
+            ]
+        for case in cases:
+            query_dict = self.parser.parse(case)
+            condition = QueryLanguage.compile_condition(query_dict)
+            for event in events:
+                self.assertEquals(bool(condition(event)), bool(interpreted_condition(event, query_dict)), case)
+
+        with self.assertRaises(BadRequest):
+            QueryLanguage.evaluate_condition(events[0], self.parser.parse("SEARCH 'origin' LIKE 'instrument' FROM 'events'"))
+
+
+@attr('BENCHMARK', group='dm')
+class QueryLanguageBenchmark(PyonTestCase):
+    queries = [
+        "SEARCH 'model' IS 'abc*' FROM 'models' AND BELONGS TO 'platformDeviceID'",
+        "SEARCH 'model' IS 'sbc*' FROM 'devices' ORDER BY 'name' LIMIT 30 AND BELONGS TO 'platformDeviceID'",
+        "SEARCH 'runtime' VALUES FROM 1. TO 100 FROM 'devices' AND BELONGS TO 'RSN'",
+        "search 'description' like 'products' from 'index' and has 'abc123'",
+        "search 'nominal_datetime' timebounds from '2012-01-01' to '2013-04-04' from 'index'",
+        "search 'location' geo box top-left lat 40 lon 0 bottom-right lat 0 lon 40 from 'index'",
+        'search "ts_created" values from 1000 to 2000 from "events_index" and search "origin" is "instrument_1" from "events_index" '
+        'and search "origin_type" is "*" from "events_index" and search "type_" is "ResourceLifecycleEvent" from "events_index"',
+        ]
+    conditions = [
+        "SEARCH 'origin' IS 'instrument_1' FROM 'events' OR SEARCH 'origin' IS 'instrument_3' FROM 'events'",
+        "SEARCH 'sub_type' IS 'OPERATIONAL' FROM 'events' AND SEARCH 'origin' IS 'instrument_2' FROM 'events'",
+        "SEARCH 'value' VALUES FROM 1 TO 3 FROM 'events'",
+        ]
+
+    def test_parse(self):
+        count = 200
+        start = time.time()
+        for i in xrange(count):
+            parser = QueryLanguage()
+            parser.sentence = QueryLanguage._build_grammar()
+            QueryLanguage._parse_cache.clear()
+            for query in self.queries:
+                parser.parse(query)
+        elapsed = time.time() - start
+        print 'grammar per instance, no cache %10.1f parses/sec' % (count * len(self.queries) / elapsed)
+
+        start = time.time()
+        for i in xrange(count):
+            parser = QueryLanguage()
+            QueryLanguage._parse_cache.clear()
+            for query in self.queries:
+                parser.parse(query)
+        elapsed = time.time() - start
+        print 'shared grammar, no cache       %10.1f parses/sec' % (count * len(self.queries) / elapsed)
+
+        count = 20000
+        start = time.time()
+        for i in xrange(count):
+            parser = QueryLanguage()
+            for query in self.queries:
+                parser.parse(query)
+        elapsed = time.time() - start
+        print 'shared grammar, parse cache    %10.1f parses/sec' % (count * len(self.queries) / elapsed)
+
+    def test_match(self):
+        events = [DotDict(origin='instrument_%d' % i, sub_type='OPERATIONAL', value=i % 5) for i in xrange(1000)]
+        query_dicts = [QueryLanguage().parse(condition) for condition in self.conditions]
+        rounds = 20
+
+        start = time.time()
+        for i in xrange(rounds):
+            for query_dict in query_dicts:
+                for event in events:
+                    interpreted_condition(event, query_dict)
+        elapsed = time.time() - start
+        print 'interpreted conditions %10.1f matches/sec' % (rounds * len(query_dicts) * len(events) / elapsed)
+
+        start = time.time()
+        for i in xrange(rounds):
+            for query_dict in query_dicts:
+                condition = QueryLanguage.compile_condition(query_dict)
+                for event in events:
+                    condition(event)
+        elapsed = time.time() - start
+        print 'compiled conditions    %10.1f matches/sec' % (rounds * len(query_dicts) * len(events) / elapsed)
@@ -26,6 +26,8 @@ from coverage_model.parameter_functions import ParameterFunctionException
 from coverage_model.parameter_values import AbstractParameterValue, ConstantValue
 from coverage_model.parameter_types import ParameterFunctionType
 
+import collections
+import hashlib
 import numpy as np
 import msgpack
 import time
@@ -61,12 +63,16 @@ class RecordDictionaryTool(object):
     connection_id       = ''
     connection_index    = ''
 
+    # Process-wide LRU of loaded parameter dictionaries, shared by every record dictionary
+    PDICT_CACHE_LIMIT   = 100
+    _pdict_cache        = collections.OrderedDict()
+
 
     def __init__(self,param_dictionary=None, stream_definition_id='', locator=None, stream_definition=None):
         """
         """
         if type(param_dictionary) == dict:
-            self._pdict = ParameterDictionary.load(param_dictionary)
+            self._pdict = RecordDictionaryTool.load_parameter_dictionary(param_dictionary)
         
         elif isinstance(param_dictionary,ParameterDictionary):
             self._pdict = param_dictionary
@@ -81,7 +87,7 @@ class RecordDictionaryTool(object):
             pdict = stream_def_obj.parameter_dictionary
             self._available_fields = stream_def_obj.available_fields or None
             self._stream_config = stream_def_obj.stream_configuration
-            self._pdict = ParameterDictionary.load(pdict)
+            self._pdict = RecordDictionaryTool.load_parameter_dictionary(pdict, key=stream_definition_id or None)
             self._stream_def = stream_definition_id
 
         else:
@@ -186,6 +192,59 @@ class RecordDictionaryTool(object):
 
         return instance
 
+    @classmethod
+    def empty_like(cls, rdt):
+        '''
+        Returns an empty record dictionary for the same parameter dictionary and stream definition as rdt,
+        without reading or loading either again.
+        '''
+        instance = cls(param_dictionary=rdt._pdict, locator=rdt._locator)
+        instance._stream_def         = rdt._stream_def
+        instance._definition         = rdt._definition
+        instance._available_fields   = rdt._available_fields
+        instance._stream_config      = rdt._stream_config
+        return instance
+
+    @classmethod
+    def concatenate(cls, rdts):
+        '''
+        Concatenates record dictionaries sharing a parameter dictionary into one record dictionary, in order.
+        Fields missing from some members are padded with the field's fill value, constants take the last value.
+        The connection information is taken from the first member.
+        '''
+        rdts = [rdt for rdt in rdts if len(rdt)]
+        if not rdts:
+            return None
+        if len(rdts) == 1:
+            return rdts[0]
+
+        first = rdts[0]
+        instance = cls.empty_like(first)
+        instance._creation_timestamp = first._creation_timestamp
+        instance.connection_id       = first.connection_id
+        instance.connection_index    = first.connection_index
+        instance._shp = (sum(len(rdt) for rdt in rdts),)
+
+        for field in first.fields:
+            ptype = instance._pdict.get_context(field).param_type
+            if isinstance(ptype, ParameterFunctionType):
+                continue
+            present = [rdt for rdt in rdts if rdt._rd.get(field) is not None]
+            if not present:
+                continue
+            if isinstance(ptype, (ConstantType, ConstantRangeType)):
+                instance._rd[field] = cls.get_paramval(ptype, instance.domain, present[-1]._rd[field].content)
+                continue
+            values = []
+            for rdt in rdts:
+                if rdt._rd.get(field) is None:
+                    values.append(np.asanyarray([instance.fill_value(field)] * len(rdt)))
+                else:
+                    values.append(np.atleast_1d(rdt[field]))
+            instance._rd[field] = cls.get_paramval(ptype, instance.domain, np.concatenate(values))
+
+        return instance
+
     def to_granule(self, data_producer_id='',provider_metadata_update={}, connection_id='', connection_index=''):
         granule = Granule()
         granule.record_dictionary = {}
@@ -424,6 +483,25 @@ class RecordDictionaryTool(object):
         return len(byte_stream)
 
     
+    @classmethod
+    def load_parameter_dictionary(cls, pdict_dump, key=None):
+        '''
+        Memoization (LRU) of ParameterDictionary.load keyed on the content hash of the dump (or an explicit key).
+        The loaded parameter dictionary is shared and must be treated as immutable.
+        '''
+        if cls.PDICT_CACHE_LIMIT <= 0:
+            return ParameterDictionary.load(pdict_dump)
+        if key is None:
+            key = hashlib.sha1(msgpack.packb(pdict_dump, default=encode_ion)).hexdigest()
+        try:
+            result = cls._pdict_cache.pop(key)
+        except KeyError:
+            result = ParameterDictionary.load(pdict_dump)
+            if len(cls._pdict_cache) >= cls.PDICT_CACHE_LIMIT:
+                cls._pdict_cache.popitem(0)
+        cls._pdict_cache[key] = result
+        return result
+
     @staticmethod
     @memoize_lru(maxsize=100)
     def read_stream_def(stream_def_id):
@@ -7,6 +7,9 @@
 '''
 from pyparsing import ParseException, Regex, quotedString, CaselessLiteral, MatchFirst, removeQuotes, Optional
 from pyon.core.exception import BadRequest
+import collections
+import copy
+import functools
 
 
 class QueryLanguage(object):
@@ -59,11 +62,30 @@ class QueryLanguage(object):
               <integer> ::= 0-9
     '''
 
-    def __init__(self):
-
+    PARSE_CACHE_LIMIT = 1000
+    _sentence = None                         # The grammar, see get_grammar
+    _parsing = None                          # The parser running the grammar
+    _parse_cache = collections.OrderedDict() # query string -> (json_query, tokens)
+    _condition_cache = collections.OrderedDict() # repr(query dict) -> compiled condition
 
+    def __init__(self):
         self.json_query = {'query':{}, 'and': [], 'or': []}
         self.tokens = None
+        self.sentence = self.get_grammar()
+
+    @classmethod
+    def get_grammar(cls):
+        '''
+        Returns the grammar, it is built once per process. The parse actions build the query of the parser
+        currently parsing (see parse).
+        '''
+        if QueryLanguage._sentence is None:
+            QueryLanguage._sentence = cls._build_grammar()
+        return QueryLanguage._sentence
+
+    @classmethod
+    def _build_grammar(cls):
+        parser = lambda : QueryLanguage._parsing
         #--------------------------------------------------------------------------------------
         # <integer> ::= 0-9
         # <double>  ::= 0-9 ('.' 0-9)
@@ -89,7 +111,7 @@ class QueryLanguage(object):
         coords = CaselessLiteral("LAT") + number + CaselessLiteral("LON") + number
         units = CaselessLiteral('km') | CaselessLiteral('mi')
         distance = number + units
-        distance.setParseAction( lambda x : self.frame.update({'dist' : float(x[0]), 'units' : x[1]}))
+        distance.setParseAction( lambda x : parser().frame.update({'dist' : float(x[0]), 'units' : x[1]}))
 
 
         #--------------------------------------------------------------------------------------
@@ -105,10 +127,10 @@ class QueryLanguage(object):
         #--------------------------------------------------------------------------------------
         query_filter = CaselessLiteral("FILTER") + python_string
         # Add the filter to the frame object
-        query_filter.setParseAction(lambda x : self.frame.update({'filter' : x[1]}))
+        query_filter.setParseAction(lambda x : parser().frame.update({'filter' : x[1]}))
         index_name = MatchFirst(python_string)
         # Add the index to the frame object
-        index_name.setParseAction(lambda x : self.frame.update({'index' : x[0]}))
+        index_name.setParseAction(lambda x : parser().frame.update({'index' : x[0]}))
         resource_id = Regex(r'("(?:[a-zA-Z0-9\$_-])*"|\'(?:[a-zA-Z0-9\$_-]*)\')').setParseAction(removeQuotes)
         collection_id = resource_id
 
@@ -118,9 +140,9 @@ class QueryLanguage(object):
         # <to-statement>   ::= "TO" <number>
         #--------------------------------------------------------------------------------------
         from_statement = CaselessLiteral("FROM") + number
-        from_statement.setParseAction(lambda x : self.frame.update({'from' : x[1]}))
+        from_statement.setParseAction(lambda x : parser().frame.update({'from' : x[1]}))
         to_statement = CaselessLiteral("TO") + number
-        to_statement.setParseAction(lambda x : self.frame.update({'to' : x[1]}))
+        to_statement.setParseAction(lambda x : parser().frame.update({'to' : x[1]}))
 
 
         #--------------------------------------------------------------------------------------
@@ -128,45 +150,45 @@ class QueryLanguage(object):
         # <date-to-statement>   ::= "TO" <date>
         #--------------------------------------------------------------------------------------
         date_from_statement = CaselessLiteral("FROM") + date
-        date_from_statement.setParseAction(lambda x : self.frame.update({'from' : x[1]}))
+        date_from_statement.setParseAction(lambda x : parser().frame.update({'from' : x[1]}))
         date_to_statement = CaselessLiteral("TO") + date
-        date_to_statement.setParseAction(lambda x : self.frame.update({'to' : x[1]}))
+        date_to_statement.setParseAction(lambda x : parser().frame.update({'to' : x[1]}))
 
 
         #--------------------------------------------------------------------------------------
         # <time-query> ::= "TIME FROM" <date> "TO" <date>
         #--------------------------------------------------------------------------------------
         time_query = CaselessLiteral("TIME") + Optional(date_from_statement) + Optional(date_to_statement)
-        time_query.setParseAction(lambda x : self.time_frame())
+        time_query.setParseAction(lambda x : parser().time_frame())
            # time.mktime(dateutil.parser.parse(x[2])), 'to':time.mktime(dateutil.parser.parse(x[4]))}}))
 
         #--------------------------------------------------------------------------------------
         # <time-bounds> ::= "TIMEBOUNDS" <from-statement> <to-statement>
         #--------------------------------------------------------------------------------------
         time_bounds = CaselessLiteral("TIMEBOUNDS") + date_from_statement + date_to_statement
-        time_bounds.setParseAction(lambda x : self.time_bounds_frame())
+        time_bounds.setParseAction(lambda x : parser().time_bounds_frame())
 
         #--------------------------------------------------------------------------------------
         # <vertical-bounds> ::= "VERTICAL" <from-statement> <to-statement>        
         #--------------------------------------------------------------------------------------
         vertical_bounds = CaselessLiteral("VERTICAL") + from_statement + to_statement
-        vertical_bounds.setParseAction(lambda x : self.vertical_bounds_frame())
+        vertical_bounds.setParseAction(lambda x : parser().vertical_bounds_frame())
         
         #--------------------------------------------------------------------------------------
         # <range-query>  ::= "VALUES" [<from-statement>] [<to-statement>]
         #--------------------------------------------------------------------------------------
         range_query = CaselessLiteral("VALUES") + Optional(from_statement) + Optional(to_statement)
         # Add the range to the frame object
-        range_query.setParseAction(lambda x : self.range_frame())
+        range_query.setParseAction(lambda x : parser().range_frame())
 
         #--------------------------------------------------------------------------------------
         # <geo-distance> ::= "DISTANCE" <distance> "FROM" <coords>
         # <geo-bbox>     ::= "BOX" "TOP-LEFT" <coords> "BOTTOM-RIGHT" <coords>
         #--------------------------------------------------------------------------------------
         geo_distance = CaselessLiteral("DISTANCE") + distance + CaselessLiteral("FROM") + coords
-        geo_distance.setParseAction(lambda x : self.frame.update({'lat': float(x[5]), 'lon':float(x[7])}))
+        geo_distance.setParseAction(lambda x : parser().frame.update({'lat': float(x[5]), 'lon':float(x[7])}))
         geo_bbox = CaselessLiteral("BOX") + CaselessLiteral("TOP-LEFT") + coords + CaselessLiteral("BOTTOM-RIGHT") + coords
-        geo_bbox.setParseAction(lambda x : self.frame.update({'top_left':[float(x[5]),float(x[3])], 'bottom_right':[float(x[10]),float(x[8])]}))
+        geo_bbox.setParseAction(lambda x : parser().frame.update({'top_left':[float(x[5]),float(x[3])], 'bottom_right':[float(x[10]),float(x[8])]}))
 
         #--------------------------------------------------------------------------------------
         # <field-query>  ::= <wildcard-string>
@@ -177,14 +199,14 @@ class QueryLanguage(object):
         #--------------------------------------------------------------------------------------
         field_query = wildcard_string
         term_query = CaselessLiteral("IS") + field_query
-        term_query.setParseAction(lambda x : self.frame.update({'value':x[1]}))
+        term_query.setParseAction(lambda x : parser().frame.update({'value':x[1]}))
         
         geo_query = CaselessLiteral("GEO") + ( geo_distance | geo_bbox )
 
         fuzzy_query = CaselessLiteral("LIKE") + field_query
-        fuzzy_query.setParseAction(lambda x : self.frame.update({'fuzzy':x[1]}))
+        fuzzy_query.setParseAction(lambda x : parser().frame.update({'fuzzy':x[1]}))
         match_query = CaselessLiteral("MATCH") + field_query
-        match_query.setParseAction(lambda x : self.frame.update({'match':x[1]}))
+        match_query.setParseAction(lambda x : parser().frame.update({'match':x[1]}))
 
         #--------------------------------------------------------------------------------------
         # <limit-parameter>  ::= "LIMIT" <integer>
@@ -194,13 +216,13 @@ class QueryLanguage(object):
         # <query-parameter>  ::= <order-paramater> | <limit-parameter>
         #--------------------------------------------------------------------------------------
         limit_parameter = CaselessLiteral("LIMIT") + integer
-        limit_parameter.setParseAction(lambda x: self.frame.update({'limit' : int(x[1])}))
+        limit_parameter.setParseAction(lambda x: parser().frame.update({'limit' : int(x[1])}))
         depth_parameter = CaselessLiteral("DEPTH") + integer
-        depth_parameter.setParseAction(lambda x: self.frame.update({'depth' : int(x[1])}))
+        depth_parameter.setParseAction(lambda x: parser().frame.update({'depth' : int(x[1])}))
         order_parameter = CaselessLiteral("ORDER") + CaselessLiteral("BY") + limited_string
-        order_parameter.setParseAction(lambda x: self.frame.update({'order' : {x[2] : 'asc'}}))
+        order_parameter.setParseAction(lambda x: parser().frame.update({'order' : {x[2] : 'asc'}}))
         offset_parameter = CaselessLiteral("SKIP") + integer
-        offset_parameter.setParseAction(lambda x : self.frame.update({'offset' : int(x[1])}))
+        offset_parameter.setParseAction(lambda x : parser().frame.update({'offset' : int(x[1])}))
         query_parameter = limit_parameter | order_parameter | offset_parameter
 
         #--------------------------------------------------------------------------------------
@@ -212,14 +234,14 @@ class QueryLanguage(object):
         #--------------------------------------------------------------------------------------
         search_query = CaselessLiteral("SEARCH") + field + (range_query | term_query | fuzzy_query | match_query | vertical_bounds | time_bounds | time_query | geo_query) + CaselessLiteral("FROM") + index_name + query_parameter*(0,None)
         # Add the field to the frame object
-        search_query.setParseAction(lambda x : self.frame.update({'field' : x[1]}))
+        search_query.setParseAction(lambda x : parser().frame.update({'field' : x[1]}))
         collection_query = CaselessLiteral("IN") + collection_id
-        collection_query.setParseAction(lambda x : self.frame.update({'collection': x[1]}))
+        collection_query.setParseAction(lambda x : parser().frame.update({'collection': x[1]}))
         association_query = CaselessLiteral("BELONGS") + CaselessLiteral("TO") + resource_id + Optional(depth_parameter)
         # Add the association to the frame object
-        association_query.setParseAction(lambda x : self.frame.update({'association':x[2]}))
+        association_query.setParseAction(lambda x : parser().frame.update({'association':x[2]}))
         owner_query = CaselessLiteral("HAS") + resource_id + Optional(depth_parameter)
-        owner_query.setParseAction(lambda x : self.frame.update({'owner':x[1]}))
+        owner_query.setParseAction(lambda x : parser().frame.update({'owner':x[1]}))
         query = search_query | association_query | collection_query | owner_query
 
         #--------------------------------------------------------------------------------------
@@ -231,16 +253,16 @@ class QueryLanguage(object):
         #--------------------------------------------------------------------------------------
         primary_query = query + Optional(query_filter)
         # Set the primary query on the json_query to the frame and clear the frame
-        primary_query.setParseAction(lambda x : self.push_frame())
+        primary_query.setParseAction(lambda x : parser().push_frame())
         atom = query
         intersection = CaselessLiteral("AND") + atom
         # Add an AND operation to the json_query and clear the frame
-        intersection.setParseAction(lambda x : self.and_frame())
+        intersection.setParseAction(lambda x : parser().and_frame())
         union = CaselessLiteral("OR") + atom
         # Add an OR operation to the json_query and clear the frame
-        union.setParseAction(lambda x : self.or_frame())
+        union.setParseAction(lambda x : parser().or_frame())
 
-        self.sentence = primary_query + (intersection ^ union)*(0,None)
+        return primary_query + (intersection ^ union)*(0,None)
 
     def push_frame(self):
         self.json_query['query'] = self.frame
@@ -303,15 +325,30 @@ class QueryLanguage(object):
 
     def parse(self, s):
         '''
-        Parses string s and returns a json_query object, self.tokens is set to the tokens
+        Parses string s and returns a json_query object, self.tokens is set to the tokens.
+        Results are memoized (LRU) by query string.
         '''
-        self.json_query = {'query':{}, 'and': [], 'or': []}
-        self.frame = {}
+        cache = QueryLanguage._parse_cache
         try:
-            self.tokens = self.sentence.parseString(s)
-        except ParseException as e:
-            raise BadRequest('%s' % e)
-
+            json_query, self.tokens = cache.pop(s)
+        except KeyError:
+            self.json_query = {'query':{}, 'and': [], 'or': []}
+            self.frame = {}
+            # parseString does not yield, so the shared grammar is used by one parser at a time
+            QueryLanguage._parsing = self
+            try:
+                self.tokens = self.sentence.parseString(s)
+            except ParseException as e:
+                raise BadRequest('%s' % e)
+            finally:
+                QueryLanguage._parsing = None
+            json_query = self.json_query
+            if len(cache) >= self.PARSE_CACHE_LIMIT:
+                cache.popitem(0)
+        cache[s] = json_query, self.tokens
+
+        # Callers own the returned query and may modify it
+        self.json_query = copy.deepcopy(json_query)
         return self.json_query
 
     #=========================================
@@ -461,23 +498,53 @@ class QueryLanguage(object):
             raise BadRequest("Missing parameters value and range for query: %s" % query)
 
     @classmethod
-    def evaluate_condition(cls, event = None, query_dict = {} ):
+    def compile_match(cls, query):
+        '''
+        Returns a function of an event equivalent to match(event, query). Term and range queries are compiled to
+        closures over their field and values, other queries are evaluated by match.
+        '''
+        if 'field' in query:
+            field = query['field']
+            if cls.query_is_term_search(query):
+                value = query['value']
+                return lambda event : str(getattr(event, field)) == value or None
+            if cls.query_is_range_search(query) and 'from' in query['range'] and 'to' in query['range']:
+                low, high = query['range']['from'], query['range']['to']
+                return lambda event : low <= getattr(event, field) <= high
+        return functools.partial(cls.match, query=query)
+
+    @classmethod
+    def compile_condition(cls, query_dict):
+        '''
+        Returns a function of an event equivalent to evaluate_condition(event, query_dict).
+        Compiled conditions are memoized (LRU) by query.
+        '''
+        key = repr(query_dict)
+        cache = QueryLanguage._condition_cache
+        try:
+            condition = cache.pop(key)
+        except KeyError:
+            query = cls.compile_match(query_dict['query'])
+            or_queries = [cls.compile_match(or_query) for or_query in query_dict['or'] or []]
+            and_queries = [cls.compile_match(and_query) for and_query in query_dict['and'] or []]
+
+            def condition(event):
+                # if any of the queries in the list of 'or queries' gives a match, publish an event
+                for or_query in or_queries:
+                    if or_query(event):
+                        return True
+                # return if the match returns false for any one of the 'and queries'
+                for and_query in and_queries:
+                    if not and_query(event):
+                        return False
+                return query(event)
+
+            if len(cache) >= cls.PARSE_CACHE_LIMIT:
+                cache.popitem(0)
+        cache[key] = condition
+        return condition
 
-        query = query_dict['query']
-        or_queries= query_dict['or']
-        and_queries = query_dict['and']
-
-        # if any of the queries in the list of 'or queries' gives a match, publish an event
-        if or_queries:
-            for or_query in or_queries:
-                if cls.match(event, or_query):
-                    return True
-
-        # if an 'and query' or a list of 'and queries' is provided, return if the match returns false for
-        # any one of them
-        if and_queries:
-            for and_query in and_queries:
-                if not cls.match(event, and_query):
-                    return False
-        return cls.match(event, query)
+    @classmethod
+    def evaluate_condition(cls, event = None, query_dict = {} ):
+        return cls.compile_condition(query_dict)(event)
 
@@ -8,9 +8,11 @@
 
 from pyon.ion.stream import StandaloneStreamPublisher, StandaloneStreamSubscriber
 from pyon.util.int_test import IonIntegrationTestCase
+from pyon.util.unit_test import PyonTestCase
 
 from ion.services.dm.inventory.dataset_management_service import DatasetManagementService
 from ion.services.dm.utility.granule import RecordDictionaryTool
+from ion.services.dm.utility.granule_utils import CoverageCraft
 from ion.services.dm.utility.test.parameter_helper import ParameterHelper
 
 from interface.services.dm.ipubsub_management_service import PubsubManagementServiceClient
@@ -23,6 +25,7 @@ from coverage_model import ParameterContext, QuantityType, AxisTypeEnum, Constan
 from ion.util.stored_values import StoredValueManager
 
 import numpy as np
+import time
 
 @attr('INT',group='dm')
 class RecordDictionaryIntegrationTest(IonIntegrationTestCase):
@@ -374,7 +377,85 @@ class RecordDictionaryIntegrationTest(IonIntegrationTestCase):
         contexts['DENSITY'] = dens_ctxt, dens_ctxt_id
         return contexts, funcs
 
-    
 
+@attr('UNIT',group='dm')
+class RecordDictionaryConcatenateTest(PyonTestCase):
+    def setUp(self):
+        self.pdict = CoverageCraft.create_parameters()
+        self.pdict.get_context('temp').fill_value = -9999.
+        self.pdict.add_context(ParameterContext('const', param_type=ConstantType(QuantityType(value_encoding=np.dtype('float32'))), fill_value=-9999))
+
+    def make_rdt(self, times, temp=None, const=None):
+        rdt = RecordDictionaryTool(param_dictionary=self.pdict)
+        if times is None:
+            return rdt
+        rdt['time'] = np.array(times)
+        if temp is not None:
+            rdt['temp'] = np.array(temp, dtype=np.float32)
+        if const is not None:
+            rdt['const'] = const
+        return rdt
 
-        
+    def test_concatenate(self):
+        first = self.make_rdt([0, 1], temp=[10, 11], const=2)
+        first.connection_id = 'c1'
+        first.connection_index = '4'
+        rdts = [first,
+                self.make_rdt(None),
+                self.make_rdt([2], const=3),
+                self.make_rdt([3], temp=[13])]
+
+        rdt = RecordDictionaryTool.concatenate(rdts)
+        self.assertEquals(len(rdt), 4)
+        np.testing.assert_array_equal(rdt['time'], [0, 1, 2, 3])
+        # Missing values are padded with the fill value
+        np.testing.assert_array_equal(rdt['temp'], [10, 11, -9999, 13])
+        # Constants take the last value
+        self.assertEquals(rdt._rd['const'].content, 3)
+        self.assertIsNone(rdt['conductivity'])
+        self.assertEquals((rdt.connection_id, rdt.connection_index), ('c1', '4'))
+
+    def test_concatenate_empty_members(self):
+        self.assertIsNone(RecordDictionaryTool.concatenate([]))
+        self.assertIsNone(RecordDictionaryTool.concatenate([self.make_rdt(None), self.make_rdt(None)]))
+
+        only = self.make_rdt([5], temp=[15])
+        self.assertIs(RecordDictionaryTool.concatenate([self.make_rdt(None), only]), only)
+
+
+@attr('BENCHMARK',group='dm')
+class RecordDictionaryDecodeBenchmark(PyonTestCase):
+    granules = 2000
+
+    def setUp(self):
+        self.addCleanup(setattr, RecordDictionaryTool, 'PDICT_CACHE_LIMIT', RecordDictionaryTool.PDICT_CACHE_LIMIT)
+        RecordDictionaryTool._pdict_cache.clear()
+
+    def make_granule(self):
+        rdt = RecordDictionaryTool(param_dictionary=CoverageCraft.create_parameters())
+        rdt['time'] = np.arange(10)
+        rdt['temp'] = np.arange(10, dtype=np.float32)
+        rdt['conductivity'] = np.arange(10, dtype=np.float32) * 2
+        rdt['pressure'] = np.arange(10, dtype=np.float32) * 3
+        return rdt, rdt.to_granule()
+
+    def decode(self, granule):
+        start = time.time()
+        for i in xrange(self.granules):
+            rdt = RecordDictionaryTool.load_from_granule(granule)
+        return self.granules / (time.time() - start), rdt
+
+    def test_decode_throughput(self):
+        expected, granule = self.make_granule()
+
+        RecordDictionaryTool.PDICT_CACHE_LIMIT = 0
+        uncached, rdt = self.decode(granule)
+        self.assertEquals(rdt, expected)
+
+        RecordDictionaryTool.PDICT_CACHE_LIMIT = 100
+        cached, rdt = self.decode(granule)
+        self.assertEquals(rdt, expected)
+        self.assertEquals(len(RecordDictionaryTool._pdict_cache), 1)
+
+        print 'load_from_granule uncached: %10.1f granules/sec' % uncached
+        print 'load_from_granule cached:   %10.1f granules/sec (%.1fx)' % (cached, cached / uncached)
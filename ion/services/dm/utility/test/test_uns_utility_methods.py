@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+'''
+@file ion/services/dm/utility/test/test_uns_utility_methods.py
+@description Tests and benchmarks for the notification event matching and email delivery
+'''
+
+from pyon.util.unit_test import PyonTestCase
+from pyon.util.containers import get_ion_ts
+from ion.services.dm.utility.uns_utility_methods import EmailDeliveryEngine, fake_smtplib, send_email
+from ion.services.dm.utility.uns_utility_methods import NotificationIndex, calculate_reverse_user_info, check_user_notification_interest
+from interface.objects import ResourceLifecycleEvent, DeviceStatusEvent, DeviceCommsEvent, ResourceAgentStateEvent
+from interface.objects import NotificationRequest, TemporalBounds
+from nose.plugins.attrib import attr
+
+import multiprocessing
+import random
+import smtplib
+import time
+
+
+def run_smtp_sink(ports, stats):
+    '''
+    Local SMTP server discarding all mail, counts connections and messages in stats. Runs in a child process.
+    '''
+    import asyncore
+    import smtpd
+
+    class SinkServer(smtpd.SMTPServer):
+        def handle_accept(self):
+            stats[0] += 1
+            smtpd.SMTPServer.handle_accept(self)
+
+        def process_message(self, peer, mailfrom, rcpttos, data):
+            stats[1] += 1
+
+    server = SinkServer(('127.0.0.1', 0), None)
+    ports.put(server.socket.getsockname()[1])
+    asyncore.loop()
+
+
+@attr('UNIT', group='dm')
+class EmailDeliveryEngineTest(PyonTestCase):
+    def setUp(self):
+        self.smtp_clients = []
+
+    def smtp_client_factory(self):
+        smtp_client = fake_smtplib.SMTP('localhost')
+        self.smtp_clients.append(smtp_client)
+        return smtp_client
+
+    def sent_mail(self):
+        sent = []
+        for smtp_client in self.smtp_clients:
+            while not smtp_client.sent_mail.empty():
+                sent.append(smtp_client.sent_mail.get())
+        return sent
+
+    def test_digest_window(self):
+        engine = EmailDeliveryEngine(pool_size=2, digest_window=0.1, smtp_client_factory=self.smtp_client_factory)
+        engine.start()
+        for origin in ('instrument_1', 'instrument_2', 'instrument_3'):
+            engine.deliver(ResourceLifecycleEvent(origin=origin, ts_created=get_ion_ts()), 'user_1@gmail.com')
+        engine.deliver(ResourceLifecycleEvent(origin='instrument_1', ts_created=get_ion_ts()), 'user_2@gmail.com')
+        engine.stop()
+
+        sent = dict((msg_recipient, msg) for msg_sender, msg_recipient, msg in self.sent_mail())
+        self.assertEquals(sorted(sent.keys()), ['user_1@gmail.com', 'user_2@gmail.com'])
+        self.assertIn('Event 3: ResourceLifecycleEvent', sent['user_1@gmail.com'])
+        for origin in ('instrument_1', 'instrument_2', 'instrument_3'):
+            self.assertIn(origin, sent['user_1@gmail.com'])
+        self.assertIn('Originator: instrument_1', sent['user_2@gmail.com'])
+        self.assertNotIn('Event 1:', sent['user_2@gmail.com'])
+
+        self.assertEquals(engine.emails_sent, 2)
+        self.assertEquals(engine.events_sent, 4)
+        self.assertTrue(engine.connections_opened <= 2)
+
+    def test_persistent_connections(self):
+        engine = EmailDeliveryEngine(pool_size=2, smtp_client_factory=self.smtp_client_factory)
+        engine.start()
+        for i in xrange(20):
+            engine.deliver(ResourceLifecycleEvent(origin='instrument_1', ts_created=get_ion_ts()), 'user_%d@gmail.com' % i)
+        engine.stop()
+
+        self.assertEquals(len(self.sent_mail()), 20)
+        self.assertEquals(engine.emails_sent, 20)
+        self.assertTrue(engine.connections_opened <= 2)
+
+
+@attr('UNIT', group='dm')
+class NotificationIndexTest(PyonTestCase):
+    def user(self, *notifications, **kwargs):
+        return dict(notifications=list(notifications), notifications_daily_digest=kwargs.get('digest', False), notifications_disabled=False)
+
+    def test_match(self):
+        user_info = {
+            'user_1' : self.user(NotificationRequest(event_type='ResourceLifecycleEvent', origin='instrument_1')),
+            'user_2' : self.user(NotificationRequest(origin='instrument_1'), NotificationRequest(event_type='DeviceStatusEvent', origin_type='PlatformDevice')),
+            'user_3' : self.user(NotificationRequest(event_type='ResourceLifecycleEvent', origin='instrument_1'), digest=True),
+            'user_4' : self.user(NotificationRequest(origin='instrument_1', temporal_bounds=TemporalBounds(end_datetime='1'))),
+        }
+        index = NotificationIndex(user_info)
+
+        self.assertEquals(index.match(ResourceLifecycleEvent(origin='instrument_1')), set(['user_1', 'user_2']))
+        self.assertEquals(index.match(ResourceLifecycleEvent(origin='instrument_2')), set())
+        self.assertEquals(index.match(DeviceStatusEvent(origin='platform_1', origin_type='PlatformDevice')), set(['user_2']))
+        self.assertEquals(index.match(DeviceStatusEvent(origin='platform_1')), set())
+
+    def test_incremental_updates(self):
+        notification_1 = NotificationRequest(event_type='ResourceLifecycleEvent', origin='instrument_1')
+        notification_2 = NotificationRequest(origin='instrument_1')
+        user_info = {'user_1' : self.user(notification_1), 'user_2' : self.user(notification_2)}
+        index = NotificationIndex(user_info)
+        event = ResourceLifecycleEvent(origin='instrument_1')
+        self.assertEquals(index.match(event), set(['user_1', 'user_2']))
+
+        index.remove_notification('user_2', notification_2)
+        self.assertEquals(index.match(event), set(['user_1']))
+        index.add_notification('user_2', notification_1)
+        index.add_notification('user_2', notification_1)
+        index.remove_notification('user_2', notification_1)
+        self.assertEquals(index.match(event), set(['user_1', 'user_2']))
+
+        # user_2 unsubscribes and user_1 changes the subscription
+        user_info = {'user_1' : self.user(NotificationRequest(event_type='ResourceLifecycleEvent', origin='instrument_2')), 'user_2' : self.user()}
+        index.update_user_info(user_info)
+        self.assertEquals(index.match(event), set())
+        self.assertEquals(index.match(ResourceLifecycleEvent(origin='instrument_2')), set(['user_1']))
+        self.assertEquals(index.keys_by_user.keys(), ['user_1'])
+
+        index.update_user_info({})
+        self.assertEquals(index.users_by_key, {})
+
+    def test_legacy_matching(self):
+        # check_user_notification_interest must not modify the reverse user info
+        user_info = {
+            'user_1' : self.user(NotificationRequest(event_type='ResourceLifecycleEvent', origin='instrument_1', origin_type='InstrumentDevice')),
+            'user_2' : self.user(NotificationRequest(event_type='ResourceLifecycleEvent', origin='instrument_1', origin_type='InstrumentDevice')),
+        }
+        reverse_user_info = calculate_reverse_user_info(user_info)
+        event = ResourceLifecycleEvent(origin='instrument_1', origin_type='InstrumentDevice')
+        for i in xrange(3):
+            self.assertEquals(set(check_user_notification_interest(event, reverse_user_info)), set(['user_1', 'user_2']))
+        self.assertEquals(sorted(reverse_user_info['event_type']['ResourceLifecycleEvent']), ['user_1', 'user_2'])
+
+
+@attr('BENCHMARK', group='dm')
+class NotificationIndexBenchmark(PyonTestCase):
+    users = 10000
+    notifications = 50000
+    origins = 2000
+    events = 10000
+    event_classes = (ResourceLifecycleEvent, DeviceStatusEvent, DeviceCommsEvent, ResourceAgentStateEvent)
+    origin_types = ('InstrumentDevice', 'PlatformDevice')
+
+    def make_user_info(self, rand):
+        user_info = dict(('user_%d' % i, dict(notifications=[], notifications_daily_digest=False, notifications_disabled=False)) for i in xrange(self.users))
+        for i in xrange(self.notifications):
+            notification = NotificationRequest(event_type=rand.choice(self.event_classes).__name__,
+                                               origin='instrument_%d' % rand.randrange(self.origins),
+                                               origin_type=rand.choice(self.origin_types))
+            user_info['user_%d' % rand.randrange(self.users)]['notifications'].append(notification)
+        return user_info
+
+    def make_events(self, rand):
+        return [rand.choice(self.event_classes)(origin='instrument_%d' % rand.randrange(self.origins), origin_type=rand.choice(self.origin_types))
+                for i in xrange(self.events)]
+
+    def test_matching(self):
+        rand = random.Random(0)
+        user_info = self.make_user_info(rand)
+        events = self.make_events(rand)
+
+        start = time.time()
+        reverse_user_info = calculate_reverse_user_info(user_info)
+        build = time.time() - start
+        start = time.time()
+        legacy_matches = sum(len(check_user_notification_interest(event, reverse_user_info)) for event in events)
+        elapsed = time.time() - start
+        print 'reverse user info  build %8.3f s  %10.1f events/sec  %d recipients' % (build, self.events / elapsed, legacy_matches)
+
+        start = time.time()
+        index = NotificationIndex(user_info)
+        build = time.time() - start
+        start = time.time()
+        matches = sum(len(index.match(event)) for event in events)
+        elapsed = time.time() - start
+        print 'notification index build %8.3f s  %10.1f events/sec  %d recipients' % (build, self.events / elapsed, matches)
+
+        # the reverse user info matches each field independently, so it can only find more recipients
+        self.assertTrue(matches <= legacy_matches)
+
+        start = time.time()
+        for i in xrange(1000):
+            user_id = 'user_%d' % rand.randrange(self.users)
+            notification = NotificationRequest(event_type='DeviceStatusEvent', origin='instrument_%d' % rand.randrange(self.origins))
+            index.add_notification(user_id, notification)
+            index.remove_notification(user_id, notification)
+        print 'notification index %10.1f incremental updates/sec' % (2000 / (time.time() - start))
+
+
+@attr('BENCHMARK', group='dm')
+class EmailDeliveryBenchmark(PyonTestCase):
+    events = 200
+    recipients = 10
+
+    def setUp(self):
+        ports = multiprocessing.Queue()
+        self.stats = multiprocessing.Array('i', 2)
+        process = multiprocessing.Process(target=run_smtp_sink, args=(ports, self.stats))
+        process.daemon = True
+        process.start()
+        self.addCleanup(process.terminate)
+        self.port = ports.get(timeout=10)
+
+    def smtp_client_factory(self):
+        return smtplib.SMTP('127.0.0.1', self.port)
+
+    def wait_for_sink(self, emails, timeout=60):
+        deadline = time.time() + timeout
+        while self.stats[1] < emails and time.time() < deadline:
+            time.sleep(0.01)
+
+    def report(self, name, start, emails, events):
+        self.wait_for_sink(emails)
+        elapsed = time.time() - start
+        handshakes, received = self.stats[0], self.stats[1]
+        self.assertEquals(received, emails)
+        print '%-24s %6d events %6d emails %10.1f events/sec %10.1f emails/sec %6d handshakes' % (name, events, emails, events / elapsed, emails / elapsed, handshakes)
+        self.stats[0] = self.stats[1] = 0
+
+    def event_storm(self):
+        for i in xrange(self.events):
+            event = ResourceLifecycleEvent(origin='instrument_%d' % i, ts_created=get_ion_ts())
+            for j in xrange(self.recipients):
+                yield event, 'user_%d@example.com' % j
+
+    def test_delivery(self):
+        start = time.time()
+        emails = 0
+        for event, msg_recipient in self.event_storm():
+            smtp_client = self.smtp_client_factory()
+            send_email(event, msg_recipient, smtp_client)
+            smtp_client.quit()
+            emails += 1
+        self.report('connection per email', start, emails, emails)
+
+        for name, pool_size, digest_window in (('pool of 2', 2, 0), ('pool of 4', 4, 0), ('pool of 4, 1s digests', 4, 1.0)):
+            engine = EmailDeliveryEngine(pool_size=pool_size, digest_window=digest_window, smtp_client_factory=self.smtp_client_factory)
+            engine.start()
+            start = time.time()
+            for event, msg_recipient in self.event_storm():
+                engine.deliver(event, msg_recipient)
+            engine.stop(timeout=60)
+            self.report(name, start, engine.emails_sent, engine.events_sent)
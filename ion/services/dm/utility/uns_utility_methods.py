@@ -12,10 +12,13 @@ from pyon.event.event import EventPublisher
 from interface.objects import NotificationRequest, Event, NotificationDeliveryModeEnum
 import smtplib
 import gevent
+import gevent.queue
+import itertools
 from gevent.timeout import Timeout
 import string
 from email.mime.text import MIMEText
 from gevent import Greenlet
+from collections import Counter
 import datetime
 
 class fake_smtplib(object):
@@ -88,6 +91,35 @@ def send_email(message, msg_recipient, smtp_client):
     @param msg_recipient        str
     @param smtp_client          fake or real smtp client object
 
+    '''
+    msg = format_email(message, msg_recipient)
+    smtp_sender = msg['From']
+
+    log.debug("UNS sending email from %s to %s for event type: %s", smtp_sender,msg_recipient, message.type_)
+    log.debug("UNS using the smtp client: %s", smtp_client)
+
+    try:
+        smtp_client.sendmail(smtp_sender, [msg_recipient], msg.as_string())
+    except: # Can be due to a broken connection... try to create a connection
+        smtp_client = setting_up_smtp_client()
+        log.debug("Connect again...message received after ehlo exchange: %s", str(smtp_client.ehlo()))
+        smtp_client.sendmail(smtp_sender, [msg_recipient], msg.as_string())
+
+def _get_smtp_sender():
+    #------------------------------------------------------------------------------------
+    # the 'from' email address for notification emails
+    #------------------------------------------------------------------------------------
+
+    ION_NOTIFICATION_EMAIL_ADDRESS = 'data_alerts@oceanobservatories.org'
+    return CFG.get_safe('server.smtp.sender', ION_NOTIFICATION_EMAIL_ADDRESS)
+
+def format_email(message, msg_recipient):
+    '''
+    Builds the notification email for a single event
+
+    @param message              Event
+    @param msg_recipient        str
+    @retval msg                 MIMEText
     '''
 
     log.debug("Got type of event to notify on: %s", message.type_)
@@ -124,26 +156,152 @@ def send_email(message, msg_recipient, smtp_client):
 
     log.debug("msg_body::: %s", msg_body)
 
-    #------------------------------------------------------------------------------------
-    # the 'from' email address for notification emails
-    #------------------------------------------------------------------------------------
+    msg = MIMEText(msg_body)
+    msg['Subject'] = msg_subject
+    msg['From'] = _get_smtp_sender()
+    msg['To'] = msg_recipient
+    return msg
 
-    ION_NOTIFICATION_EMAIL_ADDRESS = 'data_alerts@oceanobservatories.org'
-    smtp_sender = CFG.get_safe('server.smtp.sender', ION_NOTIFICATION_EMAIL_ADDRESS)
+def format_digest_email(messages, msg_recipient):
+    '''
+    Builds one email notifying the recipient about several events
+
+    @param messages             list of Event
+    @param msg_recipient        str
+    @retval msg                 MIMEText
+    '''
+    msg_body = ''
+    for count, message in enumerate(messages, 1):
+        msg_body += string.join(("\r\n",
+                                 "Event %s: %s," % (count, message.type_),
+                                 "",
+                                 "Originator: %s," % message.origin,
+                                 "",
+                                 "Description: %s," % (message.description or "Not provided for this event"),
+                                 "",
+                                 "ts_created: %s," % _convert_to_human_readable(message.ts_created),
+                                 "",
+                                 "Event object as a dictionary: %s," % str(message),
+                                 "\r\n",
+                                 "------------------------"
+                                 "\r\n"))
+
+    msg_body += "You received this notification from ION because you asked to be " +\
+                "notified about these events from these sources. " +\
+                "To modify or remove notifications about these events, " +\
+                "please access My Notifications Settings in the ION Web UI. " +\
+                "Do not reply to this email.  This email address is not monitored " +\
+                "and the emails will not be read. \r\n "
+    msg_subject = "(SysName: " + get_sys_name() + ") ION events: %d notifications" % len(messages)
 
     msg = MIMEText(msg_body)
     msg['Subject'] = msg_subject
-    msg['From'] = smtp_sender
+    msg['From'] = _get_smtp_sender()
     msg['To'] = msg_recipient
-    log.debug("UNS sending email from %s to %s for event type: %s", smtp_sender,msg_recipient, message.type_)
-    log.debug("UNS using the smtp client: %s", smtp_client)
+    return msg
+
+
+class EmailDeliveryEngine(object):
+    '''
+    Delivers notification emails over a small pool of persistent SMTP connections.
+
+    Recipients with pending events wait in a bounded outbound queue; deliver() blocks while it is full. Events for a
+    recipient arriving within digest_window seconds, or while the recipient is still queued, are coalesced into a
+    single digest email.
+    '''
+
+    def __init__(self, pool_size=2, queue_size=1000, digest_window=0, smtp_client_factory=None):
+        self.pool_size = pool_size
+        self.digest_window = digest_window
+        self.smtp_client_factory = smtp_client_factory or setting_up_smtp_client
+        self.outbound = gevent.queue.Queue(maxsize=queue_size)
+        self.pending = {}   # msg_recipient -> [events]
+        self.timers = {}    # msg_recipient -> digest window greenlet
+        self.smtp_clients = [None] * pool_size
+        self.senders = []
+
+        # statistics
+        self.connections_opened = 0
+        self.emails_sent = 0
+        self.events_sent = 0
+
+    def start(self):
+        self.senders = [gevent.spawn(self._send_loop, index) for index in xrange(self.pool_size)]
+
+    def stop(self, timeout=10):
+        '''
+        Sends everything still pending, then closes the SMTP connections
+        '''
+        for timer in self.timers.values():
+            timer.kill()
+        for msg_recipient in self.timers.keys():
+            self._enqueue(msg_recipient)
+        for sender in self.senders:
+            self.outbound.put(None)
+        gevent.joinall(self.senders, timeout=timeout)
+        self.senders = []
+
+    def deliver(self, message, msg_recipient):
+        if msg_recipient in self.pending:
+            self.pending[msg_recipient].append(message)
+            return
+
+        self.pending[msg_recipient] = [message]
+        if self.digest_window > 0:
+            self.timers[msg_recipient] = gevent.spawn_later(self.digest_window, self._enqueue, msg_recipient)
+        else:
+            self._enqueue(msg_recipient)
+
+    def _enqueue(self, msg_recipient):
+        self.timers.pop(msg_recipient, None)
+        self.outbound.put(msg_recipient)
+
+    def _send_loop(self, index):
+        try:
+            while True:
+                msg_recipient = self.outbound.get()
+                if msg_recipient is None:
+                    break
+                messages = self.pending.pop(msg_recipient, None)
+                if not messages:
+                    continue
+
+                if len(messages) == 1:
+                    msg = format_email(messages[0], msg_recipient)
+                else:
+                    msg = format_digest_email(messages, msg_recipient)
+
+                try:
+                    self._sendmail(index, msg_recipient, msg)
+                    self.emails_sent += 1
+                    self.events_sent += len(messages)
+                except Exception:
+                    log.exception("EmailDeliveryEngine failed to send %d notifications to %s", len(messages), msg_recipient)
+        finally:
+            self._close(index)
+
+    def _sendmail(self, index, msg_recipient, msg):
+        for attempt in xrange(2):
+            if self.smtp_clients[index] is None:
+                self.smtp_clients[index] = self.smtp_client_factory()
+                self.connections_opened += 1
+            try:
+                self.smtp_clients[index].sendmail(msg['From'], [msg_recipient], msg.as_string())
+                return
+            except Exception:
+                # Can be due to a broken or idle-timed-out connection... reconnect once
+                self._close(index)
+                if attempt:
+                    raise
+
+    def _close(self, index):
+        smtp_client, self.smtp_clients[index] = self.smtp_clients[index], None
+        if smtp_client is not None:
+            try:
+                smtp_client.quit()
+            except Exception:
+                log.debug("EmailDeliveryEngine: error closing smtp connection", exc_info=True)
 
-    try:
-        smtp_client.sendmail(smtp_sender, [msg_recipient], msg.as_string())
-    except: # Can be due to a broken connection... try to create a connection
-        smtp_client = setting_up_smtp_client()
-        log.debug("Connect again...message received after ehlo exchange: %s", str(smtp_client.ehlo()))
-        smtp_client.sendmail(smtp_sender, [msg_recipient], msg.as_string())
 
 
 def check_user_notification_interest(event, reverse_user_info):
@@ -182,12 +340,13 @@ def check_user_notification_interest(event, reverse_user_info):
     If this matches too, check for origin_type if that attribute of the event object is not empty.
     """
 
+    def interested_users(index, value):
+        # users subscribed to the given value or to any value, without touching the lists in reverse_user_info
+        return set(reverse_user_info[index].get(value, [])).union(reverse_user_info[index].get('', []))
+
     if event.type_: # for an incoming event with origin type specified
         if reverse_user_info['event_type'].has_key(event.type_):
-            user_list_1 = reverse_user_info['event_type'][event.type_]
-            if reverse_user_info['event_type'].has_key(''): # for users who subscribe to any event types
-                user_list_1.extend(reverse_user_info['event_type'][''])
-            users = set(user_list_1)
+            users = interested_users('event_type', event.type_)
 #            log.debug("For event_type = %s, UNS got interested users here  %s", event.type_, users)
         else:
 #            log.debug("After checking event_type = %s, UNS got no interested users here", event.type_)
@@ -195,10 +354,7 @@ def check_user_notification_interest(event, reverse_user_info):
 
     if event.origin is not None: # for an incoming event that has origin specified (this should be true for almost all events)
         if reverse_user_info['event_origin'].has_key(event.origin):
-            user_list_2 = set(reverse_user_info['event_origin'][event.origin])
-            if reverse_user_info['event_origin'].has_key(''): # for users who subscribe to any event origins
-                user_list_2.extend(reverse_user_info['event_origin'][''])
-            users = set.intersection(users, user_list_2)
+            users &= interested_users('event_origin', event.origin)
 #            log.debug("For event origin = %s too, UNS got interested users here  %s", event.origin, users)
         else:
 #            log.debug("After checking  event origin = %s, UNS got no interested users here", event.origin)
@@ -206,10 +362,7 @@ def check_user_notification_interest(event, reverse_user_info):
 
     if event.sub_type is not None: # for an incoming event with the sub type specified
         if reverse_user_info['event_subtype'].has_key(event.sub_type):
-            user_list_3 = reverse_user_info['event_subtype'][event.sub_type]
-            if reverse_user_info['event_subtype'].has_key(''): # for users who subscribe to any event subtypes
-                user_list_3.extend(reverse_user_info['event_subtype'][''])
-            users = set.intersection(users, user_list_3)
+            users &= interested_users('event_subtype', event.sub_type)
 #            log.debug("For event_subtype = %s too, UNS got interested users here  %s", event.sub_type, users)
 #        else:
 #            log.debug("After checking event_subtype = %s, UNS got no interested users here", event.sub_type)
@@ -217,10 +370,7 @@ def check_user_notification_interest(event, reverse_user_info):
 
     if event.origin_type is not None: # for an incoming event with origin type specified
         if reverse_user_info['event_origin_type'].has_key(event.origin_type):
-            user_list_4 = reverse_user_info['event_origin_type'][event.origin_type]
-            if reverse_user_info['event_origin_type'].has_key(''): # for users who subscribe to any event origin types
-                user_list_4.extend(reverse_user_info['event_origin_type'][''])
-            users = set.intersection(users, user_list_4)
+            users &= interested_users('event_origin_type', event.origin_type)
 #            log.debug("For event_origin_type = %s too, UNS got interested users here  %s", event.origin_type, users)
         else:
 #            log.debug("After checking event_origin_type = %s, UNS got no interested users here", event.origin_type)
@@ -321,3 +471,111 @@ def calculate_reverse_user_info(user_info=None):
 
     return reverse_user_info
 
+
+class NotificationIndex(object):
+    '''
+    Reverse index of the realtime notification requests of all users, used by the notification workers to find the
+    users interested in an event.
+
+    Each notification request is keyed by (event_type, origin, origin_type, event_subtype), where an empty field
+    matches any value. Every key maps to a frozenset of user ids, so matching an event takes at most 16 dictionary
+    lookups no matter how many users or notification requests there are.
+    '''
+
+    def __init__(self, user_info=None):
+        self.users_by_key = {}  # key -> frozenset of user ids
+        self.keys_by_user = {}  # user id -> Counter of keys of the user's notification requests
+        if user_info:
+            self.update_user_info(user_info)
+
+    @staticmethod
+    def notification_key(notification):
+        return (notification.event_type or '', notification.origin or '',
+                notification.origin_type or '', notification.event_subtype or '')
+
+    @staticmethod
+    def realtime_notifications(value):
+        '''
+        The notification requests of a user_info entry that are delivered in real time
+        '''
+        # Ignore users who do NOT want REALTIME notifications or who have disabled the delivery switch
+        if value.get('notifications_disabled', False) or value.get('notifications_daily_digest', False):
+            return []
+        return [notification for notification in value['notifications'] or []
+                if isinstance(notification, NotificationRequest) and not notification.temporal_bounds.end_datetime]
+
+    def add_notification(self, user_id, notification):
+        key = self.notification_key(notification)
+        keys = self.keys_by_user.setdefault(user_id, Counter())
+        keys[key] += 1
+        if keys[key] == 1:
+            self.users_by_key[key] = self.users_by_key.get(key, frozenset()).union([user_id])
+
+    def remove_notification(self, user_id, notification):
+        key = self.notification_key(notification)
+        keys = self.keys_by_user.get(user_id)
+        if not keys or not keys[key]:
+            return
+        keys[key] -= 1
+        if keys[key]:
+            return
+        del keys[key]
+        if not keys:
+            del self.keys_by_user[user_id]
+        user_ids = self.users_by_key[key].difference([user_id])
+        if user_ids:
+            self.users_by_key[key] = user_ids
+        else:
+            del self.users_by_key[key]
+
+    def update_user_info(self, user_info):
+        '''
+        Brings the index in line with the given user info dictionary, touching only the users whose realtime
+        notification requests changed.
+        '''
+        user_info = user_info or {}
+        added = {}
+        removed = {}
+
+        for user_id in self.keys_by_user.keys():
+            if user_id not in user_info:
+                for key in self.keys_by_user.pop(user_id):
+                    removed.setdefault(key, set()).add(user_id)
+
+        for user_id, value in user_info.iteritems():
+            keys = Counter(self.notification_key(notification) for notification in self.realtime_notifications(value))
+            old_keys = self.keys_by_user.get(user_id, Counter())
+            if keys == old_keys:
+                continue
+            for key in set(keys).difference(old_keys):
+                added.setdefault(key, set()).add(user_id)
+            for key in set(old_keys).difference(keys):
+                removed.setdefault(key, set()).add(user_id)
+            if keys:
+                self.keys_by_user[user_id] = keys
+            else:
+                del self.keys_by_user[user_id]
+
+        # one new frozenset per changed key, rather than one per changed user
+        for key in set(added).union(removed):
+            user_ids = self.users_by_key.get(key, frozenset()).union(added.get(key, ())).difference(removed.get(key, ()))
+            if user_ids:
+                self.users_by_key[key] = user_ids
+            else:
+                self.users_by_key.pop(key, None)
+
+    def match(self, event):
+        '''
+        Returns the set of ids of the users interested in the event
+
+        @param event    Event
+        @retval user_ids frozenset
+        '''
+        values = [(value, '') if value else ('',) for value in
+                  (event.type_, event.origin, event.origin_type, event.sub_type)]
+        user_ids = frozenset()
+        for key in itertools.product(*values):
+            users = self.users_by_key.get(key)
+            if users:
+                user_ids = user_ids.union(users)
+        return user_ids
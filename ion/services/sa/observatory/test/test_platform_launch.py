@@ -28,6 +28,7 @@ __license__ = 'Apache 2.0'
 # bin/nosetests -sv ion/services/sa/observatory/test/test_platform_launch.py:TestPlatformLaunch.test_13_platforms_and_2_instruments
 # bin/nosetests -sv ion/services/sa/observatory/test/test_platform_launch.py:TestPlatformLaunch.test_13_platforms_and_8_instruments
 # bin/nosetests -sv ion/services/sa/observatory/test/test_platform_launch.py:TestPlatformLaunch.test_platform_device_extended_attributes
+# bin/nosetests -sv ion/services/sa/observatory/test/test_platform_launch.py:PlatformLaunchFanOutBenchmark
 
 
 
@@ -38,7 +39,9 @@ from pyon.agent.agent import ResourceAgentState
 
 from unittest import skip
 from mock import patch
+from nose.plugins.attrib import attr
 from pyon.public import log, CFG
+import time
 
 
 @patch.dict(CFG, {'endpoint': {'receive': {'timeout': 180}}})
@@ -274,3 +277,45 @@ class TestPlatformLaunch(BaseIntTestPlatform):
         #if True: self.fail(all_vals)
 
         self._run_shutdown_commands()
+
+
+@attr('BENCHMARK', group='sa')
+@patch.dict(CFG, {'endpoint': {'receive': {'timeout': 420}}})
+class PlatformLaunchFanOutBenchmark(BaseIntTestPlatform):
+    """
+    Launch and shutdown times of the 13-platform Node1B hierarchy of the OMS
+    simulator network with children commanded sequentially vs. in parallel.
+    """
+
+    def _measure_hierarchy(self, children_parallelism):
+        with patch.dict(CFG, {'platform_agent': {'children_parallelism': children_parallelism}}):
+            p_objs = {}
+            p_root = self._create_hierarchy('Node1B', p_objs)
+            self.assertEquals(13, len(p_objs))
+
+            start_time = time.time()
+            self._start_platform(p_root)
+            self.addCleanup(self._stop_platform, p_root)
+            launch_time = time.time() - start_time
+
+            start_time = time.time()
+            self._ping_agent()
+            self._initialize()
+            self._go_active()
+            self._run()
+            startup_time = time.time() - start_time
+
+            start_time = time.time()
+            self._go_inactive()
+            self._reset()
+            self._shutdown()
+            shutdown_time = time.time() - start_time
+
+        print 'children_parallelism=%-3d launch %8.3f s  initialize/go_active/run %8.3f s  go_inactive/reset/shutdown %8.3f s' % (
+            children_parallelism, launch_time, startup_time, shutdown_time)
+
+    def test_sequential(self):
+        self._measure_hierarchy(1)
+
+    def test_parallel(self):
+        self._measure_hierarchy(8)
@@ -6,6 +6,7 @@
 """
 
 import re
+from collections import OrderedDict
 from ooi import logging
 from ooi.logging import log
 from pyon.util.containers import get_ion_ts, DotDict
@@ -57,23 +58,28 @@ class EnhancedResourceRegistryClient(object):
      find method name can include "_using_has_model" ("_using_", and the predicate type with underscores)
     """
 
+    # Lookup tables derived from RT, PRED and the association definitions, built once per process
+    _lookup_tables = None
+
+    # Compiled dynamic function name patterns, shared by all clients
+    _compiled_regexps = {}
+
     def __init__(self, rr_client):
         log.debug("EnhancedResourceRegistryClient init")
         self.RR = rr_client
 
-        log.debug("Generating lookup tables for %s resources and their labels", len(RT.values()))
-        self.resource_to_label = dict([(v, self._uncamel(v)) for v in RT.values() if type("") == type(v)])
-        self.label_to_resource = dict([(self._uncamel(v), v) for v in RT.values() if type("") == type(v)])
+        # generated dynamic functions and pass-through attributes, memoized in the instance dict
+        self._dynamic_fn_names = set()
 
-        log.debug("Generating lookup tables for %s predicates and their labels", len(PRED.values()))
-        self.predicate_to_label = dict([(v, self._uncamel(v)) for v in PRED.values() if type("") == type(v)])
-        self.label_to_predicate = dict([(self._uncamel(v), v) for v in PRED.values() if type("") == type(v)])
+        if None is EnhancedResourceRegistryClient._lookup_tables:
+            EnhancedResourceRegistryClient._lookup_tables = self._build_lookup_tables()
 
-        log.debug("Generating predicate lookup table")
-        self.predicates_for_subj_obj = {}
-
-        log.debug("Building predicate list")
-        self._build_predicate_list()
+        tables = EnhancedResourceRegistryClient._lookup_tables
+        self.resource_to_label       = tables.resource_to_label
+        self.label_to_resource       = tables.label_to_resource
+        self.predicate_to_label      = tables.predicate_to_label
+        self.label_to_predicate      = tables.label_to_predicate
+        self.predicates_for_subj_obj = tables.predicates_for_subj_obj
 
         # various tests
         #m = re.match(r"(assign_)(\w+)(_to_)(\w+)((_with_)?)((\w+)?)", "assign_x_x_to_y_y_with_bacon")
@@ -98,11 +104,38 @@ class EnhancedResourceRegistryClient(object):
         log.debug("done init")
 
 
+    def _build_lookup_tables(self):
+        """
+        build the label and predicate lookup tables, which only depend on RT, PRED and the association definitions
+        """
+        tables = DotDict()
+
+        log.debug("Generating lookup tables for %s resources and their labels", len(RT.values()))
+        tables.resource_to_label = dict([(v, self._uncamel(v)) for v in RT.values() if type("") == type(v)])
+        tables.label_to_resource = dict([(self._uncamel(v), v) for v in RT.values() if type("") == type(v)])
+
+        log.debug("Generating lookup tables for %s predicates and their labels", len(PRED.values()))
+        tables.predicate_to_label = dict([(v, self._uncamel(v)) for v in PRED.values() if type("") == type(v)])
+        tables.label_to_predicate = dict([(self._uncamel(v), v) for v in PRED.values() if type("") == type(v)])
+
+        log.debug("Generating predicate lookup table")
+        self.predicates_for_subj_obj = {}
+
+        log.debug("Building predicate list")
+        self._build_predicate_list()
+        tables.predicates_for_subj_obj = self.predicates_for_subj_obj
+
+        return tables
+
+
     def __getattr__(self, item):
         """
         anything we can't puzzle out gets passed along to the real RR client
         """
 
+        if item.startswith("__") or item == "_dynamic_fn_names":
+            raise AttributeError(item)
+
         dynamic_fns = [
             self._make_dynamic_assign_function,   # understand assign_x_x_to_y_y_with_some_predicate(o, s) functions
             self._make_dynamic_assign_single_object_function,   # understand assign_one_x_x_to_y_y_with_some_predicate(o, s) functions
@@ -125,7 +158,7 @@ class EnhancedResourceRegistryClient(object):
                 log.trace("dynamic function match fail")
             else:
                 log.trace("dynamic function match for %s", item)
-                return fn
+                return self._memoize_attribute(item, fn)
 
         log.trace("Getting %s attribute from self.RR", item)
         if not hasattr(self.RR, item):
@@ -134,9 +167,25 @@ class EnhancedResourceRegistryClient(object):
         ret = getattr(self.RR, item)
         log.trace("Got attribute from self.RR: %s", type(ret).__name__)
 
+        # not memoized, so a replaced RR or RR method is picked up
         return ret
 
 
+    def _memoize_attribute(self, item, value):
+        """
+        store a resolved dynamic attribute in the instance dict, so later lookups never reach __getattr__
+        """
+        self.__dict__[item] = value
+        self._dynamic_fn_names.add(item)
+        return value
+
+
+    def _forget_dynamic_attributes(self):
+        for item in self._dynamic_fn_names:
+            self.__dict__.pop(item, None)
+        self._dynamic_fn_names.clear()
+
+
     def create(self, resource_obj=None, specific_type=None):
         """
         create a single object of the predefined type
@@ -336,25 +385,15 @@ class EnhancedResourceRegistryClient(object):
                                            id_only=id_only)
             return ret
 
-        log.info("Using %s cached results for 'find (%s) subjects'", len(self._cached_predicates[predicate]), predicate)
-
-        def filter_fn(assoc):
-            if object != assoc.o:
-                return False
-
-            if "" != subject_type and subject_type != assoc.st:
-                return False
-
-            return True
+        log.info("Using %s cached results for 'find (%s) subjects'", self._cached_predicate_count(predicate), predicate)
 
         log.debug("Checking object_id=%s, subject_type=%s", object_id, subject_type)
-        preds = self._cached_predicates[predicate]
         time_search_start = get_ion_ts()
-        subject_ids = [a.s for a in self.filter_cached_associations(predicate, filter_fn)]
+        subject_ids = [a.s for a in self.find_cached_associations(predicate, object_id=object_id, subject_type=subject_type)]
         time_search_stop = get_ion_ts()
         total_time = int(time_search_stop) - int(time_search_start)
         log.debug("Processed %s %s predicates for %s subjects in %s seconds",
-                 len(preds),
+                 self._cached_predicate_count(predicate),
                  predicate,
                  len(subject_ids),
                  total_time / 1000.0)
@@ -377,25 +416,15 @@ class EnhancedResourceRegistryClient(object):
                                          id_only=id_only)
             return ret
 
-        log.info("Using %s cached results for 'find (%s) objects'", len(self._cached_predicates[predicate]), predicate)
-
-        def filter_fn(assoc):
-            if subject_id != assoc.s:
-                return False
-
-            if "" != object_type and object_type != assoc.ot:
-                return False
-
-            return True
+        log.info("Using %s cached results for 'find (%s) objects'", self._cached_predicate_count(predicate), predicate)
 
         log.debug("Checking subject_id=%s, object_type=%s", subject_id, object_type)
-        preds = self._cached_predicates[predicate]
         time_search_start = get_ion_ts()
-        object_ids = [a.o for a in self.filter_cached_associations(predicate, filter_fn)]
+        object_ids = [a.o for a in self.find_cached_associations(predicate, subject_id=subject_id, object_type=object_type)]
         time_search_stop = get_ion_ts()
         total_time = int(time_search_stop) - int(time_search_start)
         log.debug("Processed %s %s predicates for %s objects in %s seconds",
-                  len(preds),
+                  self._cached_predicate_count(predicate),
                   predicate,
                   len(object_ids),
                   total_time / 1000.0)
@@ -513,14 +542,111 @@ class EnhancedResourceRegistryClient(object):
         total_time = int(time_caching_stop) - int(time_caching_start)
 
         log.info("Cached %s %s predicates in %s seconds", len(preds), predicate, total_time / 1000.0)
-        self._cached_predicates[predicate] = preds
+
+        index = DotDict()
+        index.by_key     = OrderedDict()
+        index.by_subject = {}
+        index.by_object  = {}
+        index.by_types   = {}
+        self._cached_predicates[predicate] = index
+
+        for a in preds:
+            self._add_association_to_cache(index, a)
 
 
     def filter_cached_associations(self, predicate, is_match_fn):
         if not self.has_cached_predicate(predicate):
             raise BadRequest("Attempted to filter cached associations of uncached predicate '%s'" % predicate)
 
-        return [a for a in self._cached_predicates[predicate] if is_match_fn(a)]
+        return [a for a in self._cached_predicates[predicate].by_key.itervalues() if is_match_fn(a)]
+
+
+    def find_cached_associations(self, predicate, subject_id=None, object_id=None, subject_type='', object_type=''):
+        """
+        Look up cached associations of a predicate using the subject, object and type indexes
+        rather than scanning every cached association. A subject_id or object_id of None is unconstrained.
+        """
+        if not self.has_cached_predicate(predicate):
+            raise BadRequest("Attempted to find cached associations of uncached predicate '%s'" % predicate)
+
+        index = self._cached_predicates[predicate]
+        if None is not subject_id:
+            candidates = index.by_subject.get(subject_id, {}).itervalues()
+        elif None is not object_id:
+            candidates = index.by_object.get(object_id, {}).itervalues()
+        elif subject_type and object_type:
+            return index.by_types.get((subject_type, object_type), {}).values()
+        else:
+            candidates = index.by_key.itervalues()
+
+        return [a for a in candidates
+                if (None is object_id or object_id == a.o)
+                and (not subject_type or subject_type == a.st)
+                and (not object_type or object_type == a.ot)]
+
+
+    def cache_association(self, association):
+        """
+        Add (or replace) an association in the cache of its predicate, e.g. from an association event.
+        Associations of uncached predicates are ignored.
+        """
+        if not self.has_cached_predicate(association.p):
+            return
+        self._add_association_to_cache(self._cached_predicates[association.p], association)
+
+
+    def uncache_association(self, association):
+        """
+        Remove an association from the cache of its predicate, e.g. from an association deletion event
+        """
+        if not self.has_cached_predicate(association.p):
+            return
+        self._remove_association_from_cache(self._cached_predicates[association.p], self._association_key(association))
+
+
+    def uncache_resource_associations(self, resource_id):
+        """
+        Remove every cached association to or from a resource, e.g. from a ResourceModified deletion event
+        """
+        for index in self._cached_predicates.itervalues():
+            keys = index.by_subject.get(resource_id, {}).keys() + index.by_object.get(resource_id, {}).keys()
+            for key in keys:
+                self._remove_association_from_cache(index, key)
+
+
+    def _association_key(self, association):
+        assoc_id = getattr(association, "_id", None)
+        if isinstance(assoc_id, basestring) and assoc_id:
+            return assoc_id
+        return association.s, association.st, association.p, association.o, association.ot
+
+
+    def _add_association_to_cache(self, index, association):
+        key = self._association_key(association)
+        self._remove_association_from_cache(index, key)
+        index.by_key[key] = association
+        index.by_subject.setdefault(association.s, OrderedDict())[key] = association
+        index.by_object.setdefault(association.o, OrderedDict())[key] = association
+        index.by_types.setdefault((association.st, association.ot), OrderedDict())[key] = association
+
+
+    def _remove_association_from_cache(self, index, key):
+        association = index.by_key.pop(key, None)
+        if None is association:
+            return
+        for bucket, bucket_key in [(index.by_subject, association.s),
+                                   (index.by_object, association.o),
+                                   (index.by_types, (association.st, association.ot))]:
+            assocs = bucket.get(bucket_key)
+            if None is assocs:
+                continue
+            assocs.pop(key, None)
+            if not assocs:
+                del bucket[bucket_key]
+
+
+    def _cached_predicate_count(self, predicate):
+        return len(self._cached_predicates[predicate].by_key)
 
 
     def _add_resource_to_cache(self, resource_type, resource_obj):
@@ -691,7 +817,11 @@ class EnhancedResourceRegistryClient(object):
 
         log.trace("Attempting parse %s as %s", fn_name, genre)
 
-        m = re.match(regexp, fn_name)
+        compiled = self._compiled_regexps.get(regexp)
+        if None is compiled:
+            compiled = self._compiled_regexps[regexp] = re.compile(regexp)
+
+        m = compiled.match(fn_name)
         if None is m: return None
 
         for r in required_fields:
@@ -1296,4 +1426,6 @@ class EnhancedResourceRegistryClient(object):
         if enabled:
             log.warn("Console mode is a debugging assistant and should never be enabled on production systems!")
 
+        # console mode changes how dynamic function names parse
+        self._forget_dynamic_attributes()
         self.console_mode = enabled
\ No newline at end of file
@@ -48,11 +48,75 @@ def request_profile(enabled=False):
     return profile
 
 
+class CoverageData(object):
+    '''
+    Lazy view of one parameter of a coverage used as variable data in streaming DODS responses. Values are read from
+    the coverage and encoded chunk_size records at a time while the response is written, so memory use is bounded by
+    the chunk size rather than by the size of the request.
+    '''
+    def __init__(self, handler, coverage, name, slice_, chunk_size):
+        self.handler = handler
+        self.coverage = coverage
+        self.name = name
+        self.context = coverage.get_parameter_context(name)
+        self.chunk_size = max(int(chunk_size), 1)
+        self.start, self.stop, self.step = slice_.indices(coverage.num_timesteps)
+        self.shape = (len(xrange(self.start, self.stop, self.step)),)
+        # The DAP type is determined by encoding the first record
+        if self.shape[0]:
+            first = handler.get_data(coverage, name, slice(self.start, self.start + 1))
+            first, self.dap_type = handler.encode_data(self.context, first)
+            self.dtype = first.dtype
+        else:
+            self.dap_type = handler.dap_type(self.context)
+            self.dtype = np.dtype('O') if self.dap_type == 'S' else np.dtype(self.dap_type)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def read(self, slice_):
+        data = self.handler.get_data(self.coverage, self.name, slice_)
+        data, dtype = self.handler.encode_data(self.context, data)
+        return data
+
+    def chunks(self):
+        span = self.chunk_size * self.step
+        for start in xrange(self.start, self.stop, span):
+            yield self.read(slice(start, min(start + span, self.stop), self.step))
+
+    def __iter__(self):
+        if self.dap_type == 'S':
+            # strings are packed one by one
+            for chunk in self.chunks():
+                for value in chunk:
+                    yield value
+        else:
+            for chunk in self.chunks():
+                yield chunk
+
+    def __getitem__(self, slice_):
+        if isinstance(slice_, tuple):
+            slice_ = slice_[0]
+        if not isinstance(slice_, slice):
+            return self.read(slice(self.start + slice_ * self.step, self.start + slice_ * self.step + 1))[0]
+        start, stop, step = slice_.indices(self.shape[0])
+        view = slice(self.start + start * self.step, self.start + stop * self.step, self.step * step)
+        return CoverageData(self.handler, self.coverage, self.name, view, self.chunk_size)
+
+    def __array__(self, dtype=None):
+        return np.asanyarray(self.read(slice(self.start, self.stop, self.step)), dtype=dtype)
+
+
 class Handler(BaseHandler):
     CACHE_LIMIT = CFG.get_safe('server.pydap.cache_limit', 5)
     CACHE_EXPIRATION = CFG.get_safe('server.pydap.cache_expiration', 5)
     _coverages = collections.OrderedDict() # Cache has to be a class var because each handler is initialized per request
 
+    # Streaming DODS responses read and encode each variable chunk_size records at a time
+    STREAMING = CFG.get_safe('server.pydap.streaming', False)
+    CHUNK_SIZE = CFG.get_safe('server.pydap.chunk_size', 100000)
+    _time_axes = collections.OrderedDict() # (dataset_id, version) -> (time data, fill index)
+
     extensions = re.compile(r'^.*[0-9A-Za-z\-]{32}',re.IGNORECASE)
 
     def __init__(self, filepath):
@@ -109,6 +173,87 @@ class Handler(BaseHandler):
         cls._coverages[dataset_id] = result, ts
         return result
 
+    @classmethod
+    def get_time_axis(cls, coverage, dataset_id, version):
+        '''
+        Memoization (LRU) of the time values of a coverage and the index of the first fill value in them (-1 if none),
+        keyed on the dataset and its version so that appended data is picked up.
+        '''
+        key = (dataset_id, version)
+        try:
+            result = cls._time_axes.pop(key)
+        except KeyError:
+            for stale in [k for k in cls._time_axes if k[0] == dataset_id]:
+                del cls._time_axes[stale]
+            time_name = coverage.temporal_parameter_name
+            time_data = np.asanyarray(coverage.get_parameter_values(time_name))
+            if not time_data.shape:
+                time_data.shape = (1,)
+            fills = np.flatnonzero(time_data == coverage.get_parameter_context(time_name).fill_value)
+            fill_index = fills[0] if len(fills) else -1
+            result = time_data, fill_index
+            if len(cls._time_axes) >= cls.CACHE_LIMIT:
+                cls._time_axes.popitem(0)
+        cls._time_axes[key] = result
+        return result
+
+    def resolve_time_queries(self, time_data, fill_index, time_name, queries):
+        '''
+        Resolves DAP selections on the time variable (e.g. time>=1000) into (start, stop, mask), or None if no query
+        selects on time numerically. start and stop bound the indices of the selected records. On a sorted time axis
+        each selection is one searchsorted and mask is None; otherwise the whole axis is scanned and mask flags the
+        selected records.
+        '''
+        selections = []
+        for query in queries:
+            match = re.match(r'^%s(>=|<=|=|>|<)(.+)$' % re.escape(time_name), urllib.unquote(query))
+            if match:
+                op, value = match.groups()
+                try:
+                    selections.append((op, float(value.strip('"'))))
+                except ValueError:
+                    # not a numeric time (e.g. an ISO date or a =~ regex), left for pydap to evaluate
+                    continue
+        if not selections:
+            return None
+
+        valid = time_data[:fill_index] if fill_index >= 0 else time_data
+        if (valid[1:] >= valid[:-1]).all():
+            start, stop = 0, len(valid)
+            for op, value in selections:
+                if op in ('>=', '>', '='):
+                    start = max(start, np.searchsorted(valid, value, side='right' if op == '>' else 'left'))
+                if op in ('<=', '<', '='):
+                    stop = min(stop, np.searchsorted(valid, value, side='left' if op == '<' else 'right'))
+            return start, max(start, stop), None
+
+        mask = np.ones(len(valid), dtype=bool)
+        for op, value in selections:
+            if op == '=':
+                mask &= valid == value
+            elif op == '>=':
+                mask &= valid >= value
+            elif op == '>':
+                mask &= valid > value
+            elif op == '<=':
+                mask &= valid <= value
+            else:
+                mask &= valid < value
+        indices = np.flatnonzero(mask)
+        if not len(indices):
+            return 0, 0, mask
+        return indices[0], indices[-1] + 1, mask
+
+    def restrict_slice(self, slice_, time_range, size):
+        '''
+        Intersects a variable slice with a range of time indices
+        '''
+        start, stop, step = slice_.indices(size)
+        lo, hi = time_range
+        if lo > start:
+            start += -(-(lo - start) // step) * step
+        return slice(start, max(start, min(stop, hi)), step)
+
     def get_attrs(self, cov, name):
         pc = cov.get_parameter_context(name)
         attrs = {}
@@ -144,7 +289,26 @@ class Handler(BaseHandler):
         grid[dims[0]] = BaseType(name=dims[0], data=time_data, type=time_data.dtype.char, attributes=time_attrs, dimensions=dims, shape=time_data.shape)
         return grid    
 
+    def encode_data(self, pc, data):
+        '''
+        Converts values read from the coverage to data and a DAP type for the response
+        '''
+        if not isinstance(pc.param_type, ConstantRangeType):
+            return self.filter_data(data)
+        #convert to string
+        try:
+            #scalar case
+            if data.shape == (2,):
+                data = np.atleast_1d('_'.join([str(data[0]), str(data[1])]))
+            else:
+                data = np.asanyarray(['_'.join([str(d[0]), str(d[1])]) for d in data], dtype='O')
+        except Exception, e:
+            data = np.asanyarray(['None' for d in data])
+        return data, 'S'
+
     def filter_data(self, data):
+        if isinstance(data, CoverageData):
+            return data, data.dap_type
         if len(data.shape) > 1:
             return self.ndim_stringify(data), 'S'
         if data.dtype.char in numpy_integer_types + numpy_uinteger_types:
@@ -163,35 +327,42 @@ class Handler(BaseHandler):
 
 
     def ndim_stringify(self, data):
+        '''
+        Joins each record of a multi-dimensional array into a comma separated string. Numeric 2-d arrays are
+        converted to strings in one astype pass, object arrays are not as numpy truncates them to 64 characters.
+        '''
         retval = np.empty(data.shape[0], dtype='O')
         try:
-            if len(data.shape)>1:
-                for i in xrange(data.shape[0]):
-                    retval[i] = ','.join(map(lambda x : str(x), data[i].tolist()))
-                return retval
+            if data.ndim == 2 and data.dtype.char not in numpy_object:
+                rows = data.astype(str).tolist()
+            else:
+                rows = [map(str, row) for row in data.tolist()]
+            retval[:] = map(','.join, rows)
         except:
             retval = np.asanyarray(['None' for d in data])
         return retval
 
 
     def stringify(self, data):
-        retval = np.empty(data.shape, dtype='O')
         try:
-            for i,obj in enumerate(data):
-                retval[i] = str(obj)
+            retval = data.astype(str)
         except:
             retval = np.asanyarray(['None' for d in data])
         return retval
 
     def stringify_inplace(self, data):
         try:
-            for i,obj in enumerate(data):
-                data[i] = str(obj)
+            data[:] = map(str, data)
         except:
             data = np.asanyarray(['None' for d in data])
         return data
 
-    def get_dataset(self, cov, fields, fill_index, dataset, response):
+    def get_dataset(self, cov, fields, fill_index, dataset, response, time_axis=None, time_selection=None, streaming=False):
+        '''
+        Adds the requested variables to the dataset, restricted to the records of time_selection (see
+        resolve_time_queries) if given. With streaming the data of the variables is read from the coverage while the
+        response is written (see CoverageData), except for selections on an unsorted time axis.
+        '''
         for var in fields:
             while var:
                 name, slice_ = var.pop(0)
@@ -203,9 +374,25 @@ class Handler(BaseHandler):
                 pc = cov.get_parameter_context(name)
                 try:
                     param = cov.get_parameter(name)
-                    
-                    data = self.get_data(cov, name, slice_)
-                    time_data = self.get_time_data(cov, slice_)
+
+                    mask = None
+                    if time_selection is not None:
+                        start, stop, time_mask = time_selection
+                        slice_ = self.restrict_slice(slice_, (start, stop), cov.num_timesteps)
+                        if time_mask is not None:
+                            mask = time_mask[slice_]
+                    if time_axis is not None and param.is_coordinate and cov.temporal_parameter_name == name:
+                        data = time_axis[slice_]
+                    elif streaming and mask is None:
+                        data = CoverageData(self, cov, name, slice_, self.CHUNK_SIZE)
+                    else:
+                        data = self.get_data(cov, name, slice_)
+                    if time_axis is not None:
+                        time_data = time_axis[slice_]
+                    else:
+                        time_data = self.get_time_data(cov, slice_)
+                    if mask is not None:
+                        data, time_data = data[mask], time_data[mask]
 
                     time_attrs  = self.get_attrs(cov, name)
                     attrs  = self.get_attrs(cov, name)
@@ -217,19 +404,9 @@ class Handler(BaseHandler):
                         data, dtype = self.filter_data(data)
                         dataset[name] = self.make_grid(response, name, data, time_data, attrs, time_attrs, dims, dtype)
                     if isinstance(pc.param_type, ConstantRangeType):
-                        #start = time.time()
-                        #convert to string
-                        try:
-                            #scalar case
-                            if data.shape == (2,):
-                                data = np.atleast_1d('_'.join([str(data[0]), str(data[1])]))
-                            else:
-                                for i,d in enumerate(data):
-                                    f = [str(d[0]),str(d[1])]
-                                    data[i] = '_'.join(f)
-                        except Exception, e:
-                            data = np.asanyarray(['None' for d in data])
-                        dataset[name] = self.make_grid(response, name, data, time_data, attrs, time_attrs, dims, 'S')                
+                        if not isinstance(data, CoverageData):
+                            data, dtype = self.encode_data(pc, data)
+                        dataset[name] = self.make_grid(response, name, data, time_data, attrs, time_attrs, dims, 'S')
                     if isinstance(pc.param_type,BooleanType):
                         data, dtype = self.filter_data(data)
                         dataset[name] = self.make_grid(response, name, data, time_data, attrs, time_attrs, dims, dtype)
@@ -325,18 +502,15 @@ class Handler(BaseHandler):
         if not fields:
             fields = [[(name, ())] for name in all_vars]
         if response == "dods":
-            time_context = coverage.get_parameter_context(coverage.temporal_parameter_name)
-            time_fill_value = time_context.fill_value
-            time_data = coverage.get_parameter_values(coverage.temporal_parameter_name)
-            try:
-                fill_index = np.where(time_data == time_fill_value)[0][0]
-            except IndexError:
-                pass
+            version = (os.stat(self.filepath)[ST_MTIME], coverage.num_timesteps)
+            time_axis, fill_index = self.get_time_axis(coverage, base[1], version)
 
             # If no fields have been explicitly requested, of if the sequence
             # has been requested directly, return all variables.
-            
-            dataset = self.get_dataset(coverage, fields, fill_index, dataset, response)
+
+            time_selection = self.resolve_time_queries(time_axis, fill_index, coverage.temporal_parameter_name, queries)
+            dataset = self.get_dataset(coverage, fields, fill_index, dataset, response, time_axis=time_axis,
+                                       time_selection=time_selection, streaming=self.STREAMING)
 
         elif response in ('dds', 'das'):
             self.handle_dds(coverage, dataset, fields)
@@ -344,9 +518,8 @@ class Handler(BaseHandler):
         return dataset
     
     def none_to_str(self, data):
-        for i,d in enumerate(data):
-            if d is None:
-                data[i] = 'None'
+        if data.dtype.char == 'O':
+            data[np.equal(data, None)] = 'None'
         return data
 
     def is_basestring(self, data):
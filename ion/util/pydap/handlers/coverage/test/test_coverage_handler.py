@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+'''
+@file ion/util/pydap/handlers/coverage/test/test_coverage_handler.py
+@description Tests and benchmarks for the pydap coverage handler DODS responses
+'''
+
+from pyon.util.unit_test import PyonTestCase
+from ion.util.pydap.handlers.coverage.coverage_handler import Handler, CoverageData
+from ion.services.dm.utility.granule_utils import CoverageCraft, time_series_domain
+from coverage_model import SimplexCoverage
+from nose.plugins.attrib import attr
+from webob import Request
+from uuid import uuid4
+
+import numpy as np
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+
+class CoverageHandlerMixin(object):
+    def make_coverage(self, size, window_size=1000000):
+        root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root_dir, True)
+        sdom, tdom = time_series_domain()
+        pdict = CoverageCraft.create_parameters()
+        dataset_id = uuid4().hex
+        coverage = SimplexCoverage(root_dir, dataset_id, 'Pydap test coverage', parameter_dictionary=pdict, temporal_domain=tdom, spatial_domain=sdom)
+        self.addCleanup(coverage.close)
+        coverage.insert_timesteps(size)
+        for start in xrange(0, size, window_size):
+            stop = min(start + window_size, size)
+            # 0 is the time fill value
+            coverage.set_parameter_values('time', value=np.arange(start, stop) + 1, tdoa=slice(start, stop))
+            coverage.set_parameter_values('temp', value=np.arange(start, stop, dtype=np.float32), tdoa=slice(start, stop))
+        return coverage, os.path.join(root_dir, dataset_id)
+
+
+@attr('UNIT', group='dm')
+class CoverageHandlerTest(PyonTestCase, CoverageHandlerMixin):
+    def setUp(self):
+        self.handler = Handler(tempfile.gettempdir())
+
+    def test_time_queries(self):
+        time_data = np.array([0., 10., 20., 30., 40., -9999., -9999.])
+        self.assertIsNone(self.handler.resolve_time_queries(time_data, 5, 'time', []))
+        self.assertIsNone(self.handler.resolve_time_queries(time_data, -1, 'time', ['temp>10']))
+        self.assertEquals(self.handler.resolve_time_queries(time_data, 5, 'time', ['time>=10', 'time<30']), (1, 3, None))
+        self.assertEquals(self.handler.resolve_time_queries(time_data, 5, 'time', ['time>10', 'time<=30']), (2, 4, None))
+        self.assertEquals(self.handler.resolve_time_queries(time_data, 5, 'time', ['time=20']), (2, 3, None))
+        self.assertEquals(self.handler.resolve_time_queries(time_data, 5, 'time', ['time>100']), (5, 5, None))
+
+    def test_non_numeric_time_queries(self):
+        # selections pydap has to evaluate itself are skipped rather than failing the request
+        time_data = np.array([0., 10., 20., 30., 40., -9999., -9999.])
+        self.assertIsNone(self.handler.resolve_time_queries(time_data, 5, 'time', ['time>"2012-01-01T00:00:00Z"']))
+        self.assertIsNone(self.handler.resolve_time_queries(time_data, 5, 'time', ['time=~"^1"']))
+        self.assertEquals(self.handler.resolve_time_queries(time_data, 5, 'time', ['time=~"^1"', 'time<30']), (0, 3, None))
+
+    def test_unsorted_time_queries(self):
+        # an unsorted time axis falls back to a full scan
+        time_data = np.array([30., 10., 40., 20., 0., -9999.])
+        start, stop, mask = self.handler.resolve_time_queries(time_data, 5, 'time', ['time>=10', 'time<30'])
+        self.assertEquals((start, stop), (1, 4))
+        np.testing.assert_array_equal(mask, [False, True, False, True, False])
+        start, stop, mask = self.handler.resolve_time_queries(time_data, 5, 'time', ['time>100'])
+        self.assertEquals((start, stop), (0, 0))
+        self.assertFalse(mask.any())
+
+    def test_restrict_slice(self):
+        self.assertEquals(self.handler.restrict_slice(slice(None), (2, 5), 10), slice(2, 5, 1))
+        self.assertEquals(self.handler.restrict_slice(slice(1, 10, 3), (5, 8), 10), slice(7, 8, 3))
+        self.assertEquals(self.handler.restrict_slice(slice(1, 3, 1), (5, 8), 10), slice(5, 5, 1))
+
+    def test_stringify(self):
+        data = np.array([[1, 2, 3], [4, 5, 6]])
+        self.assertEquals(self.handler.ndim_stringify(data).tolist(), ['1,2,3', '4,5,6'])
+        data = np.array([['a' * 100, None], ['b', 1]], dtype='O')
+        self.assertEquals(self.handler.ndim_stringify(data).tolist(), ['a' * 100 + ',None', 'b,1'])
+
+        data = np.array([1+2j, 3j])
+        self.assertEquals(self.handler.stringify(data).tolist(), [str(d) for d in data])
+
+        data = np.array(['c' * 100, None, 1.5], dtype='O')
+        retval = self.handler.stringify_inplace(data)
+        self.assertIs(retval, data)
+        self.assertEquals(retval.tolist(), ['c' * 100, 'None', '1.5'])
+
+    def test_coverage_data(self):
+        coverage, filepath = self.make_coverage(25)
+
+        data = CoverageData(self.handler, coverage, 'temp', slice(None), chunk_size=10)
+        self.assertEquals(data.shape, (25,))
+        self.assertEquals(data.dap_type, 'f')
+        chunks = list(data)
+        self.assertEquals([len(chunk) for chunk in chunks], [10, 10, 5])
+        np.testing.assert_array_equal(np.concatenate(chunks), np.arange(25, dtype=np.float32))
+
+        view = data[3:20:2]
+        self.assertEquals(len(view), 9)
+        np.testing.assert_array_equal(np.asanyarray(view), np.arange(3, 20, 2, dtype=np.float32))
+        self.assertEquals(view[1], 5)
+
+    def test_time_selection(self):
+        coverage, filepath = self.make_coverage(25)
+        # the selection is the same whether or not the data is streamed
+        for streaming in (False, True):
+            time_selection = self.handler.resolve_time_queries(np.arange(25) + 1, -1, 'time', ['time>5', 'time<=15'])
+            dataset = self.handler.get_dataset(coverage, [[('temp', ())]], -1, {}, 'dods',
+                                               time_selection=time_selection, streaming=streaming)
+            np.testing.assert_array_equal(np.asanyarray(dataset['temp']['temp'].data), np.arange(5, 15, dtype=np.float32))
+            np.testing.assert_array_equal(dataset['temp']['time'].data, np.arange(6, 16))
+
+        # records selected on an unsorted time axis are read in full and masked
+        time_axis = np.arange(25)[::-1] + 1
+        coverage.set_parameter_values('time', value=time_axis, tdoa=slice(0, 25))
+        time_selection = self.handler.resolve_time_queries(time_axis, -1, 'time', ['time>5', 'time<=15'])
+        self.assertIsNotNone(time_selection[2])
+        for streaming in (False, True):
+            dataset = self.handler.get_dataset(coverage, [[('temp', ())]], -1, {}, 'dods',
+                                               time_selection=time_selection, streaming=streaming)
+            np.testing.assert_array_equal(dataset['temp']['temp'].data, np.arange(10, 20, dtype=np.float32))
+            np.testing.assert_array_equal(dataset['temp']['time'].data, np.arange(6, 16)[::-1])
+
+    def test_time_axis_cache(self):
+        coverage, filepath = self.make_coverage(25)
+        dataset_id = os.path.basename(filepath)
+        self.addCleanup(Handler._time_axes.clear)
+
+        time_axis, fill_index = Handler.get_time_axis(coverage, dataset_id, (0, 25))
+        np.testing.assert_array_equal(time_axis, np.arange(25) + 1)
+        self.assertEquals(fill_index, -1)
+        self.assertIs(Handler.get_time_axis(coverage, dataset_id, (0, 25))[0], time_axis)
+
+        coverage.insert_timesteps(5)
+        time_axis, fill_index = Handler.get_time_axis(coverage, dataset_id, (1, 30))
+        self.assertEquals(fill_index, 25)
+        self.assertEquals([key for key in Handler._time_axes if key[0] == dataset_id], [(dataset_id, (1, 30))])
+
+
+@attr('BENCHMARK', group='dm')
+class CoverageHandlerBenchmark(PyonTestCase, CoverageHandlerMixin):
+    # time and temp take 12 bytes per record, about 1 GB for the whole coverage
+    samples = 90000000
+
+    def request(self, filepath, query=''):
+        environ = Request.blank('/%s.dods%s' % (os.path.basename(filepath), query)).environ
+        start = time.time()
+        first_byte = None
+        size = 0
+        app_iter = Handler(filepath)(environ, lambda status, headers: None)
+        for block in app_iter:
+            if first_byte is None:
+                first_byte = time.time() - start
+            size += len(block)
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+        return first_byte, size, time.time() - start
+
+    def test_dods_response(self):
+        coverage, filepath = self.make_coverage(self.samples)
+
+        # streaming runs first so its maxrss is not inflated by the full reads
+        self.addCleanup(setattr, Handler, 'STREAMING', Handler.STREAMING)
+        for streaming in (True, False):
+            Handler.STREAMING = streaming
+            for query in ('?temp', '?temp&time>=%d&time<%d' % (self.samples / 2, self.samples / 2 + 1000000)):
+                first_byte, size, elapsed = self.request(filepath, query)
+                print 'streaming=%-5s %-40s ttfb %8.3f s  %10.1f MB/s  %12d bytes  maxrss=%d KB' % (streaming, query, first_byte, size / elapsed / 2**20, size, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
@@ -17,6 +17,8 @@ from pyon.ion.resource import RT, PRED, LCE
 from pyon.util.containers import DotDict
 from pyon.util.unit_test import PyonTestCase
 
+import time
+
 
 @attr('UNIT', group='sa')
 class TestEnhancedResourceRegistryClient(PyonTestCase):
@@ -631,3 +633,161 @@ class TestEnhancedResourceRegistryClient(PyonTestCase):
         self.assertEqual([d], results)
 
         self.assertEqual(0, self.rr.find_subjects.call_count)
+
+
+    def test_cached_association_updates(self):
+        d = "d_id"
+        m = "m_id"
+        m2 = "m2_id"
+
+        assn  = DotDict(_id="a1", s=d, st=RT.InstrumentDevice, p=PRED.hasModel, o=m, ot=RT.InstrumentModel)
+        assn2 = DotDict(_id="a2", s=d, st=RT.InstrumentDevice, p=PRED.hasModel, o=m2, ot=RT.InstrumentModel)
+
+        self.rr.find_associations.return_value = [assn]
+        self.RR2.cache_predicate(PRED.hasModel)
+
+        self.assertEqual([m], self.RR2.find_instrument_model_ids_of_instrument_device_using_has_model(d))
+        self.assertEqual([assn], self.RR2.find_cached_associations(PRED.hasModel,
+                                                                    subject_type=RT.InstrumentDevice,
+                                                                    object_type=RT.InstrumentModel))
+
+        self.RR2.cache_association(assn2)
+        self.RR2.cache_association(assn2) # replaces, doesn't duplicate
+        self.assertEqual([m, m2], self.RR2.find_instrument_model_ids_of_instrument_device_using_has_model(d))
+        self.assertEqual([d], self.RR2.find_instrument_device_ids_by_instrument_model_using_has_model(m2))
+
+        self.RR2.uncache_association(assn)
+        self.assertEqual([m2], self.RR2.find_instrument_model_ids_of_instrument_device_using_has_model(d))
+        self.assertEqual([], self.RR2.find_instrument_device_ids_by_instrument_model_using_has_model(m))
+
+        self.RR2.uncache_resource_associations(d)
+        self.assertEqual([], self.RR2.find_instrument_model_ids_of_instrument_device_using_has_model(d))
+        self.assertEqual([], self.RR2.filter_cached_associations(PRED.hasModel, lambda a: True))
+
+        # associations of uncached predicates are ignored
+        self.RR2.cache_association(DotDict(_id="a3", s=d, st=RT.InstrumentDevice, p=PRED.hasDevice, o=m, ot=RT.PlatformDevice))
+        self.assertFalse(self.RR2.has_cached_predicate(PRED.hasDevice))
+
+        self.assertEqual(0, self.rr.find_objects.call_count)
+        self.assertEqual(0, self.rr.find_subjects.call_count)
+
+    def test_dynamic_function_memoization(self):
+        name = "find_instrument_model_ids_of_instrument_device_using_has_model"
+        self.assertNotIn(name, self.RR2.__dict__)
+        fn = getattr(self.RR2, name)
+        self.assertIs(fn, self.RR2.__dict__[name])
+        self.assertIs(fn, getattr(self.RR2, name))
+
+        # pass-through attributes are not memoized, replacing them on the RR client takes effect
+        self.assertIs(self.rr.find_associations, self.RR2.find_associations)
+        self.assertNotIn("find_associations", self.RR2.__dict__)
+        self.rr.find_associations = Mock()
+        self.assertIs(self.rr.find_associations, self.RR2.find_associations)
+        self.RR2.RR = Mock()
+        self.assertIs(self.RR2.RR.find_associations, self.RR2.find_associations)
+
+        # console mode changes the parse, so memoized functions are discarded
+        self.RR2.set_console_mode(False)
+        self.assertNotIn(name, self.RR2.__dict__)
+
+        # lookup tables are shared between clients
+        other = EnhancedResourceRegistryClient(Mock())
+        self.assertIs(self.RR2.predicates_for_subj_obj, other.predicates_for_subj_obj)
+        self.assertNotIn(name, other.__dict__)
+
+
+@attr('BENCHMARK', group='sa')
+class EnhancedResourceRegistryClientBenchmark(PyonTestCase):
+    associations = 100000
+    lookups = 10000
+
+    def test_cached_lookups(self):
+        rr = Mock()
+        RR2 = EnhancedResourceRegistryClient(rr)
+
+        assns = [DotDict(_id="a%d" % i, s="d%d" % i, st=RT.InstrumentDevice, p=PRED.hasModel,
+                         o="m%d" % (i % 1000), ot=RT.InstrumentModel)
+                 for i in xrange(self.associations)]
+        rr.find_associations.return_value = assns
+
+        start = time.time()
+        RR2.cache_predicate(PRED.hasModel)
+        print "cache_predicate with %d associations: %.3f sec" % (self.associations, time.time() - start)
+
+        start = time.time()
+        for i in xrange(self.lookups):
+            self.assertEqual(["m%d" % (i % 1000)], RR2.find_objects("d%d" % i, PRED.hasModel, RT.InstrumentModel, True))
+        indexed = time.time() - start
+
+        start = time.time()
+        for i in xrange(self.lookups / 100):
+            subject_id = "d%d" % i
+            RR2.filter_cached_associations(PRED.hasModel, lambda a: subject_id == a.s)
+        scanned = (time.time() - start) * 100
+
+        print "indexed find_objects: %10.1f lookups/sec" % (self.lookups / indexed)
+        print "linear scan:          %10.1f lookups/sec" % (self.lookups / scanned)
+
+        start = time.time()
+        for i in xrange(self.lookups):
+            RR2.cache_association(DotDict(_id="b%d" % i, s="d%d" % i, st=RT.InstrumentDevice, p=PRED.hasModel,
+                                          o="m0", ot=RT.InstrumentModel))
+        print "incremental updates:  %10.1f updates/sec" % (self.lookups / (time.time() - start))
+
+    def test_cached_replacements_and_removals(self):
+        rr = Mock()
+        RR2 = EnhancedResourceRegistryClient(rr)
+
+        # every association shares one (subject type, object type) bucket
+        rr.find_associations.return_value = [DotDict(_id="a%d" % i, s="d%d" % i, st=RT.InstrumentDevice, p=PRED.hasModel,
+                                                     o="m%d" % (i % 1000), ot=RT.InstrumentModel)
+                                             for i in xrange(self.associations)]
+        RR2.cache_predicate(PRED.hasModel)
+
+        start = time.time()
+        for i in xrange(self.lookups):
+            RR2.cache_association(DotDict(_id="a%d" % i, s="d%d" % i, st=RT.InstrumentDevice, p=PRED.hasModel,
+                                          o="m%d" % ((i + 1) % 1000), ot=RT.InstrumentModel))
+        print "replacements:         %10.1f updates/sec" % (self.lookups / (time.time() - start))
+
+        start = time.time()
+        for i in xrange(self.lookups):
+            RR2.uncache_resource_associations("d%d" % i)
+        print "resource uncaches:    %10.1f updates/sec" % (self.lookups / (time.time() - start))
+
+        start = time.time()
+        for i in xrange(self.lookups, 2 * self.lookups):
+            RR2.uncache_association(DotDict(_id="a%d" % i, p=PRED.hasModel))
+        print "association uncaches: %10.1f updates/sec" % (self.lookups / (time.time() - start))
+
+        self.assertEqual(self.associations - 2 * self.lookups, RR2._cached_predicate_count(PRED.hasModel))
+        self.assertEqual(self.associations - 2 * self.lookups,
+                         len(RR2.find_cached_associations(PRED.hasModel, subject_type=RT.InstrumentDevice, object_type=RT.InstrumentModel)))
+
+    def test_dynamic_calls(self):
+        rr = Mock()
+        rr.find_associations.return_value = [DotDict(_id="a1", s="d1", st=RT.InstrumentDevice, p=PRED.hasModel,
+                                                     o="m1", ot=RT.InstrumentModel)]
+        start = time.time()
+        for i in xrange(100):
+            EnhancedResourceRegistryClient(rr)
+        print "client init:          %10.1f clients/sec" % (100 / (time.time() - start))
+
+        RR2 = EnhancedResourceRegistryClient(rr)
+        RR2.cache_predicate(PRED.hasModel)
+        name = "find_instrument_model_id_of_instrument_device_using_has_model"
+
+        calls = 1000000
+        start = time.time()
+        for i in xrange(calls):
+            RR2.find_instrument_model_id_of_instrument_device_using_has_model("d1")
+        memoized = time.time() - start
+
+        start = time.time()
+        for i in xrange(calls / 100):
+            RR2.__getattr__(name)("d1")
+        unmemoized = (time.time() - start) * 100
+
+        print "memoized dynamic calls:   %10.1f calls/sec" % (calls / memoized)
+        print "unmemoized dynamic calls: %10.1f calls/sec" % (calls / unmemoized)
+
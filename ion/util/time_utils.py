@@ -21,6 +21,46 @@ class TimeUtils(object):
         values = coverage.get_parameter_values(time_name)
         return cls.find_nearest(values,time)
 
+    @classmethod
+    def scan_relative_times(cls, coverage, times, chunk_size):
+        '''
+        Resolves every time to its nearest time index like get_relative_time, in a single scan of the time axis
+        that reads at most chunk_size records at a time
+        '''
+        time_name = coverage.temporal_parameter_name
+        pc = coverage.get_parameter_context(time_name)
+        units = pc.uom
+        if 'iso' in units:
+            return None
+        times = np.atleast_1d(np.asanyarray(times, dtype=np.float64))
+        best_idx = np.zeros(times.shape, dtype=np.int64)
+        best_diff = np.empty(times.shape)
+        best_diff.fill(np.inf)
+        columns = np.arange(times.size)
+        for start in xrange(0, coverage.num_timesteps, chunk_size):
+            values = np.atleast_1d(coverage.get_parameter_values(time_name, tdoa=slice(start, start + chunk_size)))
+            diff = np.abs(values[:, np.newaxis] - times[np.newaxis, :])
+            idx = diff.argmin(axis=0)
+            diff = diff[idx, columns]
+            # the first of equally near values wins, as with find_nearest
+            better = diff < best_diff
+            best_idx[better] = start + idx[better]
+            best_diff[better] = diff[better]
+        return best_idx
+
+    @classmethod
+    def get_relative_times(cls, coverage, times, tolerance=None):
+        '''
+        Vectorized get_relative_time, the time axis is read once and every time is resolved in a single pass
+        '''
+        time_name = coverage.temporal_parameter_name
+        pc = coverage.get_parameter_context(time_name)
+        units = pc.uom
+        if 'iso' in units:
+            return None
+        values = coverage.get_parameter_values(time_name)
+        return cls.find_nearest_array(values, times, tolerance)
+
     @classmethod
     def ts_to_units(cls,units, val):
         '''
@@ -37,6 +77,21 @@ class TimeUtils(object):
         else:
             return val
 
+    @classmethod
+    def ts_to_units_array(cls, units, vals):
+        '''
+        Vectorized ts_to_units, the conversions are linear so only two timestamps are actually converted
+        '''
+        vals = np.asanyarray(vals, dtype=np.float64)
+        if 'iso' in units:
+            return np.array([cls.ts_to_units(units, val) for val in vals])
+        elif 'since' in units:
+            offset = cls.ts_to_units(units, 0)
+            scale = (cls.ts_to_units(units, 86400) - offset) / 86400.
+            return offset + vals * scale
+        else:
+            return vals
+
 
     @classmethod
     def units_to_ts(cls, units, val):
@@ -64,3 +119,27 @@ class TimeUtils(object):
         '''
         idx = np.abs(arr-val).argmin()
         return idx
+
+    @classmethod
+    def find_nearest_array(cls, arr, vals, tolerance=None):
+        '''
+        Vectorized find_nearest, resolves every value with one searchsorted pass.
+        Values without a match within tolerance (if specified) resolve to -1
+        '''
+        arr = np.asanyarray(arr)
+        vals = np.atleast_1d(vals)
+        if not arr.size:
+            return np.empty(vals.shape, dtype=np.int64) - 1
+        sorter = None
+        if arr.size > 1 and (np.diff(arr) < 0).any():
+            sorter = np.argsort(arr, kind='mergesort')
+            arr = arr[sorter]
+        right = np.searchsorted(arr, vals).clip(1, max(arr.size - 1, 1))
+        left = (right - 1).clip(0, arr.size - 1)
+        right = right.clip(0, arr.size - 1)
+        idx = np.where(np.abs(vals - arr[left]) <= np.abs(arr[right] - vals), left, right)
+        if tolerance is not None:
+            idx = np.where(np.abs(arr[idx] - vals) <= tolerance, idx, -1)
+        if sorter is not None:
+            idx = np.where(idx >= 0, sorter[idx.clip(0)], -1)
+        return idx